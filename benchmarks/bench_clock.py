@@ -0,0 +1,115 @@
+"""
+Clock offset estimation benchmark.
+
+Connects a client and a server control channel over plain TCP on the loopback interface, lets them ping
+each other, and exchanges timestamped sync messages. Both endpoints share the same clock, so the estimated
+offset should be close to zero, and the round-trip time and the one-way delays of the sync messages close
+to those of the loopback.
+
+Usage:
+    python benchmarks/bench_clock.py [-i INTERVAL] [-p PINGS] [-s SYNCS]
+"""
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from twisted.internet import defer, reactor, task
+
+from nopasaran.controllers.factory import WorkerClientFactory, WorkerServerFactory
+from nopasaran.controllers.protocol import WorkerProtocol
+from nopasaran.controllers.session import SessionDispatcher
+from nopasaran.definitions.control_channel import Status
+
+
+class Endpoint:
+    """
+    Minimal stand-in for the state machine holding a control channel session.
+    """
+
+    machine_id = 'BENCH'
+
+    def __init__(self):
+        self.variables = {}
+
+    def set_variable_value(self, name, value):
+        self.variables[name] = value
+
+
+def wait_until(predicate, interval=0.001):
+    deferred = defer.Deferred()
+
+    def check():
+        if predicate():
+            poll.stop()
+            deferred.callback(None)
+
+    poll = task.LoopingCall(check)
+    poll.start(interval)
+    return deferred
+
+
+@defer.inlineCallbacks
+def run(args, results):
+    server, client = Endpoint(), Endpoint()
+    listener = reactor.listenTCP(0, WorkerServerFactory(server, 'ctrl'), interface='127.0.0.1')
+    port = listener.getHost().port
+    SessionDispatcher.register(port, server, 'ctrl')
+    factory = WorkerClientFactory(client, 'ctrl')
+    factory.destination = ('127.0.0.1', port)
+    reactor.connectTCP('127.0.0.1', port, factory)
+
+    yield wait_until(lambda: 'ctrl' in server.variables and client.variables.get('ctrl') is not None
+                     and client.variables['ctrl'].local_status == Status.READY.name)
+    sender, receiver = client.variables['ctrl'], server.variables['ctrl']
+    yield wait_until(lambda: len(sender.clock.samples) >= args.pings and len(receiver.clock.samples) >= args.pings)
+    results['client'] = sender.clock
+    results['server'] = receiver.clock
+
+    delays = []
+    for index in range(args.syncs):
+        sender.send_sync([index])
+        yield wait_until(lambda: receiver.has_sync())
+        receiver.pop_sync()
+        delays.append(receiver.sync_delay)
+    results['delays'] = delays
+
+    sender.disconnecting()
+    yield listener.stopListening()
+    factory.stopTrying()
+    sender.protocol.transport.loseConnection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate the clock offset between two control channel endpoints on the loopback interface.')
+    parser.add_argument('-i', '--interval', type=float, default=0.01, help='Interval between the pings, in seconds (default: %(default)s)')
+    parser.add_argument('-p', '--pings', type=int, default=8, help='Number of answered pings to wait for (default: %(default)s)')
+    parser.add_argument('-s', '--syncs', type=int, default=100, help='Number of timestamped sync messages (default: %(default)s)')
+    args = parser.parse_args()
+
+    WorkerProtocol.ping_interval = args.interval
+    results = {}
+
+    def done(result):
+        reactor.stop()
+        return result
+
+    reactor.callWhenRunning(lambda: run(args, results).addBoth(done))
+    reactor.run()
+
+    for side in ('client', 'server'):
+        clock = results[side]
+        print('{}: offset {:+.1f} us, round-trip time {:.1f} us, {} samples'.format(
+            side, clock.offset / 1000, clock.rtt / 1000, len(clock.samples)))
+    delays = [delay / 1000 for delay in results['delays'] if delay is not None]
+    if delays:
+        print('sync one-way delay: median {:.1f} us, min {:.1f} us, max {:.1f} us over {} messages'.format(
+            statistics.median(delays), min(delays), max(delays), len(delays)))
+    if len(delays) < len(results['delays']):
+        print('{} sync message(s) not timestamped'.format(len(results['delays']) - len(delays)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Packet capture benchmark.
+
+Starts the sniffer of a machine with the listen primitive, sends UDP packets on the loopback interface,
+half of them matching the filter set with packet_filter, and reports the number of packets per second
+sent and filtered until the matching ones are in the list of the listen primitive. The packets are sent
+in batches, each once the matching packets of the previous one are captured, so that the capture socket
+does not overflow. A packet sent on the loopback interface is captured twice, going out and coming in, and
+the batches are sized for the same number of packets captured with or without a filter.
+
+Before that, the filter of the running sniffer is changed with packet_filter, to check that the packets
+are then captured by the new filter only.
+
+The filter of the sniffer is compiled once and attached to the capture socket, which needs libpcap. The
+previous sniffer, filtering every packet in Python with an offline sniff, is measured as a reference with
+the same filter; it also needs tcpdump. Both need root.
+
+Usage:
+    sudo python benchmarks/bench_listen.py [-n PACKETS] [-f FILTER] [-t TIMEOUT]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scapy.all import AsyncSniffer, Ether, IP, UDP, Raw, conf, sniff
+from scapy.error import Scapy_Exception
+
+from nopasaran.errors.parsing_error import ParsingError
+from nopasaran.machines.state_machine import StateMachine
+from nopasaran.primitives.action_primitives.data_channel_primitives import DataChannelPrimitives
+
+PLAN = {"id": "LISTEN", "initial": "Start", "states": {"Start": {}}}
+SOURCE = '02:00:00:00:00:01'
+# Number of packets captured per batch.
+BATCH = 100
+COPIES = 2
+
+
+def packet(index, port):
+    return bytes(Ether(src=SOURCE) / IP(src='127.0.0.2', dst='127.0.0.1') / UDP(sport=1024 + index % 60000, dport=port) / Raw(b'x' * 64))
+
+
+def packets(count):
+    return [packet(index, 9999 if index % 2 == 0 else 9998) for index in range(count)]
+
+
+def listen(filter):
+    machine = StateMachine(PLAN)
+    machine.set_variable_value('filter', filter)
+    DataChannelPrimitives.packet_filter.execute(['filter'], [], machine)
+    DataChannelPrimitives.listen.execute([], ['captured'], machine)
+    return machine, machine.get_variable_value('captured')
+
+
+def check_refilter():
+    """Check that changing the filter of a running sniffer changes the packets it captures."""
+    machine, queue = listen('udp dst port 9999')
+    time.sleep(0.5)
+    sender = conf.L2socket(iface=conf.iface)
+    ports = []
+    try:
+        for new_filter in (None, 'udp dst port 9998'):
+            if new_filter is not None:
+                machine.set_variable_value('filter', new_filter)
+                DataChannelPrimitives.packet_filter.execute(['filter'], [], machine)
+            captured = len(queue)
+            for index in range(BATCH):
+                sender.send(packet(index, 9999 if index % 2 == 0 else 9998))
+            time.sleep(1)
+            ports.append({received[UDP].dport for received in queue[captured:]})
+    finally:
+        sender.close()
+        machine.stop_sniffer()
+    return ports == [{9999}, {9998}], ports
+
+
+def run(start, queue, stop, frames, filtered, timeout):
+    start()
+    time.sleep(0.5)
+    sender = conf.L2socket(iface=conf.iface)
+    batch = BATCH // COPIES * (2 if filtered else 1)
+    try:
+        begin = time.perf_counter()
+        for index in range(0, len(frames), batch):
+            for frame in frames[index:index + batch]:
+                sender.send(frame)
+            sent = min(index + batch, len(frames))
+            expected = COPIES * ((sent + 1) // 2 if filtered else sent)
+            waited = time.perf_counter()
+            while len(queue) < expected and time.perf_counter() - waited < timeout:
+                time.sleep(0.0005)
+            if len(queue) < expected:
+                break
+        elapsed = time.perf_counter() - begin
+    finally:
+        sender.close()
+        stop()
+    return elapsed, sent, len(queue)
+
+
+def run_listen(frames, filter, timeout):
+    machine, queue = listen(filter)
+    return run(lambda: None, queue, machine.stop_sniffer, frames, bool(filter), timeout)
+
+
+def run_offline(frames, filter, timeout):
+    queue = []
+    src = Ether().src
+
+    def accept(packet):
+        if 'IP' not in packet or packet[Ether].src == src:
+            return False
+        return len(sniff(offline=packet, filter=filter)) > 0
+
+    # Fail before sending anything if the filter cannot be applied offline.
+    accept(Ether(frames[0]))
+    sniffer = AsyncSniffer(prn=queue.append, lfilter=accept, store=False)
+    return run(sniffer.start, queue, sniffer.stop, frames, bool(filter), timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the packets per second filtered by the sniffer of the listen primitive.')
+    parser.add_argument('-n', '--packets', type=int, default=20000, help='Number of packets sent (default: %(default)s)')
+    parser.add_argument('-f', '--filter', default='udp dst port 9999', help='Filter set with packet_filter (default: %(default)r)')
+    parser.add_argument('-t', '--timeout', type=float, default=5, help='Maximum seconds to wait for the packets of a batch (default: %(default)s)')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    # The sniffers capture on the default interface.
+    conf.iface = 'lo'
+
+    try:
+        passed, ports = check_refilter()
+        print(f"filter change on a running sniffer: {'ok' if passed else 'FAILED'} (ports captured before and after: {ports})")
+    except (Scapy_Exception, ParsingError) as e:
+        print(f"filter change on a running sniffer: unavailable: {e}")
+
+    frames = packets(args.packets)
+    print(f"{args.packets} packets sent on lo, {'half' if args.filter else 'all'} of them matching {args.filter!r}")
+    print(f"{'sniffer':<10} {'sent':>8} {'captured':>10} {'seconds':>10} {'packets/s':>12}")
+    for name, function in (('compiled', run_listen), ('offline', run_offline)):
+        try:
+            elapsed, sent, captured = function(frames, args.filter, args.timeout)
+        except (Scapy_Exception, ParsingError, ImportError, OSError) as e:
+            print(f"{name:<10} unavailable: {e}")
+            continue
+        print(f"{name:<10} {sent:>8} {captured:>10} {elapsed:>10.2f} {sent / elapsed:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
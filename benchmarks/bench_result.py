@@ -0,0 +1,73 @@
+"""
+Result format benchmark.
+
+Compares the [Result] log line (pickle and base64 of every variable, then of the whole result) with the
+streaming result file, for a result holding variables of captured packets. Reports the time, the peak of
+memory allocated and the size of the output of writing the result, and of reading it back.
+
+Usage:
+    python benchmarks/bench_result.py [-p PACKETS] [-v VARIABLES]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scapy.all import Ether, IP, TCP, Raw
+
+from nopasaran.machines.result_stream import ResultWriter, read_result
+from nopasaran.machines.variable_store import VariableStore
+from nopasaran.utils import serialize_log_data, deserialize_log_data
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the logged result with the streaming result file.')
+    parser.add_argument('-p', '--packets', type=int, default=2000, help='Number of packets of each variable (default: %(default)s)')
+    parser.add_argument('-v', '--variables', type=int, default=5, help='Number of variables holding packets (default: %(default)s)')
+    args = parser.parse_args()
+
+    variables = VariableStore()
+    for variable in range(args.variables):
+        packets = []
+        for index in range(args.packets):
+            packet = Ether(bytes(Ether() / IP(dst='192.0.2.1') / TCP(sport=1024 + index, dport=443, flags='PA') / Raw(b'x' * 200)))
+            packet.time = time.time()
+            packets.append(packet)
+        variables['capture{}'.format(variable)] = packets
+    variables['marker'] = 'done'
+    result = {"State": "END", "Variables": variables.snapshot()}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'result.nprs')
+
+        def stream():
+            writer = ResultWriter(path, {"Test": "BENCH"})
+            writer.settle('END', variables)
+            writer.close(result)
+            return os.path.getsize(path)
+
+        print(f"{'format':<8} {'write':>10} {'peak':>10} {'read':>10} {'peak':>10} {'bytes':>12}")
+        write_time, write_peak, line = measure(lambda: serialize_log_data(result))
+        read_time, read_peak, _ = measure(lambda: deserialize_log_data(line))
+        print(f"{'log':<8} {write_time * 1000:8.0f}ms {write_peak / 1e6:8.1f}MB {read_time * 1000:8.0f}ms {read_peak / 1e6:8.1f}MB {len(line):>12}")
+        write_time, write_peak, size = measure(stream)
+        read_time, read_peak, _ = measure(lambda: read_result(path))
+        print(f"{'stream':<8} {write_time * 1000:8.0f}ms {write_peak / 1e6:8.1f}MB {read_time * 1000:8.0f}ms {read_peak / 1e6:8.1f}MB {size:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Worker daemon throughput benchmark.
+
+Runs the same short test a number of times, first with one 'nopasaran -t' process per test, then by
+submitting the tests to a 'nopasaran serve' daemon started once, and reports the tests run per second.
+
+Usage:
+    python benchmarks/bench_serve.py [-n TESTS] [-j JOBS] [PLAN.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nopasaran.runners.daemon import submit
+
+# A plan only using TCP and data manipulation primitives.
+TCP_PLAN = {
+    "id": "TCP-SERVE",
+    "initial": "Init",
+    "states": {
+        "Init": {"on": {"STARTED": {"target": "Build"}}},
+        "Build": {
+            "entry": [
+                {"type": "create_TCP_packet (packet)"},
+                {"type": "set (80) (port)"},
+                {"type": "set_TCP_dport (packet port) (packet)"},
+                {"type": "done"}
+            ],
+            "on": {"DONE": {"target": "End"}}
+        },
+        "End": {}
+    }
+}
+
+
+def wait_for_socket(path, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError('The daemon did not start')
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare one process per test with a worker daemon.')
+    parser.add_argument('plan', nargs='?', help='JSON test plan to run (default: a TCP-only plan)')
+    parser.add_argument('-n', '--tests', type=int, default=20, help='Number of tests (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=16, help='Number of tests the daemon runs at a time (default: %(default)s)')
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=repo_root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    with tempfile.TemporaryDirectory() as directory:
+        plan = args.plan
+        if plan is None:
+            plan = os.path.join(directory, 'plan.json')
+            with open(plan, 'w') as f:
+                json.dump(TCP_PLAN, f)
+        plan = os.path.abspath(plan)
+
+        start = time.perf_counter()
+        for _ in range(args.tests):
+            subprocess.run([sys.executable, '-m', 'nopasaran', '-t', plan], check=True, env=env, cwd=directory)
+        processes = time.perf_counter() - start
+
+        socket_path = os.path.join(directory, 'nopasaran.sock')
+        daemon = subprocess.Popen([sys.executable, '-m', 'nopasaran', 'serve', '-s', socket_path, '-j', str(args.jobs)],
+                                  env=env, cwd=directory)
+        try:
+            wait_for_socket(socket_path, daemon)
+            # The first test pays for the imports, as the first test of a fresh process does.
+            list(submit([{"test": plan}], socket_path))
+            start = time.perf_counter()
+            replies = list(submit([{"id": index, "test": plan} for index in range(args.tests)], socket_path))
+            served = time.perf_counter() - start
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+    failed = [reply for reply in replies if reply["status"] != "DONE"]
+    print(f"{'one process per test':<24} {args.tests / processes:8.1f} tests/s")
+    print(f"{'worker daemon':<24} {args.tests / served:8.1f} tests/s   ({processes / served:.0f}x)")
+    if failed:
+        print(f"{len(failed)} test(s) failed in the daemon: {failed[0].get('error')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Startup-time benchmark.
+
+Measures, in fresh interpreters, the time needed to import the runtime and compile a test plan,
+which is what a worker pays before running the first primitive. The lazily loaded primitive
+modules are compared with importing every primitive module up front.
+
+Usage:
+    python benchmarks/bench_startup.py [-n RUNS] [PLAN.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# A plan only using TCP and data manipulation primitives.
+TCP_PLAN = {
+    "id": "TCP-STARTUP",
+    "initial": "Init",
+    "states": {
+        "Init": {"on": {"STARTED": {"target": "Build"}}},
+        "Build": {
+            "entry": [
+                {"type": "create_TCP_packet (packet)"},
+                {"type": "set (80) (port)"},
+                {"type": "set_TCP_dport (packet port) (packet)"},
+                {"type": "done"}
+            ],
+            "on": {"DONE": {"target": "End"}}
+        },
+        "End": {}
+    }
+}
+
+LAZY = """
+import json
+from nopasaran.machines.state_machine import StateMachine
+StateMachine(json.load(open({plan!r})))
+"""
+
+EAGER = """
+import json
+from nopasaran.primitives.action_primitives.action_primitives import ActionPrimitives
+for name in set(ActionPrimitives.get_registry()):
+    ActionPrimitives.get_primitive(name)
+from nopasaran.machines.state_machine import StateMachine
+StateMachine(json.load(open({plan!r})))
+"""
+
+
+def time_snippet(snippet, runs):
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=repo_root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', snippet], check=True, env=env)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(label, durations):
+    print(f"{label:<24} min {min(durations) * 1000:8.1f} ms   median {statistics.median(durations) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold start of a worker.')
+    parser.add_argument('plan', nargs='?', help='JSON test plan to compile (default: a TCP-only plan)')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='Number of runs (default: %(default)s)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        plan = args.plan
+        if plan is None:
+            plan = os.path.join(directory, 'plan.json')
+            with open(plan, 'w') as f:
+                json.dump(TCP_PLAN, f)
+        plan = os.path.abspath(plan)
+        report('lazy primitive modules', time_snippet(LAZY.format(plan=plan), args.runs))
+        report('all primitive modules', time_snippet(EAGER.format(plan=plan), args.runs))
+
+
+if __name__ == '__main__':
+    main()
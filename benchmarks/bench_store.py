@@ -0,0 +1,70 @@
+"""
+Result store benchmark.
+
+Adds runs with a few variables to a result store, spread over tests, targets and final states, then times
+the queries of nopasaran-store: the runs of a target, the counts by final state of a target, the counts by
+target of a final state, and the counts by test and status of the whole store.
+
+Usage:
+    python benchmarks/bench_store.py [-n RUNS] [-t TARGETS] [STORE]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nopasaran.runners.result_store import ResultStore
+
+TESTS = ('TCP-HANDSHAKE', 'HTTP-HEADERS', 'DNS-QUERY', 'TLS-SNI')
+STATES = ('END', 'RESET', 'TIMEOUT', 'MODIFIED')
+
+
+def measure(function, runs=5):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the writes and queries of a result store.')
+    parser.add_argument('store', nargs='?', help='Path of the store, reused if it exists (default: a temporary file)')
+    parser.add_argument('-n', '--runs', type=int, default=100000, help='Number of runs added (default: %(default)s)')
+    parser.add_argument('-t', '--targets', type=int, default=1000, help='Number of targets (default: %(default)s)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.store or os.path.join(directory, 'results.db')
+        random.seed(0)
+        with ResultStore(path) as store:
+            start = time.perf_counter()
+            now = time.time()
+            for index in range(args.runs):
+                state = random.choice(STATES)
+                result = {"State": state, "Variables": {"flags": 'RA' if state == 'RESET' else 'SA', "port": 1024 + index % 60000,
+                                                        "payload": os.urandom(64)}}
+                store.add(result, random.choice(TESTS), '192.0.2.{}'.format(index % args.targets), now - index)
+            elapsed = time.perf_counter() - start
+            print(f"{'add':<32} {args.runs / elapsed:10.0f} runs/s")
+
+            total = store.count()[0][0]
+            queries = (
+                ('runs of a target', lambda: store.runs(limit=100, target='192.0.2.7')),
+                ('count by state of a target', lambda: store.count(['state'], target='192.0.2.7')),
+                ('count by target of a state', lambda: store.count(['target'], state='RESET', test='TLS-SNI')),
+                ('count by test and status', lambda: store.count(['test', 'status'])),
+                ('variables of a run', lambda: store.variables(total // 2)),
+            )
+            for name, query in queries:
+                elapsed, _ = measure(query)
+                print(f"{name:<32} {elapsed * 1000:10.2f} ms   ({total} runs)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Sync payload codec benchmark.
+
+Compares the legacy sync path (pickle, base64 inside JSON inside base64) with the typed sync codec
+carried in a length-prefixed frame, for a sync message holding a list of captured packets.
+
+The codec rebuilds the packets lazily: decoding only wraps their bytes, and each packet is dissected when
+it is first used. The time to then read a field of every packet is reported as well, which for the codec
+includes the dissection of all the packets.
+
+Usage:
+    python benchmarks/bench_sync_codec.py [-p PACKETS] [-n RUNS]
+"""
+import argparse
+import base64
+import json
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scapy.all import Ether, IP, TCP, Raw
+
+from nopasaran.controllers.framing import FRAME_HEADER, encode_frame
+from nopasaran.controllers.sync_codec import encode_sync, decode_sync
+from nopasaran.definitions.control_channel import JSONMessage
+
+
+def legacy_encode(content):
+    encoded_data = base64.b64encode(pickle.dumps(content)).decode("utf-8")
+    return base64.b64encode(json.dumps({JSONMessage.SYNC.name: encoded_data}).encode())
+
+
+def legacy_decode(data):
+    message = json.loads(base64.b64decode(data).decode())
+    return pickle.loads(base64.b64decode(message[JSONMessage.SYNC.name]))
+
+
+def framed_encode(content):
+    return encode_frame(JSONMessage.SYNC.value, encode_sync(content))
+
+
+def framed_decode(data):
+    return decode_sync(data[FRAME_HEADER.size:])
+
+
+def use(content):
+    return [packet[TCP].sport for packet in content[0]]
+
+
+def measure(function, argument, runs):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function(argument)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def measure_use(decode, data, runs):
+    best = float('inf')
+    for _ in range(runs):
+        content = decode(data)
+        start = time.perf_counter()
+        use(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the sync payload encodings.')
+    parser.add_argument('-p', '--packets', type=int, default=1000, help='Number of packets in the payload (default: %(default)s)')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='Number of runs, the best is kept (default: %(default)s)')
+    args = parser.parse_args()
+
+    packets = []
+    for index in range(args.packets):
+        packet = Ether(bytes(Ether() / IP(dst='192.0.2.1') / TCP(sport=1024 + index, dport=443, flags='PA') / Raw(b'x' * 200)))
+        packet.time = time.time()
+        packets.append(packet)
+    content = [packets, 'marker', 42]
+
+    print(f"{'path':<10} {'encode':>10} {'decode':>10} {'use':>10} {'bytes':>10}")
+    for name, encode, decode in (('pickle', legacy_encode, legacy_decode), ('codec', framed_encode, framed_decode)):
+        encode_time, data = measure(encode, content, args.runs)
+        decode_time, decoded = measure(decode, data, args.runs)
+        assert use(decoded) == use(content)
+        use_time = measure_use(decode, data, args.runs)
+        print(f"{name:<10} {encode_time * 1000:8.1f}ms {decode_time * 1000:8.1f}ms {use_time * 1000:8.1f}ms {len(data):>10}")
+
+
+if __name__ == '__main__':
+    main()
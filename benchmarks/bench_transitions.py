@@ -0,0 +1,126 @@
+"""
+Transition throughput benchmark.
+
+Runs a machine toggling between two states, where each event has a wide array of guarded transitions
+and only the last one is taken, and reports the number of transitions per second. Every transition
+evaluates all the guards and the assignments of the transition taken, which is where the compiled
+guards and assignments matter.
+
+The evaluation of the same guards and assignments by re-parsing their command lines, as the
+interpreters do, is measured as a reference, and so is the cost of recording the latency histograms.
+That cost is a few percent of a transition, below the noise of the runs of the machine, so it is measured
+on its own: the clock reads and the record the machine adds around every action, timed in a loop.
+
+Usage:
+    python benchmarks/bench_transitions.py [-w WIDTH] [-n TRANSITIONS] [-r RUNS]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import timeit
+from time import perf_counter_ns
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nopasaran.machines.state_machine import StateMachine
+from nopasaran.machines.variable_store import VariableStore
+from nopasaran.machines.timings import Timings, PRIMITIVES
+from nopasaran.definitions.commands import Command
+from nopasaran.interpreters.condition_interpreter import ConditionInterpreter
+from nopasaran.interpreters.transition_interpreter import TransitionInterpreter
+from nopasaran.definitions.transitions import StateDuringTransition
+
+GUARDS = ["equal (low high)", "gt (low high)", "gte (low high)", "no_value (low)"]
+ASSIGNMENTS = ["assign (low) (low)", "assign (high) (high)"]
+
+
+def build_plan(width):
+    def transitions(target):
+        guarded = [
+            {"target": target, "cond": GUARDS[index % len(GUARDS)], "actions": [{"type": line} for line in ASSIGNMENTS]}
+            for index in range(width - 1)
+        ]
+        return guarded + [{"target": target, "actions": [{"type": line} for line in ASSIGNMENTS]}]
+
+    return {
+        "id": "TRANSITIONS",
+        "initial": "Ping",
+        "states": {
+            "Ping": {"on": {"GO": transitions("Pong")}},
+            "Pong": {"on": {"GO": transitions("Ping")}}
+        }
+    }
+
+
+def run_machine(machine, transitions):
+    start = time.perf_counter()
+    for _ in range(transitions):
+        machine.trigger_event("GO")
+        while True:
+            action = machine.actions.dequeue_next_action()
+            if action is None:
+                break
+            machine.execute_action(action)
+    return time.perf_counter() - start
+
+
+def run_reparsed(variables, width, transitions):
+    start = time.perf_counter()
+    for _ in range(transitions):
+        for index in range(width - 1):
+            ConditionInterpreter.evaluate(GUARDS[index % len(GUARDS)], variables)
+        state_variables = {StateDuringTransition.OLD_STATE.name: variables, StateDuringTransition.NEW_STATE.name: {}}
+        for line in ASSIGNMENTS:
+            TransitionInterpreter.evaluate(line, state_variables)
+    return time.perf_counter() - start
+
+
+def measure_timing_overhead(count, runs):
+    timings = Timings()
+
+    def timed_action():
+        start = perf_counter_ns()
+        timings.record(PRIMITIVES, "assign", perf_counter_ns() - start)
+
+    def action():
+        pass
+
+    timed = min(timeit.repeat(timed_action, number=count, repeat=runs))
+    untimed = min(timeit.repeat(action, number=count, repeat=runs))
+    return (timed - untimed) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-w", "--width", type=int, default=20, help="transitions per event (default: %(default)s)")
+    parser.add_argument("-n", "--transitions", type=int, default=20000, help="transitions to run (default: %(default)s)")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="runs per mode, the best is kept (default: %(default)s)")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    variables = {"low": 1, "high": 2}
+    machine = StateMachine(build_plan(args.width))
+    machine.variables = VariableStore(dict(variables))
+    timed_machine = StateMachine(build_plan(args.width), track_timings=True)
+    timed_machine.variables = VariableStore(dict(variables))
+    # Warm up the primitive modules before timing.
+    run_machine(machine, 10)
+
+    # The runs with and without timings are interleaved, so that both see the same noise.
+    runs = [(run_machine(machine, args.transitions), run_machine(timed_machine, args.transitions)) for _ in range(args.runs)]
+    compiled = min(run[0] for run in runs)
+    timed = min(run[1] for run in runs)
+    reparsed = min(run_reparsed(variables, args.width, args.transitions // 10) for _ in range(args.runs)) * 10
+
+    print(f"{args.width} transitions per event, {args.width - 1} guards evaluated per transition")
+    print(f"{'mode':<10} {'transitions/s':>15}")
+    print(f"{'reparsed':<10} {args.transitions / reparsed:>15.0f}")
+    print(f"{'compiled':<10} {args.transitions / compiled:>15.0f}")
+    print(f"{'timed':<10} {args.transitions / timed:>15.0f}")
+    print(f"timing overhead: {measure_timing_overhead(args.transitions * 10, args.runs) * 1e9:.0f} ns per action")
+
+
+if __name__ == "__main__":
+    main()
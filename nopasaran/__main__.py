@@ -1,28 +1,62 @@
+import atexit
 import argparse
 import json
 import logging
 import sys
+import time
 from twisted.internet.threads import deferToThread
 from twisted.internet import reactor
+from twisted.python.failure import Failure
 from nopasaran.machines.state_machine import StateMachine
+from nopasaran.parsers.definition_cache import DefinitionCache
+from nopasaran.logging_utils import start_log_queue
+from nopasaran.machines.trace import DEFAULT_TRACE_SIZE
 
-def main():
-    # Set up argument parser
-    parser = argparse.ArgumentParser(
-        prog='NoPASARAN',
-        description='NoPASARAN: Internet Route Testing Framework for Network Middleboxes',
-        epilog="See '<command> --help' for more information."
-    )
+COMMANDS = ('serve', 'submit', 'batch', 'sweep')
 
-    # Add arguments
+
+def add_logging_arguments(parser):
+    """
+    Add the logging options to a command line parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser.
+    """
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose output")
     parser.add_argument("-l", "--log", dest="log_file", default="conf.log", help="Path to the log file (default: %(default)s)")
     parser.add_argument("-ll", "--log-level", choices=["debug", "info", "warning", "error"], help="Log level for output")
-    parser.add_argument("-t", "--test", required=True, help="JSON file for the state machine indicating the test the Worker has to run")
+    parser.add_argument("--log-queue", action="store_true", help="Write the logs from a background thread, so that logging never blocks the machines")
 
-    # Parse command line arguments
-    args = parser.parse_args()
 
+def add_control_channel_arguments(parser):
+    """
+    Add the control channel options to a command line parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser.
+    """
+    parser.add_argument("--legacy-pickle", action="store_true", help="Accept the pickled sync messages of workers of older versions. Unpickling runs code chosen by the remote worker: only use it with trusted workers")
+
+
+def configure_control_channel(args):
+    """
+    Configure the control channel from the control channel options of the command line.
+
+    Args:
+        args (argparse.Namespace): The options of the command line.
+    """
+    if args.legacy_pickle:
+        from nopasaran.controllers.protocol import WorkerProtocol
+        WorkerProtocol.allow_pickle = True
+
+
+def configure_logging(args):
+    """
+    Configure the logging from the logging options of the command line.
+
+    Args:
+        args (argparse.Namespace): The options of the command line.
+    """
     # Set log level based on -ll argument
     log_level = getattr(logging, args.log_level.upper()) if args.log_level else logging.ERROR
 
@@ -43,6 +77,48 @@ def main():
         console_handler.setFormatter(console_formatter)
         logging.getLogger().addHandler(console_handler)
 
+    # Hand the log records to a background thread writing them, flushed on exit
+    if args.log_queue:
+        atexit.register(start_log_queue().stop)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'serve':
+        return serve_main(argv[1:])
+    if argv and argv[0] == 'submit':
+        return submit_main(argv[1:])
+    if argv and argv[0] == 'batch':
+        return batch_main(argv[1:])
+    if argv and argv[0] == 'sweep':
+        return sweep_main(argv[1:])
+
+    # Set up argument parser
+    parser = argparse.ArgumentParser(
+        prog='NoPASARAN',
+        description='NoPASARAN: Internet Route Testing Framework for Network Middleboxes',
+        epilog="Other commands: {}. See '<command> --help' for more information.".format(', '.join(COMMANDS))
+    )
+
+    # Add arguments
+    add_logging_arguments(parser)
+    parser.add_argument("-t", "--test", required=True, help="JSON file for the state machine indicating the test the Worker has to run")
+    parser.add_argument("--variable-sizes", action="store_true", help="Include the size of each variable in the result")
+    parser.add_argument("--timings", action="store_true", help="Record the latency histograms of the primitives, states and transitions, and include them in the result")
+    parser.add_argument("--timings-file", help="Also write the latency histograms to this JSON file")
+    parser.add_argument("--trace", dest="trace_file", help="Record the execution trace of the test and write it to this file on exit, to read with nopasaran-trace")
+    parser.add_argument("--trace-size", type=int, default=DEFAULT_TRACE_SIZE, help="Number of records kept in the execution trace (default: %(default)s)")
+    parser.add_argument("--result-file", help="Stream the result of the test to this file, to read with nopasaran-result, instead of logging it")
+    parser.add_argument("--store", help="Add the run of the test to this result store, to query with nopasaran-store")
+    parser.add_argument("--target", help="Middlebox or server the test is run against, recorded in the result store")
+    parser.add_argument("-r", "--reactor", action="store_true", help="Run the machine in the reactor thread, with blocking primitives in the thread pool")
+    add_control_channel_arguments(parser)
+
+    # Parse command line arguments
+    args = parser.parse_args(argv)
+    configure_logging(args)
+    configure_control_channel(args)
+
     logging.info('[Main] Loading JSON test file...')
     try:
         with open(args.test) as f:
@@ -52,16 +128,231 @@ def main():
         return
 
     logging.info('[Main] JSON test file loaded')
-    machine = StateMachine(state_json=state_json)
+    try:
+        machine = StateMachine(state_json=state_json, track_variable_sizes=args.variable_sizes,
+                               track_timings=args.timings or args.timings_file is not None,
+                               trace_size=args.trace_size if args.trace_file else 0,
+                               result_file=args.result_file)
+    except Exception as e:
+        logging.error(f'[Main] Error compiling JSON test file: {str(e)}')
+        return
+
+    # Write the trace on exit, including when the machine fails
+    if args.trace_file:
+        atexit.register(machine.trace.dump, args.trace_file)
+
+    try:
+        DefinitionCache.preload(machine.plan)
+    except Exception as e:
+        logging.error(f'[Main] Error loading the files used by the test: {str(e)}')
+        return
 
     logging.info('[Main] Starting the root machine')
+    outcome = []
+    started = time.time()
     try:
-        deferToThread(machine.start).addBoth(lambda _: reactor.stop())
+        if args.reactor:
+            reactor.callWhenRunning(lambda: machine.run().addBoth(outcome.append).addBoth(lambda _: reactor.stop()))
+        else:
+            deferToThread(machine.start).addBoth(outcome.append).addBoth(lambda _: reactor.stop())
         reactor.run()
     except Exception as e:
         logging.error(f'[Main] Error starting the machine: {str(e)}')
 
+    if args.store:
+        from nopasaran.definitions.jobs import JobStatus
+        from nopasaran.runners.result_store import ResultStore
+        failure = outcome[0] if outcome and isinstance(outcome[0], Failure) else None
+        try:
+            with ResultStore(args.store) as store:
+                store.add(machine.result(), machine.plan.id, args.target, started, time.time() - started,
+                          JobStatus.FAILED.name if failure else JobStatus.DONE.name, machine.machine_id,
+                          error=failure.getErrorMessage() if failure else None, metadata={"test": args.test})
+        except Exception as e:
+            logging.error(f'[Main] Error adding the run to the result store: {str(e)}')
+
+    if args.timings_file:
+        try:
+            with open(args.timings_file, 'w') as f:
+                json.dump(machine.timings.summary(), f, indent=2)
+        except Exception as e:
+            logging.error(f'[Main] Error writing the timings file: {str(e)}')
+
     logging.info('[Main] Application finished')
 
+
+def serve_main(argv):
+    """
+    Run the worker daemon, which runs the tests submitted with 'nopasaran submit' without starting a new process.
+
+    Args:
+        argv (list): The arguments of the command.
+    """
+    from nopasaran.runners.daemon import serve, DEFAULT_SOCKET, DEFAULT_MAX_JOBS
+    from nopasaran.runners.result_store import ResultStore
+
+    parser = argparse.ArgumentParser(prog='nopasaran serve', description='Run tests submitted over a local socket in a long-lived worker')
+    add_logging_arguments(parser)
+    parser.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help="Path to the Unix socket of the daemon (default: %(default)s)")
+    parser.add_argument("-j", "--max-jobs", type=int, default=DEFAULT_MAX_JOBS, help="Number of tests running at the same time (default: %(default)s)")
+    parser.add_argument("--store", help="Add the runs of the tests to this result store, to query with nopasaran-store")
+    add_control_channel_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+    configure_control_channel(args)
+
+    try:
+        store = ResultStore(args.store) if args.store else None
+        serve(args.socket, args.max_jobs, store)
+    except Exception as e:
+        logging.error(f'[Main] Error running the daemon: {str(e)}')
+        return 1
+    return 0
+
+
+def submit_main(argv):
+    """
+    Submit tests to a worker daemon and print the reply to each of them, as a JSON line, once it has run.
+
+    Args:
+        argv (list): The arguments of the command.
+    """
+    from nopasaran.runners.daemon import submit, DEFAULT_SOCKET
+
+    parser = argparse.ArgumentParser(prog='nopasaran submit', description='Run tests in a worker started with nopasaran serve')
+    parser.add_argument("tests", nargs="+", metavar="TEST", help="JSON file for the state machine of a test, relative to the working directory of the daemon")
+    parser.add_argument("-s", "--socket", default=DEFAULT_SOCKET, help="Path to the Unix socket of the daemon (default: %(default)s)")
+    parser.add_argument("--variable-sizes", action="store_true", help="Include the size of each variable in the results")
+    parser.add_argument("--timings", action="store_true", help="Include the latency histograms of the primitives, states and transitions in the results")
+    parser.add_argument("-r", "--reactor", action="store_true", help="Run the machines in the reactor thread of the daemon")
+    args = parser.parse_args(argv)
+
+    jobs = [{"id": test, "test": test, "variable_sizes": args.variable_sizes, "timings": args.timings, "reactor": args.reactor}
+            for test in args.tests]
+    try:
+        for reply in submit(jobs, args.socket):
+            print(json.dumps(reply), flush=True)
+    except OSError as e:
+        print(f'Error submitting the tests: {str(e)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+def batch_main(argv):
+    """
+    Run the tests of a manifest on a pool of worker daemons and write their results to a single output.
+
+    Args:
+        argv (list): The arguments of the command.
+    """
+    import os
+    import tempfile
+    from nopasaran.runners.batch import load_manifest, parse_cpus, run_batch
+    from nopasaran.runners.result_store import ResultStore
+
+    parser = argparse.ArgumentParser(prog='nopasaran batch', description='Run the tests of a manifest concurrently')
+    add_logging_arguments(parser)
+    parser.add_argument("manifest", help="JSON manifest of the tests and of their parameter sets")
+    parser.add_argument("-o", "--output", help="Path to the JSON lines file of the results (default: standard output)")
+    parser.add_argument("-j", "--workers", type=int, help="Number of tests running at the same time (default: number of CPUs)")
+    parser.add_argument("--timeout", type=float, help="Time after which a test is stopped, in seconds, unless the manifest gives one (default: none)")
+    parser.add_argument("--cpus", help="Pin the workers to these CPUs, in turn, such as 0,2-5")
+    parser.add_argument("--store", help="Add the runs of the tests to this result store, to query with nopasaran-store, instead of writing their results to the output")
+    add_control_channel_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    try:
+        jobs = load_manifest(args.manifest)
+        cpus = parse_cpus(args.cpus) if args.cpus else None
+    except (OSError, ValueError) as e:
+        print(f'Error loading the manifest: {str(e)}', file=sys.stderr)
+        return 1
+    if args.timeout is not None:
+        for job in jobs:
+            job.setdefault('timeout', args.timeout)
+
+    # The workers log to the log file of the batch
+    arguments = ['-l', os.path.abspath(args.log_file)] + (['-ll', args.log_level] if args.log_level else [])
+    if args.legacy_pickle:
+        arguments.append('--legacy-pickle')
+    output = open(args.output, 'w') if args.output else sys.stdout
+    store = None
+    try:
+        store = ResultStore(args.store) if args.store else None
+        with tempfile.TemporaryDirectory(prefix='nopasaran-batch-') as socket_directory:
+            statuses = run_batch(jobs, output, os.path.dirname(os.path.abspath(args.manifest)), socket_directory,
+                                 args.workers, cpus, arguments, store)
+    except Exception as e:
+        logging.error(f'[Main] Error running the batch: {str(e)}')
+        print(f'Error running the batch: {str(e)}', file=sys.stderr)
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if store is not None:
+            store.close()
+    print('# {} test(s): {}'.format(len(jobs), ', '.join(f'{count} {status}' for status, count in sorted(statuses.items()))), file=sys.stderr)
+    return 0
+
+
+def sweep_main(argv):
+    """
+    Run a test plan for every point of a parameter matrix and write their results to a single output.
+
+    Args:
+        argv (list): The arguments of the command.
+    """
+    import os
+    from nopasaran.runners.daemon import DEFAULT_MAX_JOBS
+    from nopasaran.runners.sweep import run_sweep
+    from nopasaran.runners.result_store import ResultStore
+
+    parser = argparse.ArgumentParser(prog='nopasaran sweep', description='Run a test plan across the points of a parameter matrix')
+    add_logging_arguments(parser)
+    parser.add_argument("sweep", help="JSON file of the sweep: the test plan, its parameter matrix and the rate limits")
+    parser.add_argument("-o", "--output", help="Path to the JSON lines file of the results (default: standard output)")
+    parser.add_argument("-j", "--max-jobs", type=int, default=DEFAULT_MAX_JOBS, help="Number of points running at the same time (default: %(default)s)")
+    parser.add_argument("--rate", type=float, help="Number of points started per second towards each destination, unless the sweep gives one")
+    parser.add_argument("--per-destination", type=int, help="Number of points running at the same time towards each destination, unless the sweep gives one")
+    parser.add_argument("--store", help="Add the runs of the points to this result store, to query with nopasaran-store")
+    add_control_channel_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+    configure_control_channel(args)
+
+    try:
+        with open(args.sweep) as f:
+            sweep = json.load(f)
+        if not isinstance(sweep, dict):
+            raise ValueError('The sweep must be a JSON object')
+    except (OSError, ValueError) as e:
+        print(f'Error loading the sweep: {str(e)}', file=sys.stderr)
+        return 1
+    if args.rate is not None:
+        sweep.setdefault('rate', args.rate)
+    if args.per_destination is not None:
+        sweep.setdefault('per_destination', args.per_destination)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    store = None
+    try:
+        store = ResultStore(args.store) if args.store else None
+        # The files of the sweep are relative to its directory, as the nested machines to the working directory
+        os.chdir(os.path.dirname(os.path.abspath(args.sweep)))
+        statuses = run_sweep(sweep, output, args.max_jobs, store)
+    except Exception as e:
+        logging.error(f'[Main] Error running the sweep: {str(e)}')
+        print(f'Error running the sweep: {str(e)}', file=sys.stderr)
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if store is not None:
+            store.close()
+    print('# {} point(s): {}'.format(sum(statuses.values()), ', '.join(f'{count} {status}' for status, count in sorted(statuses.items()))), file=sys.stderr)
+    return 0
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import time
+import struct
+import itertools
+from collections import deque
+
+# ID of the ping and time it was sent.
+PING = struct.Struct('!Qq')
+# ID of the ping, times the ping was sent and received, and time the pong was sent.
+PONG = struct.Struct('!Qqqq')
+# Time a timestamped sync message was sent, at the start of the body of its frame.
+SYNC_TIMESTAMP = struct.Struct('!q')
+
+# Interval between the pings sent on a connection, in seconds.
+PING_INTERVAL = 1.0
+# Number of most recent samples the estimate is taken from, and of unanswered pings after which a peer
+# is considered not to support them.
+CLOCK_WINDOW = 8
+
+
+class PeerClock:
+    """
+    Running estimate of the offset and round-trip time between the wall clock of the local worker and that
+    of the peer of a control channel connection.
+
+    The estimate is built as in NTP. The peer answers each ping with a pong carrying the times it received
+    the ping and sent the pong. With t1 and t4 the times the ping was sent and the pong received on the
+    local clock, and t2 and t3 the times the ping was received and the pong sent on the peer clock, a sample
+    has a round-trip time of (t4 - t1) - (t3 - t2) and an offset of ((t2 - t1) + (t3 - t4)) / 2, which is
+    exact when the transit times are the same both ways. Of the last CLOCK_WINDOW samples, the one with the
+    least round-trip time, the least delayed by queueing, is the estimate.
+
+    The clock is updated from the reactor thread and read from any thread.
+    """
+
+    def __init__(self, window=CLOCK_WINDOW):
+        """
+        Initialize the PeerClock with no sample.
+
+        Args:
+            window (int, optional): The number of most recent samples the estimate is taken from. Defaults to CLOCK_WINDOW.
+        """
+        self.samples = deque(maxlen=window)
+        self.pending = deque(maxlen=window)
+        self.ping_ids = itertools.count(1)
+        self.offset = None
+        self.rtt = None
+
+    @property
+    def synchronized(self):
+        """
+        bool: Whether a ping was answered by the peer, which then supports pings and timestamped sync messages.
+        """
+        return self.offset is not None
+
+    @property
+    def unanswered(self):
+        """
+        bool: Whether the peer answered none of the last CLOCK_WINDOW pings sent to it, which is the case of
+        the peers not supporting them.
+        """
+        return not self.synchronized and len(self.pending) == self.pending.maxlen
+
+    def ping(self):
+        """
+        Build the body of a ping sent now.
+
+        Returns:
+            bytes: The body of the ping.
+        """
+        ping_id = next(self.ping_ids)
+        self.pending.append(ping_id)
+        return PING.pack(ping_id, time.time_ns())
+
+    @staticmethod
+    def pong(body, received):
+        """
+        Build the body of the pong answering a ping, sent now.
+
+        Args:
+            body (bytes): The body of the ping.
+            received (int): The time the ping was received, in nanoseconds since the epoch.
+
+        Returns:
+            bytes: The body of the pong.
+        """
+        ping_id, sent = PING.unpack(body)
+        return PONG.pack(ping_id, sent, received, time.time_ns())
+
+    def pong_received(self, body, received):
+        """
+        Update the estimate with the sample of a pong.
+
+        Args:
+            body (bytes): The body of the pong.
+            received (int): The time the pong was received, in nanoseconds since the epoch.
+
+        Returns:
+            tuple or None: The round-trip time and the offset of the sample, in nanoseconds, or None if the
+            pong does not answer a pending ping.
+        """
+        ping_id, ping_sent, ping_received, pong_sent = PONG.unpack(body)
+        if ping_id not in self.pending:
+            return None
+        self.pending.remove(ping_id)
+        sample = (max(0, (received - ping_sent) - (pong_sent - ping_received)),
+                  ((ping_received - ping_sent) + (pong_sent - received)) // 2)
+        self.samples.append(sample)
+        self.rtt, self.offset = min(self.samples)
+        return sample
+
+    def delay(self, sent, received):
+        """
+        Get the one-way delay of a message timestamped by the peer.
+
+        Args:
+            sent (int): The time the message was sent on the peer clock, in nanoseconds since the epoch.
+            received (int): The time the message was received on the local clock, in nanoseconds since the epoch.
+
+        Returns:
+            int or None: The delay in nanoseconds, or None if the offset of the peer clock is not known yet.
+        """
+        if self.offset is None:
+            return None
+        return received - (sent - self.offset)
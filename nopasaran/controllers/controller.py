@@ -1,15 +1,23 @@
+import os
 import logging
 from twisted.internet import reactor
 from twisted.internet.ssl import Certificate, PrivateCertificate
 from nopasaran.controllers.factory import WorkerClientFactory, WorkerServerFactory
+from nopasaran.controllers.protocol import WorkerClientProtocol
+from nopasaran.controllers.session import WorkerSession, SessionDispatcher
 
 class Controller:
     """
     Base controller for managing the control channel.
     
     This controller handles loading certificates and provides common functionality for both client and server controllers.
+    The certificates are loaded once per process, and again only if their file changes, as a worker daemon
+    creates controllers for many tests.
     """
 
+    # Loaded certificates, by kind and path, along with the modification time and size of their file.
+    _certificates = {}
+
     def __init__(self, root_certificate_file, own_private_certificate_file):
         """
         Initialize the Controller.
@@ -22,16 +30,34 @@ class Controller:
             RuntimeError: If an error occurs while loading the control channel certificates.
         """
         try:
-            root_cert_data = self._load_certificate_data(root_certificate_file)
-            own_cert_data = self._load_certificate_data(own_private_certificate_file)
-            self._trusted_authority_certificate = self._load_certificate(root_cert_data)
-            self._own_private_certificate = self._load_private_certificate(own_cert_data)
+            self._trusted_authority_certificate = self._load_cached(root_certificate_file, self._load_certificate)
+            self._own_private_certificate = self._load_cached(own_private_certificate_file, self._load_private_certificate)
             logging.info("[Control Channel] Control channel certificates loaded successfully.")
         except Exception as e:
             error_msg = f"Error loading control channel certificates: {str(e)}"
             logging.error("[Control Channel] " + error_msg)
             raise RuntimeError(error_msg)
 
+    @classmethod
+    def _load_cached(cls, file_path, load):
+        """
+        Load a certificate from a file, unless it was already loaded from the same file.
+        
+        Args:
+            file_path (str): The file path to the certificate file.
+            load (Callable): The function loading the certificate from the certificate data.
+        
+        Returns:
+            The loaded certificate.
+        """
+        status = os.stat(file_path)
+        key = (load.__name__, os.path.abspath(file_path))
+        stamp = (status.st_mtime_ns, status.st_size)
+        entry = cls._certificates.get(key)
+        if entry is None or entry[0] != stamp:
+            entry = cls._certificates[key] = (stamp, load(cls._load_certificate_data(file_path)))
+        return entry[1]
+
     @staticmethod
     def _load_certificate_data(file_path):
         """
@@ -77,7 +103,9 @@ class ClientController(Controller):
     """
     Controller for client-side control channel.
     
-    This controller is used to configure and start the control channel for a client.
+    This controller is used to configure and start the control channel for a client. When a connection
+    to the same server is already established and supports sessions, the controller opens a new session
+    on it instead of a new connection.
     """
 
     def __init__(self, state_machine, variable, root_certificate_file, client_private_certificate_file):
@@ -114,6 +142,13 @@ class ClientController(Controller):
             RuntimeError: If an error occurs while starting the client.
         """
         try:
+            destination = (self.__dst_ip, self.__dst_port)
+            protocol = WorkerClientProtocol.connections.get(destination)
+            if protocol is not None and protocol.framed:
+                protocol.new_session(self.factory)
+                logging.info("[Control Channel] Client started. Session %d opened on the established control channel.", self.factory.session.session_id)
+                return
+            self.factory.destination = destination
             self.connection = reactor.connectSSL(
                 self.__dst_ip,
                 self.__dst_port,
@@ -128,9 +163,16 @@ class ClientController(Controller):
 
     def stop(self):
         """
-        Stop the client controller and the associated connection.
+        Stop the client controller.
+        
+        The session of the controller is closed. The connection is kept for further sessions, unless the
+        server does not support them, in which case it is closed.
         """
-        if self.connection:
+        session = self.factory.session
+        if session is not None and session.protocol.framed:
+            session.disconnecting()
+            logging.info("[Control Channel] Client session %d stopped.", session.session_id)
+        elif self.connection:
             self.connection.disconnect()
             logging.info("[Control Channel] Client connection stopped.")
         else:
@@ -140,9 +182,13 @@ class ServerController(Controller):
     """
     Controller for server-side control channel.
     
-    This controller is used to configure and start the control channel for a server.
+    This controller is used to configure and start the control channel for a server. Server controllers
+    configured with the same port share its listener, and each of them is handed one session opened by a client.
     """
 
+    # Listeners shared by the server controllers, by port, along with the number of controllers using them.
+    listeners = {}
+
     def __init__(self, state_machine, variable, root_certificate_file, server_private_certificate_file):
         """
         Initialize the ServerController.
@@ -175,11 +221,18 @@ class ServerController(Controller):
             RuntimeError: If an error occurs while starting the server.
         """
         try:
+            SessionDispatcher.register(self.__src_port, self.factory.state_machine, self.factory.variable)
+            if self.__src_port in self.listeners:
+                self.listeners[self.__src_port][1] += 1
+                self.listener = self.listeners[self.__src_port][0]
+                logging.info("[Control Channel] Server started. Waiting for a session on the existing listener.")
+                return
             self.listener = reactor.listenSSL(
                 self.__src_port,
                 self.factory,
                 self._own_private_certificate.options(self._trusted_authority_certificate)
             )
+            self.listeners[self.__src_port] = [self.listener, 1]
             logging.info("[Control Channel] Server started. Control channel established on the server side.")
         except Exception as e:
             error_msg = f"Error starting server. Control channel failed on the server side: {str(e)}"
@@ -188,10 +241,22 @@ class ServerController(Controller):
 
     def stop(self):
         """
-        Stop the server controller and the associated listener.
+        Stop the server controller.
+        
+        The session of the controller is closed, and the listener is stopped once no server controller uses it anymore.
         """
+        SessionDispatcher.unregister(self.__src_port, self.factory.state_machine, self.factory.variable)
+        session = self.factory.state_machine.variables.get(self.factory.variable)
+        if isinstance(session, WorkerSession) and session.is_active:
+            session.disconnecting()
         if self.listener:
-            self.listener.stopListening()
-            logging.info("[Control Channel] Server listener stopped.")
+            shared = self.listeners.get(self.__src_port)
+            if shared is not None and shared[0] is self.listener:
+                shared[1] -= 1
+                if shared[1] == 0:
+                    del self.listeners[self.__src_port]
+                    self.listener.stopListening()
+                    logging.info("[Control Channel] Server listener stopped.")
+            self.listener = None
         else:
             logging.warning("[Control Channel] No active server listener to stop.")
\ No newline at end of file
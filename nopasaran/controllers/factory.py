@@ -22,14 +22,17 @@ class WorkerClientFactory(ReconnectingClientFactory):
         """
         self.state_machine = state_machine
         self.variable = variable
-    
+        self.destination = None
+        self.session = None
+
 
 
 class WorkerServerFactory(ServerFactory):
     """
     A factory for creating WorkerServerProtocol instances.
     
-    This factory is responsible for creating server protocols.
+    This factory is responsible for creating server protocols. The sessions they accept are handed to
+    the state machines registered with the SessionDispatcher.
     """
 
     protocol = WorkerServerProtocol
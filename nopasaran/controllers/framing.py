@@ -0,0 +1,72 @@
+import struct
+
+# Every frame starts with this byte. It is not part of the base64 alphabet, which lets the decoder
+# tell frames apart from the base64(JSON) messages of the legacy wire format.
+FRAME_MAGIC = 0xF7
+
+# Magic byte, frame type byte, session ID and body length.
+FRAME_HEADER = struct.Struct('!BBII')
+
+
+def encode_frame(frame_type, body, session_id=0):
+    """
+    Encode a frame.
+
+    Args:
+        frame_type (int): The type of the frame, one of the JSONMessage values.
+        body (bytes): The raw body of the frame.
+        session_id (int, optional): The ID of the session the frame belongs to. Defaults to 0.
+
+    Returns:
+        bytes: The encoded frame.
+    """
+    return FRAME_HEADER.pack(FRAME_MAGIC, frame_type, session_id, len(body)) + body
+
+
+class FrameDecoder:
+    """
+    Streaming decoder for the control channel wire format.
+
+    Bytes are fed as they are read from the transport, whatever their boundaries, and the decoder returns
+    every complete message they contain. A partial frame is kept until the rest of it arrives.
+
+    Data not starting with the frame magic byte is a legacy base64(JSON) message. The legacy format carries
+    no length, so a legacy message extends up to the next frame or to the end of the data read.
+    """
+
+    def __init__(self):
+        """
+        Initialize the FrameDecoder.
+        """
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Feed received bytes to the decoder.
+
+        Args:
+            data (bytes): The received bytes.
+
+        Returns:
+            list: The decoded messages, as (frame_type, session_id, body) tuples for frames and
+            (None, 0, data) tuples for legacy messages, which always belong to session 0.
+        """
+        self.buffer += data
+        messages = []
+        while self.buffer:
+            if self.buffer[0] == FRAME_MAGIC:
+                if len(self.buffer) < FRAME_HEADER.size:
+                    break
+                _, frame_type, session_id, length = FRAME_HEADER.unpack_from(self.buffer)
+                end = FRAME_HEADER.size + length
+                if len(self.buffer) < end:
+                    break
+                messages.append((frame_type, session_id, bytes(self.buffer[FRAME_HEADER.size:end])))
+                del self.buffer[:end]
+            else:
+                end = self.buffer.find(FRAME_MAGIC)
+                if end == -1:
+                    end = len(self.buffer)
+                messages.append((None, 0, bytes(self.buffer[:end])))
+                del self.buffer[:end]
+        return messages
@@ -0,0 +1,69 @@
+from collections import deque
+
+
+class Mailbox:
+    """
+    Mailbox holding the sync messages received on a control channel connection.
+
+    Messages carry an optional tag. Receiving is selective: a receiver takes the oldest message with the
+    tag it is waiting for, so messages with other tags never block it. Untagged messages are received
+    with the tag None.
+
+    The mailbox is not synchronized by itself; callers hold WorkerProtocol.state_changed while using it.
+    """
+
+    def __init__(self):
+        """
+        Initialize the Mailbox.
+        """
+        self.messages = deque()
+
+    def __len__(self):
+        """
+        Get the number of messages in the mailbox.
+
+        Returns:
+            int: The number of messages.
+        """
+        return len(self.messages)
+
+    def put(self, tag, message):
+        """
+        Add a message to the mailbox.
+
+        Args:
+            tag (str or None): The tag of the message.
+            message: The message.
+        """
+        self.messages.append((tag, message))
+
+    def contains(self, tag):
+        """
+        Check whether the mailbox holds a message with the given tag.
+
+        Args:
+            tag (str or None): The tag to look for.
+
+        Returns:
+            bool: True if a message with the tag is available, False otherwise.
+        """
+        return any(message_tag == tag for message_tag, _ in self.messages)
+
+    def take(self, tag):
+        """
+        Remove and return the oldest message with the given tag.
+
+        Args:
+            tag (str or None): The tag to look for.
+
+        Returns:
+            The message.
+
+        Raises:
+            KeyError: If no message with the tag is available.
+        """
+        for index, (message_tag, message) in enumerate(self.messages):
+            if message_tag == tag:
+                del self.messages[index]
+                return message
+        raise KeyError(tag)
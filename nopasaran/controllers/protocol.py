@@ -1,37 +1,60 @@
 import json
 import logging
 import base64
+import time
 import pickle
+import struct
 
+from twisted.internet import task
 from twisted.internet.protocol import Protocol
 
-from nopasaran.definitions.control_channel import JSONMessage, Status
+from nopasaran.definitions.control_channel import JSONMessage, WireFormat
+from nopasaran.controllers.framing import FrameDecoder, encode_frame
+from nopasaran.controllers.session import WorkerSession, SessionDispatcher
+from nopasaran.controllers.clock import PeerClock, PING_INTERVAL, SYNC_TIMESTAMP
+from nopasaran.logging_utils import truncated
+
+# Length of the tag at the start of the body of a sync frame. A length of zero means no tag.
+SYNC_TAG_LENGTH = struct.Struct('!H')
 
 
 class WorkerProtocol(Protocol):
     """
     Base protocol for worker communication.
     
-    This protocol handles the communication between workers and manages their status.
+    This protocol handles a control channel connection between workers. The connection carries one or
+    more test sessions, each with its own status and sync messages, identified by the session ID of the
+    frames. Session 0 is opened along with the connection and is the only session of the legacy wire format.
+
+    Once both endpoints use length-prefixed frames, they ping each other every ping_interval seconds to keep
+    an estimate of the offset between their clocks and of the round-trip time of the connection.
+
+    Workers of older versions send their sync messages in the legacy format, pickled. Unpickling a message
+    runs code chosen by the remote worker, so these messages are rejected unless allow_pickle is set, with
+    the --legacy-pickle option.
     """
 
-    remote_status = Status.DISCONNECTED.name
-    local_status = Status.DISCONNECTED.name
-    is_active = True
-    queue = []
+    framed = False
+    allow_pickle = False
+    decoder = None
+    pinger = None
+    ping_interval = PING_INTERVAL
+    state_changed = WorkerSession.state_changed
 
-    def get_current_state_json(self):
+    def __init__(self):
+        """
+        Initialize the WorkerProtocol with no session.
         """
-        Get the current state as a JSON-encoded string.
+        self.sessions = {}
+        self.clock = PeerClock()
+
+    def notify_state_changed(self):
+        """
+        Wake up the threads waiting on a change of the state of a session.
         
-        Returns:
-            bytes: The JSON-encoded current state.
+        This method is called whenever the status of a session changes or a sync message is received.
         """
-        try:
-            return json.dumps({JSONMessage.STATUS.name: self.local_status}).encode()
-        except (TypeError, json.JSONDecodeError) as e:
-            logging.error("[Control Channel] Error encoding current state to JSON: %s", e)
-            return b''
+        WorkerSession.notify_state_changed()
 
     def send_encoded_data(self, data):
         """
@@ -46,128 +69,309 @@ class WorkerProtocol(Protocol):
             json_data = json.dumps(data).encode()
             base64_data = base64.b64encode(json_data).decode("utf-8")
             self.transport.write(base64_data.encode())
-            logging.info("[Control Channel] Data sent: %s", data)
+            logging.info("[Control Channel] Data sent: %s", truncated(data))
         except (TypeError, json.JSONDecodeError) as e:
             logging.error("[Control Channel] Error encoding data to JSON: %s", e)
         except Exception as e:
             logging.error("[Control Channel] Unexpected error in send_encoded_data: %s", e)
 
-    def dataReceived(self, encoded_json_data):
+    def send_frame(self, message, body, session_id=0):
+        """
+        Send a length-prefixed frame through the transport.
+        
+        Args:
+            message (JSONMessage): The type of the message.
+            body (bytes): The raw body of the message.
+            session_id (int, optional): The ID of the session the message belongs to. Defaults to 0.
+        """
+        self.transport.write(encode_frame(message.value, body, session_id))
+        logging.info("[Control Channel] Frame sent on session %d: %s (%d bytes)", session_id, message.name, len(body))
+
+    @staticmethod
+    def encode_sync_body(tag, content):
+        """
+        Build the body of a sync frame.
+        
+        Args:
+            tag (str or None): The tag of the sync message.
+            content (bytes): The encoded content of the sync message.
+        
+        Returns:
+            bytes: The body of the sync frame.
+        """
+        encoded_tag = tag.encode() if tag else b''
+        return SYNC_TAG_LENGTH.pack(len(encoded_tag)) + encoded_tag + content
+
+    @staticmethod
+    def decode_sync_body(body):
+        """
+        Split the body of a sync frame into its tag and its encoded content.
+        
+        Args:
+            body (bytes): The body of the sync frame.
+        
+        Returns:
+            tuple: The tag, or None if the message is untagged, and the encoded content.
+        """
+        (tag_length,) = SYNC_TAG_LENGTH.unpack_from(body)
+        tag_end = SYNC_TAG_LENGTH.size + tag_length
+        tag = body[SYNC_TAG_LENGTH.size:tag_end].decode() if tag_length else None
+        return tag, body[tag_end:]
+
+    def start_clock(self):
+        """
+        Start pinging the remote endpoint to estimate the offset of its clock.
+        """
+        self.pinger = task.LoopingCall(self.send_ping)
+        self.pinger.start(self.ping_interval)
+
+    def send_ping(self):
+        """
+        Send a ping to the remote endpoint, or stop pinging it if it does not answer pings.
+        
+        Pings and pongs are not logged, as they are sent throughout the life of the connection.
+        """
+        if self.clock.unanswered:
+            self.pinger.stop()
+            logging.info("[Control Channel] Remote endpoint does not answer pings, clock offset not estimated")
+            return
+        self.transport.write(encode_frame(JSONMessage.PING.value, self.clock.ping()))
+
+    def pong_received(self, body, received):
+        """
+        Update the estimate of the clock of the remote endpoint with a pong.
+        
+        Args:
+            body (bytes): The body of the pong.
+            received (int): The time the pong was received, in nanoseconds since the epoch.
+        """
+        sample = self.clock.pong_received(body, received)
+        if sample is not None:
+            logging.debug("[Control Channel] Clock sample: round-trip time %d ns, offset %d ns", *sample)
+
+    def open_session(self, session_id):
+        """
+        Open a session on the connection.
+        
+        Args:
+            session_id (int): The ID of the session.
+        
+        Returns:
+            WorkerSession: The new session.
+        """
+        session = WorkerSession(self, session_id)
+        self.sessions[session_id] = session
+        return session
+
+    def session_requested(self, session_id):
+        """
+        Handle a status received for a session that is not open on the connection.
+        
+        Only the server side accepts sessions opened by the remote endpoint.
+        
+        Args:
+            session_id (int): The ID of the session.
+        
+        Returns:
+            WorkerSession or None: The accepted session, or None if it is refused.
+        """
+        return None
+
+    def session_closed(self, session):
+        """
+        Handle the closing of a session.
+        
+        The connection outlives its sessions when the remote endpoint supports sessions, so that further
+        tests can use it. A legacy connection is closed along with its session.
+        
+        Args:
+            session (WorkerSession): The closed session.
+        """
+        if self.sessions.get(session.session_id) is session:
+            del self.sessions[session.session_id]
+        if not self.framed:
+            self.transport.loseConnection()
+
+    def dataReceived(self, data):
         """
         Handle received data.
         
-        This method is called when data is received from the remote endpoint.
+        This method is called when data is received from the remote endpoint. The data can contain
+        partial or multiple messages, which are reassembled by the frame decoder and dispatched to their session.
         
         Args:
-            encoded_json_data (bytes): The received data as bytes.
+            data (bytes): The received data as bytes.
         """
-        try:
-            decoded_data = base64.b64decode(encoded_json_data).decode()
-            data = json.loads(decoded_data)
-            if JSONMessage.STATUS.name in data:
-                self.remote_status = data[JSONMessage.STATUS.name]
-                if self.local_status == Status.CONNECTED.name and self.remote_status == Status.CONNECTED.name:
-                    self.local_status = Status.READY.name
-                    self.remote_status = Status.READY.name
-                if self.local_status == Status.DISCONNECTING.name and self.remote_status == Status.DISCONNECTING.name:
-                    self.is_active = False
-                    self.transport.loseConnection()
-            if JSONMessage.SYNC.name in data:
-                encoded_data = data[JSONMessage.SYNC.name]
-                serialized_data = base64.b64decode(encoded_data)
-                content = pickle.loads(serialized_data)
-                self.queue.append(content)
-            
-            logging.info("[Control Channel] Status: %s, %s", self.local_status, self.remote_status)
-            logging.info("[Control Channel] Received: %s", data)
-
-        except (json.JSONDecodeError, KeyError) as e:
-            logging.error("[Control Channel] Error processing received data: %s", e)
-        except (pickle.PickleError) as e:
-            logging.error("[Control Channel] Error decoding sync message: %s", e)
-        except Exception as e:
-            logging.error("[Control Channel] Unexpected error in dataReceived: %s", e)
+        received = time.time_ns()
+        if self.decoder is None:
+            self.decoder = FrameDecoder()
+        for frame_type, session_id, body in self.decoder.feed(data):
+            try:
+                if frame_type is None:
+                    self.legacy_message_received(body)
+                    continue
+                if frame_type == JSONMessage.PING.value:
+                    self.transport.write(encode_frame(JSONMessage.PONG.value, PeerClock.pong(body, received)))
+                    continue
+                if frame_type == JSONMessage.PONG.value:
+                    self.pong_received(body, received)
+                    continue
+                session = self.sessions.get(session_id)
+                if frame_type == JSONMessage.STATUS.value:
+                    if session is None:
+                        session = self.session_requested(session_id)
+                    if session is not None:
+                        session.status_received(body.decode())
+                elif frame_type == JSONMessage.SYNC.value:
+                    if session is not None:
+                        tag, content = self.decode_sync_body(body)
+                        session.sync_received(WireFormat.LENGTH_PREFIXED, content, tag)
+                elif frame_type == JSONMessage.TIMED_SYNC.value:
+                    if session is not None:
+                        (sent,) = SYNC_TIMESTAMP.unpack_from(body)
+                        tag, content = self.decode_sync_body(body[SYNC_TIMESTAMP.size:])
+                        session.sync_received(WireFormat.LENGTH_PREFIXED, content, tag, self.clock.delay(sent, received))
+                else:
+                    logging.error("[Control Channel] Unknown frame type: %s", frame_type)
+                    continue
+                if session is None:
+                    logging.warning("[Control Channel] Dropping message for unknown session %d", session_id)
+            except (json.JSONDecodeError, KeyError) as e:
+                logging.error("[Control Channel] Error processing received data: %s", e)
+            except (pickle.PickleError) as e:
+                logging.error("[Control Channel] Error decoding sync message: %s", e)
+            except Exception as e:
+                logging.error("[Control Channel] Unexpected error in dataReceived: %s", e)
+        self.notify_state_changed()
 
-    def disconnecting(self):
+    def legacy_message_received(self, encoded_json_data):
         """
-        Initiate the disconnection process.
+        Handle a message received in the legacy base64(JSON) format, which always belongs to session 0.
         
-        This method sets the local status to DISCONNECTING and sends the current state to the remote endpoint.
+        Args:
+            encoded_json_data (bytes): The received message.
         """
-        try:
-            self.local_status = Status.DISCONNECTING.name
-            self.send_encoded_data({JSONMessage.STATUS.name: self.local_status})
-            logging.info("[Control Channel] Disconnecting...")
-        except Exception as e:
-            logging.error("[Control Channel] Error during disconnection: %s", e)
+        decoded_data = base64.b64decode(encoded_json_data).decode()
+        data = json.loads(decoded_data)
+        if not self.framed and WireFormat.LENGTH_PREFIXED.name in data.get(JSONMessage.WIRE_FORMATS.name, []):
+            self.framed = True
+            self.start_clock()
+        session = self.sessions.get(0)
+        if session is None:
+            logging.warning("[Control Channel] Dropping legacy message, session 0 is closed")
+            return
+        if JSONMessage.STATUS.name in data:
+            session.status_received(data[JSONMessage.STATUS.name])
+        if JSONMessage.SYNC.name in data and not self.allow_pickle:
+            logging.error("[Control Channel] Rejecting a pickled sync message of a worker of an older version, accepted with --legacy-pickle")
+        elif JSONMessage.SYNC.name in data:
+            session.sync_received(WireFormat.BASE64_JSON, base64.b64decode(data[JSONMessage.SYNC.name]), data.get(JSONMessage.TAG.name))
+        logging.info("[Control Channel] Received: %s", truncated(data))
 
     def connectionLost(self, reason):
         """
         Handle the connection loss.
         
-        This method is called when the connection is lost with the remote endpoint.
+        This method is called when the connection is lost with the remote endpoint. All the sessions
+        carried by the connection become inactive.
         
         Args:
             reason: The reason for the connection loss.
         """
         try:
-            self.is_active = False
+            if self.pinger is not None and self.pinger.running:
+                self.pinger.stop()
+            for session in self.sessions.values():
+                session.is_active = False
+            self.sessions.clear()
+            self.notify_state_changed()
             logging.info("[Control Channel] Connection lost.")
             logging.info(reason)
         except Exception as e:
             logging.error("[Control Channel] Error handling connection lost: %s", e)
 
-    def send_sync(self, content):
-        """
-        Send a sync message to the remote endpoint.
-        
-        This method sends a sync message with the specified content to the remote endpoint.
-        
-        Args:
-            content: The content of the sync message.
-        """
-        try:
-            serialized_data = pickle.dumps(content)
-            encoded_data = base64.b64encode(serialized_data).decode("utf-8")
-            self.send_encoded_data({JSONMessage.SYNC.name: encoded_data})
-            logging.info("[Control Channel] Sync message sent: %s", content)
-        except (pickle.PickleError) as e:
-            logging.error("[Control Channel] Error serializing or encoding sync message: %s", e)
-        except (TypeError, json.JSONDecodeError) as e:
-            logging.error("[Control Channel] Error encoding sync message to JSON: %s", e)
-        except Exception as e:
-            logging.error("[Control Channel] Unexpected error in send_sync: %s", e)
-
 
 class WorkerClientProtocol(WorkerProtocol):
     """
     Protocol for worker clients.
     
-    This protocol is used by worker clients to communicate with the server.
+    This protocol is used by worker clients to communicate with the server. Established connections are
+    kept by destination, so that further tests with the same server open a session on them instead of
+    a new connection.
     """
 
+    connections = {}
+
+    def __init__(self):
+        """
+        Initialize the WorkerClientProtocol.
+        """
+        super().__init__()
+        self.next_session_id = 1
+
     def connectionMade(self):
         """
         Handle the connection made event.
         
         This method is called when the connection is successfully established with the server.
-        It sets the local status to CONNECTED, sends the current state to the server, and logs the event.
+        It opens session 0 for the state machine of the factory and announces it to the server.
         """
         try:
+            # Pings and sync messages are small frames, which Nagle's algorithm would hold back and delay.
+            self.transport.setTcpNoDelay(True)
             self.factory.stopTrying()
-            self.factory.state_machine.set_variable_value(self.factory.variable, self)
-            self.local_status = Status.CONNECTED.name
-            self.send_encoded_data({JSONMessage.STATUS.name: self.local_status})
+            self.connections[self.factory.destination] = self
+            self.attach(self.open_session(0), self.factory)
             logging.info("[Control Channel] Connection made")
         except Exception as e:
             logging.error("[Control Channel] Error during client connection setup: %s", e)
 
+    def new_session(self, factory):
+        """
+        Open a new session on the connection for the state machine of a factory.
+        
+        Args:
+            factory (WorkerClientFactory): The factory of the client controller requesting the session.
+        
+        Returns:
+            WorkerSession: The new session.
+        """
+        session = self.open_session(self.next_session_id)
+        self.next_session_id += 1
+        self.attach(session, factory)
+        return session
+
+    @staticmethod
+    def attach(session, factory):
+        """
+        Hand a session to the state machine of a factory and announce it to the server.
+        
+        Args:
+            session (WorkerSession): The session.
+            factory (WorkerClientFactory): The factory of the client controller.
+        """
+        factory.session = session
+        factory.state_machine.set_variable_value(factory.variable, session)
+        session.connect()
+
+    def connectionLost(self, reason):
+        """
+        Handle the connection loss and forget the connection.
+        
+        Args:
+            reason: The reason for the connection loss.
+        """
+        if self.connections.get(self.factory.destination) is self:
+            del self.connections[self.factory.destination]
+        super().connectionLost(reason)
+
 
 class WorkerServerProtocol(WorkerProtocol):
     """
     Protocol for worker servers.
     
-    This protocol is used by worker servers to communicate with clients.
+    This protocol is used by worker servers to communicate with clients. The sessions opened by the
+    client are handed to the state machines registered on the listening port.
     """
 
     def connectionMade(self):
@@ -175,12 +379,38 @@ class WorkerServerProtocol(WorkerProtocol):
         Handle the connection made event.
         
         This method is called when a client successfully establishes a connection with the server.
-        It sets the local status to CONNECTED, sends the current state to the client, and logs the event.
+        It opens session 0 and announces it to the client.
         """
         try:
-            self.factory.state_machine.set_variable_value(self.factory.variable, self)
-            self.local_status = Status.CONNECTED.name
-            self.send_encoded_data({JSONMessage.STATUS.name: self.local_status})
+            self.transport.setTcpNoDelay(True)
+            self.accept_session(0)
             logging.info("[Control Channel] Connection made")
         except Exception as e:
             logging.error("[Control Channel] Error during server connection setup: %s", e)
+
+    def session_requested(self, session_id):
+        """
+        Accept a session opened by the client.
+        
+        Args:
+            session_id (int): The ID of the session.
+        
+        Returns:
+            WorkerSession: The accepted session.
+        """
+        return self.accept_session(session_id)
+
+    def accept_session(self, session_id):
+        """
+        Open a session, announce it to the client and hand it to the next state machine registered on the port.
+        
+        Args:
+            session_id (int): The ID of the session.
+        
+        Returns:
+            WorkerSession: The accepted session.
+        """
+        session = self.open_session(session_id)
+        session.connect()
+        SessionDispatcher.dispatch(self.transport.getHost().port, session)
+        return session
@@ -0,0 +1,365 @@
+import json
+import time
+import base64
+import pickle
+import logging
+import threading
+from collections import deque
+
+from twisted.internet import defer, reactor
+
+from nopasaran.definitions.control_channel import JSONMessage, Status, WireFormat
+from nopasaran.controllers.sync_codec import encode_sync, decode_sync
+from nopasaran.controllers.mailbox import Mailbox
+from nopasaran.controllers.clock import SYNC_TIMESTAMP
+from nopasaran.logging_utils import truncated
+
+
+class WorkerSession:
+    """
+    A test session carried by a control channel connection.
+
+    A connection carries one or more independent sessions, each with its own status and its own mailbox
+    of sync messages. Session 0 is opened along with the connection. Further sessions are opened by the
+    client on an established connection, which saves a TLS handshake per test between the same workers.
+
+    The session is what the state machines hold in their protocol variable.
+    """
+
+    # Shared by all the sessions: waiting threads do not know in advance which connection they depend on.
+    state_changed = threading.Condition()
+    # Deferreds waiting in the reactor for a change of the state of a session, with their predicates.
+    waiters = []
+
+    def __init__(self, protocol, session_id):
+        """
+        Initialize the WorkerSession.
+
+        Args:
+            protocol (WorkerProtocol): The protocol of the connection carrying the session.
+            session_id (int): The ID of the session on the connection.
+        """
+        self.protocol = protocol
+        self.session_id = session_id
+        self.local_status = Status.DISCONNECTED.name
+        self.remote_status = Status.DISCONNECTED.name
+        self.is_active = True
+        self.mailbox = Mailbox()
+        self.sync_delay = None
+
+    @property
+    def clock(self):
+        """
+        PeerClock: The estimate of the clock of the remote endpoint of the connection carrying the session.
+        """
+        return self.protocol.clock
+
+    @classmethod
+    def notify_state_changed(cls):
+        """
+        Wake up the threads waiting on a change of the state of a session.
+        """
+        with cls.state_changed:
+            cls.state_changed.notify_all()
+        if cls.waiters:
+            reactor.callFromThread(cls._check_waiters)
+
+    @classmethod
+    def _check_waiters(cls):
+        """
+        Fire the waiting Deferreds whose predicate now holds.
+
+        A predicate raising an error fails its own Deferred with the error, and the other waiters are still checked.
+        """
+        for waiter in list(cls.waiters):
+            deferred, predicate, timeout_call = waiter
+            try:
+                holds = predicate()
+            except Exception:
+                cls.waiters.remove(waiter)
+                timeout_call.cancel()
+                deferred.errback()
+                continue
+            if holds:
+                cls.waiters.remove(waiter)
+                timeout_call.cancel()
+                deferred.callback(True)
+
+    @classmethod
+    def wait_for(cls, predicate, timeout):
+        """
+        Wait in the reactor for a predicate on the state of the sessions to hold.
+
+        This is the reactor counterpart of waiting on state_changed: no thread is held while waiting.
+        This method must be called from the reactor thread, while the reactor is running.
+
+        Args:
+            predicate (Callable): The predicate to wait for.
+            timeout (float): The timeout in seconds.
+
+        Returns:
+            Deferred: A Deferred firing with True once the predicate holds, or with False on timeout.
+
+        Raises:
+            RuntimeError: If the reactor is not running.
+        """
+        if not reactor.running:
+            raise RuntimeError('Waiting on the control channel needs a running reactor')
+        if predicate():
+            return defer.succeed(True)
+        deferred = defer.Deferred()
+
+        def expire():
+            cls.waiters.remove(waiter)
+            deferred.callback(False)
+
+        waiter = (deferred, predicate, reactor.callLater(timeout, expire))
+        cls.waiters.append(waiter)
+        return deferred
+
+    def connect(self):
+        """
+        Announce the session to the remote endpoint.
+
+        This method sets the local status to CONNECTED and sends it to the remote endpoint.
+        """
+        self.local_status = Status.CONNECTED.name
+        self.send_status()
+        self.notify_state_changed()
+        logging.info("[Control Channel] Session %d connected", self.session_id)
+
+    def send_status(self):
+        """
+        Send the local status of the session to the remote endpoint.
+
+        Until the remote endpoint has announced that it supports length-prefixed frames, the status is
+        sent in the legacy base64(JSON) format along with the wire formats supported locally. The legacy
+        format only carries session 0.
+        """
+        if self.protocol.framed:
+            self.protocol.send_frame(JSONMessage.STATUS, self.local_status.encode(), self.session_id)
+        else:
+            self.protocol.send_encoded_data({
+                JSONMessage.STATUS.name: self.local_status,
+                JSONMessage.WIRE_FORMATS.name: [WireFormat.LENGTH_PREFIXED.name]
+            })
+
+    def status_received(self, status):
+        """
+        Handle a status received from the remote endpoint for this session.
+
+        Args:
+            status (str): The status of the remote endpoint.
+        """
+        self.remote_status = status
+        if self.local_status == Status.CONNECTED.name and self.remote_status == Status.CONNECTED.name:
+            self.local_status = Status.READY.name
+            self.remote_status = Status.READY.name
+        if self.local_status == Status.DISCONNECTING.name and self.remote_status == Status.DISCONNECTING.name:
+            self.is_active = False
+            self.protocol.session_closed(self)
+        logging.info("[Control Channel] Session %d status: %s, %s", self.session_id, self.local_status, self.remote_status)
+
+    def sync_received(self, wire_format, serialized_data, tag=None, delay=None):
+        """
+        Handle a sync message received from the remote endpoint for this session.
+
+        The content is put in the mailbox still serialized. It is decoded by pop_sync, in the thread
+        consuming the message, rather than in the reactor thread.
+
+        Args:
+            wire_format (WireFormat): The wire format the message was received in.
+            serialized_data (bytes): The serialized content of the sync message.
+            tag (str, optional): The tag of the sync message. Defaults to None.
+            delay (int, optional): The one-way delay of a timestamped sync message, in nanoseconds. Defaults to None.
+        """
+        with self.state_changed:
+            self.mailbox.put(tag, (wire_format, serialized_data, delay))
+        logging.info("[Control Channel] Sync message received on session %d with tag %s (%d bytes)", self.session_id, tag, len(serialized_data))
+
+    def has_sync(self, tag=None):
+        """
+        Check whether a sync message with the given tag is available.
+
+        Args:
+            tag (str, optional): The tag of the sync message. Defaults to None, for untagged messages.
+
+        Returns:
+            bool: True if a sync message is available, False otherwise.
+        """
+        with self.state_changed:
+            return self.mailbox.contains(tag)
+
+    def pop_sync(self, tag=None):
+        """
+        Remove the oldest sync message with the given tag from the mailbox and decode its content.
+
+        Sync messages received in the legacy format are pickled, and only unpickled if the protocol allows it
+        with allow_pickle. The others are encoded with the sync codec. The one-way delay of the message, if it
+        was timestamped, is kept in sync_delay.
+
+        Args:
+            tag (str, optional): The tag of the sync message. Defaults to None, for untagged messages.
+
+        Returns:
+            The content of the sync message.
+
+        Raises:
+            KeyError: If no sync message with the tag is available.
+            ValueError: If the message is pickled and the protocol does not allow it, or cannot be decoded.
+        """
+        with self.state_changed:
+            wire_format, serialized_data, self.sync_delay = self.mailbox.take(tag)
+        if wire_format == WireFormat.BASE64_JSON:
+            if not self.protocol.allow_pickle:
+                raise ValueError('Refusing to unpickle a sync message in the legacy format')
+            return pickle.loads(serialized_data)
+        return decode_sync(serialized_data)
+
+    def encode_sync_content(self, content):
+        """
+        Encode the content of a sync message in the format of the connection.
+
+        Sync messages are encoded with the sync codec on framed connections, and pickled on the others.
+        Encoding before sending lets the caller know that the content cannot be sent.
+
+        Args:
+            content: The content of the sync message.
+
+        Returns:
+            tuple: Whether the content was encoded for a framed connection, and the encoded content.
+
+        Raises:
+            TypeError: If the content contains a value that the sync codec cannot encode.
+            pickle.PickleError: If the content cannot be pickled.
+        """
+        framed = self.protocol.framed
+        return framed, encode_sync(content) if framed else pickle.dumps(content)
+
+    def send_sync(self, content, tag=None, encoded=None):
+        """
+        Send a sync message to the remote endpoint on this session.
+
+        Once the remote endpoint has answered a ping, it supports timestamped sync messages, and the message
+        carries the time it is sent.
+
+        Args:
+            content: The content of the sync message.
+            tag (str, optional): The tag of the sync message. Defaults to None.
+            encoded (tuple, optional): The content already encoded with encode_sync_content. Defaults to None,
+                to encode it here. It is encoded again if the connection format changed in the meantime.
+        """
+        try:
+            if encoded is None or encoded[0] != self.protocol.framed:
+                encoded = self.encode_sync_content(content)
+            framed, data = encoded
+            if framed and self.clock.synchronized:
+                body = self.protocol.encode_sync_body(tag, data)
+                self.protocol.send_frame(JSONMessage.TIMED_SYNC, SYNC_TIMESTAMP.pack(time.time_ns()) + body, self.session_id)
+            elif framed:
+                self.protocol.send_frame(JSONMessage.SYNC, self.protocol.encode_sync_body(tag, data), self.session_id)
+            else:
+                encoded_data = base64.b64encode(data).decode("utf-8")
+                message = {JSONMessage.SYNC.name: encoded_data}
+                if tag:
+                    message[JSONMessage.TAG.name] = tag
+                self.protocol.send_encoded_data(message)
+            logging.info("[Control Channel] Sync message sent on session %d with tag %s: %s", self.session_id, tag, truncated(content))
+        except (pickle.PickleError) as e:
+            logging.error("[Control Channel] Error serializing or encoding sync message: %s", e)
+        except (TypeError, json.JSONDecodeError) as e:
+            logging.error("[Control Channel] Error encoding sync message: %s", e)
+        except Exception as e:
+            logging.error("[Control Channel] Unexpected error in send_sync: %s", e)
+
+    def disconnecting(self):
+        """
+        Initiate the disconnection of the session.
+
+        This method sets the local status to DISCONNECTING and sends it to the remote endpoint. The session
+        is closed once the remote endpoint is disconnecting too.
+        """
+        try:
+            self.local_status = Status.DISCONNECTING.name
+            if self.protocol.connected:
+                self.send_status()
+            if self.remote_status == Status.DISCONNECTING.name or not self.protocol.connected:
+                self.is_active = False
+                self.protocol.session_closed(self)
+            self.notify_state_changed()
+            logging.info("[Control Channel] Session %d disconnecting...", self.session_id)
+        except Exception as e:
+            logging.error("[Control Channel] Error during disconnection: %s", e)
+
+
+class SessionDispatcher:
+    """
+    Dispatcher of the sessions accepted by the server side of the control channel.
+
+    A listening port is shared by all the server controllers configured with it. Each controller registers
+    its state machine and protocol variable, and the sessions accepted on the port are handed to the
+    registrations in order. A session accepted before any registration is waiting for it is kept until one is.
+
+    All the methods are called from the reactor thread.
+    """
+
+    registrations = {}
+    sessions = {}
+
+    @classmethod
+    def register(cls, port, state_machine, variable):
+        """
+        Register a state machine waiting for a session on a port.
+
+        Args:
+            port (int): The local port of the control channel.
+            state_machine: The state machine object.
+            variable (str): The name of the variable to store the session in.
+        """
+        cls.registrations.setdefault(port, deque()).append((state_machine, variable))
+        cls._match(port)
+
+    @classmethod
+    def unregister(cls, port, state_machine, variable):
+        """
+        Remove a registration that has not been handed a session yet.
+
+        Args:
+            port (int): The local port of the control channel.
+            state_machine: The state machine object.
+            variable (str): The name of the variable to store the session in.
+        """
+        waiting = cls.registrations.get(port)
+        if waiting and (state_machine, variable) in waiting:
+            waiting.remove((state_machine, variable))
+
+    @classmethod
+    def dispatch(cls, port, session):
+        """
+        Hand a session accepted on a port to the next registered state machine.
+
+        Args:
+            port (int): The local port of the control channel.
+            session (WorkerSession): The accepted session.
+        """
+        cls.sessions.setdefault(port, deque()).append(session)
+        cls._match(port)
+
+    @classmethod
+    def _match(cls, port):
+        """
+        Pair the waiting registrations of a port with its pending sessions.
+
+        Args:
+            port (int): The local port of the control channel.
+        """
+        waiting = cls.registrations.get(port)
+        pending = cls.sessions.get(port)
+        while waiting and pending:
+            session = pending.popleft()
+            if not session.is_active:
+                continue
+            state_machine, variable = waiting.popleft()
+            state_machine.set_variable_value(variable, session)
+            logging.info("[Control Channel] Session %d assigned to state machine %s", session.session_id, state_machine.machine_id)
+        WorkerSession.notify_state_changed()
@@ -0,0 +1,340 @@
+import sys
+import struct
+import importlib
+
+# Type tags of the encoded values.
+NONE = ord('N')
+TRUE = ord('T')
+FALSE = ord('F')
+INTEGER = ord('I')
+FLOAT = ord('D')
+STRING = ord('S')
+BYTES = ord('B')
+LIST = ord('L')
+TUPLE = ord('U')
+SET = ord('E')
+DICT = ord('M')
+PACKET = ord('P')
+
+LENGTH = struct.Struct('!I')
+DOUBLE = struct.Struct('!d')
+
+# Packet classes already checked by _packet_class.
+_PACKET_CLASSES = {}
+
+
+def _is_packet(value):
+    """
+    Check whether a value is a scapy packet, without importing scapy.
+
+    Args:
+        value: The value to check.
+
+    Returns:
+        bool: True if the value is a scapy packet, False otherwise.
+    """
+    packet_module = sys.modules.get('scapy.packet')
+    return packet_module is not None and isinstance(value, packet_module.Packet)
+
+
+def _encode_sized(out, tag, data):
+    out.append(tag)
+    out += LENGTH.pack(len(data))
+    out += data
+
+
+def _encode(out, value):
+    if value is None:
+        out.append(NONE)
+    elif value is True:
+        out.append(TRUE)
+    elif value is False:
+        out.append(FALSE)
+    elif isinstance(value, int):
+        _encode_sized(out, INTEGER, value.to_bytes((value.bit_length() + 8) // 8, 'big', signed=True))
+    elif isinstance(value, float):
+        out.append(FLOAT)
+        out += DOUBLE.pack(value)
+    elif isinstance(value, str):
+        _encode_sized(out, STRING, value.encode('utf-8'))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        _encode_sized(out, BYTES, bytes(value))
+    elif isinstance(value, dict):
+        out.append(DICT)
+        out += LENGTH.pack(len(value))
+        for key, item in value.items():
+            _encode(out, key)
+            _encode(out, item)
+    elif _is_packet(value):
+        # The class of a LazyPacket is that of the packet it stands for.
+        packet_class = value.__class__
+        out.append(PACKET)
+        _encode(out, packet_class.__module__)
+        _encode(out, packet_class.__name__)
+        out += DOUBLE.pack(float(value.time))
+        _encode_sized(out, BYTES, bytes(value))
+    elif isinstance(value, (list, tuple, set, frozenset)) or type(value).__name__ == 'PacketList':
+        out.append(TUPLE if isinstance(value, tuple) else SET if isinstance(value, (set, frozenset)) else LIST)
+        items = list(value)
+        out += LENGTH.pack(len(items))
+        for item in items:
+            _encode(out, item)
+    else:
+        raise TypeError(f"Cannot encode value of type {type(value).__name__} in a sync message")
+
+
+def encode_sync(content):
+    """
+    Encode the content of a sync message.
+
+    Supported values are None, booleans, integers, floats, strings, bytes, lists, tuples, sets, dicts
+    and scapy packets, LazyPacket included. Packets are carried as their raw wire bytes along with their
+    timestamp.
+
+    Args:
+        content: The content to encode.
+
+    Returns:
+        bytes: The encoded content.
+
+    Raises:
+        TypeError: If the content contains a value that cannot be encoded.
+    """
+    out = bytearray()
+    _encode(out, content)
+    return bytes(out)
+
+
+def _read_sized(data, offset):
+    (length,) = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    return data[offset:offset + length], offset + length
+
+
+class LazyPacket:
+    """
+    A packet of a decoded sync message, dissected on first use.
+
+    Dissecting thousands of packets costs as much as unpickling them, while a test often only reads a few
+    of them, so the packets are kept as their raw bytes until an attribute of the packet is read. Reading
+    the timestamp, the bytes or the length of the packet does not dissect it.
+
+    The wrapper reports the class of the packet as its own, so that it passes the isinstance checks of
+    scapy and of the primitives, and it is pickled as the dissected packet.
+    """
+
+    __slots__ = ('_class', '_raw', '_time', '_packet')
+
+    def __init__(self, packet_class, raw, time):
+        """
+        Initialize the LazyPacket.
+
+        Args:
+            packet_class (type): The scapy packet class.
+            raw (bytes): The raw bytes of the packet.
+            time (float): The timestamp of the packet.
+        """
+        object.__setattr__(self, '_class', packet_class)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_time', time)
+        object.__setattr__(self, '_packet', None)
+
+    @property
+    def __class__(self):
+        return self._class
+
+    @property
+    def packet(self):
+        """
+        Get the dissected packet, dissecting it on first use.
+
+        Returns:
+            Packet: The packet.
+        """
+        packet = self._packet
+        if packet is None:
+            packet = self._class(self._raw)
+            packet.time = self._time
+            object.__setattr__(self, '_packet', packet)
+        return packet
+
+    @property
+    def time(self):
+        return self._time if self._packet is None else self._packet.time
+
+    @time.setter
+    def time(self, value):
+        object.__setattr__(self, '_time', value)
+        if self._packet is not None:
+            self._packet.time = value
+
+    def __getattr__(self, name):
+        return getattr(self.packet, name)
+
+    def __setattr__(self, name, value):
+        if name == 'time':
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.packet, name, value)
+
+    def __delattr__(self, name):
+        delattr(self.packet, name)
+
+    def __bytes__(self):
+        return self._raw if self._packet is None else bytes(self._packet)
+
+    def __len__(self):
+        return len(self._raw) if self._packet is None else len(self._packet)
+
+    def __bool__(self):
+        return True
+
+    def __reduce_ex__(self, protocol):
+        return self.packet.__reduce_ex__(protocol)
+
+    def __copy__(self):
+        return self.packet.copy()
+
+    def __deepcopy__(self, memo):
+        return self.packet.copy()
+
+    def __repr__(self):
+        return repr(self.packet)
+
+    def __str__(self):
+        return str(self.packet)
+
+    def __eq__(self, other):
+        return self.packet == other
+
+    def __ne__(self, other):
+        return self.packet != other
+
+    __hash__ = None
+
+    def __lt__(self, other):
+        return self.packet < other
+
+    def __gt__(self, other):
+        return self.packet > other
+
+    def __iter__(self):
+        return iter(self.packet)
+
+    def __contains__(self, layer):
+        return layer in self.packet
+
+    def __getitem__(self, layer):
+        return self.packet[layer]
+
+    def __setitem__(self, layer, value):
+        self.packet[layer] = value
+
+    def __delitem__(self, layer):
+        del self.packet[layer]
+
+    def __truediv__(self, other):
+        return self.packet / other
+
+    def __rtruediv__(self, other):
+        return other / self.packet
+
+    def __mul__(self, count):
+        return self.packet * count
+
+    def __rmul__(self, count):
+        return count * self.packet
+
+
+def _packet_class(module_name, class_name):
+    """
+    Get a scapy packet class by its module and its name.
+
+    Args:
+        module_name (str): The scapy module defining the packet class.
+        class_name (str): The name of the packet class.
+
+    Returns:
+        type: The packet class.
+
+    Raises:
+        ValueError: If the packet class is not a scapy packet class.
+    """
+    packet_class = _PACKET_CLASSES.get((module_name, class_name))
+    if packet_class is not None:
+        return packet_class
+    if module_name != 'scapy' and not module_name.startswith('scapy.'):
+        raise ValueError(f"Refusing to rebuild a packet of class {module_name}.{class_name}")
+    packet_class = getattr(importlib.import_module(module_name), class_name, None)
+    if not isinstance(packet_class, type) or not issubclass(packet_class, sys.modules['scapy.packet'].Packet):
+        raise ValueError(f"{module_name}.{class_name} is not a packet class")
+    _PACKET_CLASSES[(module_name, class_name)] = packet_class
+    return packet_class
+
+
+def _decode(data, offset):
+    tag = data[offset]
+    offset += 1
+    if tag == NONE:
+        return None, offset
+    if tag == TRUE:
+        return True, offset
+    if tag == FALSE:
+        return False, offset
+    if tag == INTEGER:
+        raw, offset = _read_sized(data, offset)
+        return int.from_bytes(raw, 'big', signed=True), offset
+    if tag == FLOAT:
+        return DOUBLE.unpack_from(data, offset)[0], offset + DOUBLE.size
+    if tag == STRING:
+        raw, offset = _read_sized(data, offset)
+        return str(raw, 'utf-8'), offset
+    if tag == BYTES:
+        raw, offset = _read_sized(data, offset)
+        return bytes(raw), offset
+    if tag in (LIST, TUPLE, SET):
+        (count,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        items = []
+        for _ in range(count):
+            item, offset = _decode(data, offset)
+            items.append(item)
+        if tag == TUPLE:
+            return tuple(items), offset
+        if tag == SET:
+            return set(items), offset
+        return items, offset
+    if tag == DICT:
+        (count,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        value = {}
+        for _ in range(count):
+            key, offset = _decode(data, offset)
+            value[key], offset = _decode(data, offset)
+        return value, offset
+    if tag == PACKET:
+        module_name, offset = _decode(data, offset)
+        class_name, offset = _decode(data, offset)
+        time = DOUBLE.unpack_from(data, offset)[0]
+        raw, offset = _read_sized(data, offset + DOUBLE.size + 1)
+        return LazyPacket(_packet_class(module_name, class_name), bytes(raw), time), offset
+    raise ValueError(f"Unknown type tag {tag!r} in sync message")
+
+
+def decode_sync(data):
+    """
+    Decode the content of a sync message encoded with encode_sync.
+
+    Args:
+        data (bytes): The encoded content.
+
+    Returns:
+        The decoded content, with the packets as LazyPacket.
+
+    Raises:
+        ValueError: If the data is not a valid encoded content.
+    """
+    value, offset = _decode(memoryview(data), 0)
+    if offset != len(data):
+        raise ValueError("Trailing data in sync message")
+    return value
@@ -1,20 +1,34 @@
+import inspect
 import logging
+import functools
 from functools import wraps
 
 from nopasaran.parsers.interpreter_parser import Parser
 from nopasaran.errors.parsing_error import ParsingError
 
-def parsing_decorator(input_args, output_args, optional_inputs=False, optional_outputs=False):
+def parsing_decorator(input_args, output_args, optional_inputs=False, optional_outputs=False, asynchronous=None):
     """
     Decorator for parsing inputs and outputs of a function.
     
     This decorator parses the inputs and outputs of a function based on the specified constraints.
+    The parsing and the execution steps are also exposed separately on the decorated function as
+    ``parse(line)`` and ``execute(inputs, outputs, variable_dict)`` so that a command line can be
+    parsed once when a test plan is compiled and executed many times afterwards.
+    
+    ``bind(inputs, outputs)`` returns the function of the variable dictionary executing a parsed command
+    line. The decorated function is bound to its arguments once, with the same error handling as
+    ``execute``, which saves a call through ``execute`` on every execution.
+    
+    An asynchronous function runs in the reactor thread and returns a Deferred or an awaitable, which the
+    state machine waits for before executing its next action. It must not block.
     
     Args:
         input_args (int): The expected number of input arguments.
         output_args (int): The expected number of output arguments.
         optional_inputs (bool, optional): Whether optional inputs are allowed. Defaults to False.
         optional_outputs (bool, optional): Whether optional outputs are allowed. Defaults to False.
+        asynchronous (bool, optional): Whether the function is asynchronous. Defaults to None, in which case
+            coroutine functions are asynchronous and the others are not.
     
     Returns:
         function: The decorated function.
@@ -24,46 +38,107 @@ def parsing_decorator(input_args, output_args, optional_inputs=False, optional_o
     """
     def handle_parsing_error(func, message):
         error_msg = f"Error while {message} '{func.__name__}'"
-        logging.error("[Parsing] " + error_msg)
+        logging.error("[Parsing] %s", error_msg)
         raise ParsingError(error_msg)
 
     def decorator(func):
-        @wraps(func)
-        def wrapper(line, variable_dict):
+        def parse(line):
             """
-            Wrapper function for the decorator.
-            
-            This function parses the inputs and outputs, logs the details, and calls the decorated function.
+            Parse the command line of the decorated function.
             
             Args:
                 line (str): The command line to parse.
-                variable_dict (dict): The dictionary of variables.
             
             Returns:
-                The result of the decorated function.
+                tuple: A tuple containing the input arguments and the output arguments.
             
             Raises:
-                ParsingError: If an error occurs while parsing or executing the function.
+                ParsingError: If an error occurs while parsing the command line.
             """
-            logging.debug("[Parsing] [Primitive - {}] Expecting {} input(s) and {} output(s). Optional inputs: {}. Optional outputs: {}"
-                         .format(func.__name__, input_args, output_args, optional_inputs, optional_outputs))
+            logging.debug("[Parsing] [Primitive - %s] Expecting %d input(s) and %d output(s). Optional inputs: %s. Optional outputs: %s",
+                          func.__name__, input_args, output_args, optional_inputs, optional_outputs)
             
             try:
                 inputs, outputs = Parser.parse(line, input_args, output_args, optional_inputs, optional_outputs)
-                logging.debug("[Parsing] [Primitive - {}] Received inputs: {}. Received outputs: {}".format(func.__name__, inputs, outputs))
+                logging.debug("[Parsing] [Primitive - %s] Received inputs: %s. Received outputs: %s", func.__name__, inputs, outputs)
             except ParsingError as e:
                 handle_parsing_error(func, "parsing the command line")
             except Exception as e:
                 handle_parsing_error(func, f"parsing the command line '{e}'")
+            return inputs, outputs
+
+        def execute(inputs, outputs, variable_dict):
+            """
+            Execute the decorated function with already parsed arguments.
             
+            Args:
+                inputs (list): The input arguments.
+                outputs (list): The output arguments.
+                variable_dict (dict): The dictionary of variables.
+            
+            Returns:
+                The result of the decorated function.
+            
+            Raises:
+                ParsingError: If an error occurs while executing the function.
+            """
             try:
                 return func(inputs, outputs, variable_dict)
             except ParsingError as e:
                 handle_parsing_error(func, "executing the function")
             except Exception as e:
-                logging.error("[Execution] " + str(e))
+                logging.error("[Execution] %s", e)
                 handle_parsing_error(func, "executing the function")
 
+        def bind(inputs, outputs):
+            """
+            Bind the decorated function to already parsed arguments.
+            
+            Args:
+                inputs (list): The input arguments.
+                outputs (list): The output arguments.
+            
+            Returns:
+                Callable: A function taking the dictionary of variables and returning the result of the decorated function.
+            """
+            bound = functools.partial(func, inputs, outputs)
+
+            def evaluate(variable_dict):
+                try:
+                    return bound(variable_dict)
+                except ParsingError as e:
+                    handle_parsing_error(func, "executing the function")
+                except Exception as e:
+                    logging.error("[Execution] %s", e)
+                    handle_parsing_error(func, "executing the function")
+
+            return evaluate
+
+        @wraps(func)
+        def wrapper(line, variable_dict):
+            """
+            Wrapper function for the decorator.
+            
+            This function parses the inputs and outputs, logs the details, and calls the decorated function.
+            
+            Args:
+                line (str): The command line to parse.
+                variable_dict (dict): The dictionary of variables.
+            
+            Returns:
+                The result of the decorated function.
+            
+            Raises:
+                ParsingError: If an error occurs while parsing or executing the function.
+            """
+            inputs, outputs = parse(line)
+            return execute(inputs, outputs, variable_dict)
+
+        execute.asynchronous = inspect.iscoroutinefunction(func) if asynchronous is None else asynchronous
+        wrapper.parse = parse
+        wrapper.execute = execute
+        wrapper.bind = bind
+        wrapper.asynchronous = execute.asynchronous
         return wrapper
 
     return decorator
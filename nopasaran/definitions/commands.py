@@ -11,3 +11,4 @@ class Command(Enum):
     EXECUTE_ACTION = 0
     ASSIGN_VARIABLES = 1
     SET_STATE = 2
+    RUN_REGIONS = 3
@@ -10,6 +10,22 @@ class JSONMessage(Enum):
 
     STATUS = 0
     SYNC = 1
+    WIRE_FORMATS = 2
+    TAG = 3
+    PING = 4
+    PONG = 5
+    TIMED_SYNC = 6
+
+
+class WireFormat(Enum):
+    """
+    Enum representing wire formats.
+    
+    This enum represents the formats in which messages are written on the control channel.
+    """
+
+    BASE64_JSON = 0
+    LENGTH_PREFIXED = 1
 
 
 class Status(Enum):
@@ -36,4 +36,7 @@ class EventNames(Enum):
     RESET_RECEIVED = 25
     RECEIVED_FRAMES = 26
     RECEIVED_REQUESTS = 27
-    RESPONSE_SENT = 27
\ No newline at end of file
+    RESPONSE_SENT = 27
+    CHILD_DONE = 28
+    CHILD_FAILED = 29
+    CLOCK_SYNCHRONIZED = 30
@@ -0,0 +1,14 @@
+from enum import Enum
+
+
+class JobStatus(Enum):
+    """
+    Enum representing the status of a test job.
+    
+    This enum represents the outcome of a test plan submitted to a worker daemon.
+    """
+
+    DONE = 0
+    FAILED = 1
+    INVALID = 2
+    TIMEOUT = 3
@@ -0,0 +1,14 @@
+from enum import Enum
+
+
+class ChildStatus(Enum):
+    """
+    Enum representing the status of a spawned nested machine.
+    
+    This enum represents the status of a nested machine started with the 'spawn' primitive.
+    """
+
+    RUNNING = 0
+    DONE = 1
+    FAILED = 2
+    TIMEOUT = 3
@@ -0,0 +1,18 @@
+from enum import Enum
+
+
+class ResultRecordType(Enum):
+    """
+    Enum representing the kinds of records of a result file.
+
+    This enum represents the parts of the result of a state machine streamed to a result file.
+    """
+
+    METADATA = 0
+    STATE = 1
+    VARIABLE = 2
+    OPAQUE = 3
+    TIMINGS = 4
+    VARIABLE_SIZES = 5
+    CHILDREN = 6
+    END = 7
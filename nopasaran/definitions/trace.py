@@ -0,0 +1,19 @@
+from enum import Enum
+
+
+class TraceEvent(Enum):
+    """
+    Enum representing the kinds of records of an execution trace.
+    
+    This enum represents the steps of the execution of a state machine recorded in its trace.
+    """
+
+    ACTION_START = 0
+    ACTION_END = 1
+    EVENT = 2
+    TRANSITION = 3
+    VARIABLE_WRITE = 4
+    SYNC_SENT = 5
+    SYNC_RECEIVED = 6
+    MACHINE_START = 7
+    MACHINE_END = 8
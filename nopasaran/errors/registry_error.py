@@ -0,0 +1,26 @@
+class DuplicatePrimitiveError(Exception):
+    """
+    Exception raised when two primitive classes define a primitive with the same name.
+
+    Attributes:
+        message (str): Explanation of the error.
+    """
+
+    def __init__(self, message):
+        """
+        Initializes a DuplicatePrimitiveError object.
+
+        Args:
+            message (str): Explanation of the error.
+        """
+        super().__init__(message)
+        self.message = message
+
+    def __str__(self):
+        """
+        Returns the string representation of the DuplicatePrimitiveError.
+
+        Returns:
+            str: String representation of the error.
+        """
+        return f"DuplicatePrimitiveError: {self.message}"
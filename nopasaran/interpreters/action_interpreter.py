@@ -20,5 +20,17 @@ class ActionInterpreter(Interpreter):
         Returns:
             The result of the evaluation.
         """
-        action_primitives = ActionPrimitives()
-        super().evaluate(line, state_variables, action_primitives)
+        return cls.compile(line).evaluate(state_variables)
+
+    @classmethod
+    def compile(cls, line):
+        """
+        Compile the action line into a CompiledAction bound to the action primitives.
+
+        Args:
+            line (str): The action line to compile.
+
+        Returns:
+            CompiledAction: The compiled action.
+        """
+        return super().compile(line, ActionPrimitives)
@@ -20,5 +20,17 @@ class ConditionInterpreter(Interpreter):
         Returns:
             The result of the evaluation.
         """
-        condition_primitives = ConditionPrimitives()
-        return super().evaluate(line, state_variables, condition_primitives)
+        return cls.compile(line).evaluate(state_variables)
+
+    @classmethod
+    def compile(cls, line):
+        """
+        Compile the condition line into a CompiledAction bound to the condition primitives.
+
+        Args:
+            line (str): The condition line to compile.
+
+        Returns:
+            CompiledAction: The compiled condition.
+        """
+        return super().compile(line, ConditionPrimitives)
@@ -1,5 +1,54 @@
 import cmd
 import logging
+from typing import NamedTuple, Callable, Tuple
+
+from nopasaran.errors.parsing_error import ParsingError
+
+
+class CompiledAction(NamedTuple):
+    """
+    A command line parsed once and bound to the primitive implementing it.
+
+    Attributes:
+        name (str): The name of the primitive.
+        primitive (Callable): The primitive taking the parsed inputs, outputs and the variable.
+        inputs (tuple): The parsed input arguments.
+        outputs (tuple): The parsed output arguments.
+        line (str): The original command line.
+        function (Callable): The primitive bound to the parsed arguments, taking only the variable.
+    """
+
+    name: str
+    primitive: Callable
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    line: str
+    function: Callable
+
+    def evaluate(self, variable):
+        """
+        Run the compiled command with the provided variable.
+
+        Args:
+            variable: The variable to use during execution.
+
+        Returns:
+            The result of the command execution.
+        """
+        return self.function(variable)
+
+    @property
+    def asynchronous(self):
+        """
+        Whether the primitive is asynchronous, and returns a Deferred or an awaitable to wait for.
+
+        Returns:
+            bool: True if the primitive is asynchronous, False otherwise.
+        """
+        return getattr(self.primitive, 'asynchronous', False)
+
+    def __str__(self):
+        return self.line
 
 
 class Interpreter(cmd.Cmd):
@@ -16,55 +65,48 @@ class Interpreter(cmd.Cmd):
         Args:
             line (str): The input line to evaluate.
             variable: The variable to use during evaluation.
-            function_classes: Variable-length argument list of function classes.
+            function_classes: Variable-length argument list of Primitives classes.
 
         Returns:
             The result of the evaluation.
         """
-        instance = cls()
-        instance.function_classes = function_classes
-        return instance.onecmd(line, variable)
+        return Interpreter.compile(line, *function_classes).evaluate(variable)
 
-    def onecmd(self, line, variable):
+    @classmethod
+    def compile(cls, line, *function_classes):
         """
-        Run a single command with the provided line and variable.
+        Compile the input line into a CompiledAction using the provided function classes.
+
+        The command name is resolved through the registries of the function classes and its arguments
+        are parsed once and bound to the primitive, so that the returned action can be evaluated
+        repeatedly without going through the parser again.
 
         Args:
-            line (str): The command line to execute.
-            variable: The variable to use during execution.
+            line (str): The input line to compile.
+            function_classes: Variable-length argument list of Primitives classes.
 
         Returns:
-            The result of the command execution.
-        """
-        cmd, arg, line = self.parseline(line)
-        if not line:
-            return self.emptyline()
-        if cmd is None:
-            return self.default(line, variable)
-        self.lastcmd = line
-        if line == 'EOF':
-            self.lastcmd = ''
-        if cmd == '':
-            return self.default(line, variable)
-        else:
-            for function_class in self.function_classes:
-                try:
-                    func = getattr(function_class, cmd)
-                    return func(arg, variable)
-                except AttributeError:
-                    continue
-            logging.error('[Interpreter] Primitive not recognized: "{}"'.format(cmd))
-            exit()
-
-    def default(self, line, variable):
-        """
-        Handle the default behavior when an unknown command is encountered.
-
-        Args:
-            line (str): The unknown command line.
-            variable: The variable to use during handling.
+            CompiledAction: The compiled action.
 
         Raises:
-            Exception: Parsing error with the unknown argument.
+            ParsingError: If the line is empty, malformed or refers to an unknown primitive.
         """
-        raise Exception('Parsing error: argument "' + line + '" is unknown.')
+        command, arg, parsed_line = _line_parser.parseline(line)
+        if not parsed_line or not command:
+            raise ParsingError('Parsing error: argument "' + str(line) + '" is unknown.')
+        for function_class in function_classes:
+            func = function_class.get_primitive(command)
+            if func is None:
+                continue
+            if hasattr(func, 'parse') and hasattr(func, 'bind'):
+                inputs, outputs = func.parse(arg)
+                inputs, outputs = tuple(inputs), tuple(outputs)
+                return CompiledAction(command, func.execute, inputs, outputs, parsed_line, func.bind(inputs, outputs))
+            return CompiledAction(command, lambda inputs, outputs, variable: func(arg, variable), (), (), parsed_line, lambda variable: func(arg, variable))
+        logging.error('[Interpreter] Primitive not recognized: "{}"'.format(command))
+        raise ParsingError('Primitive not recognized: "{}"'.format(command))
+
+
+# cmd.Cmd.parseline only reads the identifier characters of the instance, so a single
+# instance can split the command lines of every interpreter.
+_line_parser = cmd.Cmd()
@@ -20,5 +20,17 @@ class TransitionInterpreter(Interpreter):
         Returns:
             The result of the evaluation.
         """
-        transition_primitives = TransitionPrimitives()
-        super().evaluate(line, trans_tmp_dict, transition_primitives)
+        return cls.compile(line).evaluate(trans_tmp_dict)
+
+    @classmethod
+    def compile(cls, line):
+        """
+        Compile the transition line into a CompiledAction bound to the transition primitives.
+
+        Args:
+            line (str): The transition line to compile.
+
+        Returns:
+            CompiledAction: The compiled transition.
+        """
+        return super().compile(line, TransitionPrimitives)
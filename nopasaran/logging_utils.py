@@ -0,0 +1,114 @@
+import queue
+import logging
+import reprlib
+import logging.handlers
+
+# Bounds of the values written to the logs: longer strings and containers are truncated.
+LOG_REPR = reprlib.Repr()
+LOG_REPR.maxstring = 120
+LOG_REPR.maxother = 120
+LOG_REPR.maxlist = LOG_REPR.maxtuple = LOG_REPR.maxdict = LOG_REPR.maxset = 10
+
+
+class Lazy:
+    """
+    Argument of a log message computed only if the message is emitted.
+
+    Logging calls format their arguments only once the level of the message is known to be enabled, but
+    the arguments themselves are computed by the caller. Wrapping an expensive argument in Lazy defers its
+    computation to the formatting of the message.
+    """
+
+    __slots__ = ('function', 'args')
+
+    def __init__(self, function, *args):
+        """
+        Initialize the Lazy argument.
+
+        Args:
+            function (Callable): The function computing the argument.
+            *args: The arguments of the function.
+        """
+        self.function = function
+        self.args = args
+
+    def __str__(self):
+        return str(self.function(*self.args))
+
+    __repr__ = __str__
+
+
+def truncated(value):
+    """
+    Get a log argument formatting a value truncated to a bounded length.
+
+    Args:
+        value: The value to log, such as a packet or a list of packets.
+
+    Returns:
+        Lazy: The log argument.
+    """
+    return Lazy(LOG_REPR.repr, value)
+
+
+class MachineLogger(logging.LoggerAdapter):
+    """
+    Logger of a state machine.
+
+    The messages are prefixed with the ID of the machine, which is also attached to the log records as
+    their machine_id attribute. Like the logging functions, the adapter does nothing, not even formatting
+    the prefix, for the messages whose level is disabled.
+    """
+
+    def __init__(self, machine_id, logger=None):
+        """
+        Initialize the MachineLogger.
+
+        Args:
+            machine_id (str): The ID of the state machine.
+            logger (logging.Logger, optional): The underlying logger. Defaults to None, for the root logger.
+        """
+        super().__init__(logger or logging.getLogger(), {'machine_id': machine_id})
+        self.prefix = '[State Machine - {}] '.format(machine_id)
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = self.extra
+        return self.prefix + msg, kwargs
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler putting the log records in the queue as they are.
+
+    QueueHandler formats the message of a record before putting it in the queue, on the thread logging
+    it. The records are instead left unformatted, with their arguments, and the handlers behind the queue
+    format them on the thread of the listener. The arguments of a message must therefore not be modified
+    after it is logged.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def start_log_queue(logger=None):
+    """
+    Move the handlers of a logger behind a queue emptied by a background thread.
+
+    The threads logging a message then only put its unformatted record in the queue, while the formatting
+    of the message and the I/O of the handlers happen in the background thread.
+
+    Args:
+        logger (logging.Logger, optional): The logger. Defaults to None, for the root logger.
+
+    Returns:
+        logging.handlers.QueueListener: The started listener, to stop once the logging is over.
+    """
+    logger = logger or logging.getLogger()
+    handlers = list(logger.handlers)
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(RecordQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
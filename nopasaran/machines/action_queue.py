@@ -1,7 +1,16 @@
-from nopasaran.interpreters.transition_interpreter import TransitionInterpreter
+from collections import deque
+
 from nopasaran.definitions.transitions import StateDuringTransition
 from nopasaran.definitions.commands import Command
 
+# Names of the commands, looked up once rather than on every action.
+EXECUTE_ACTION = Command.EXECUTE_ACTION.name
+ASSIGN_VARIABLES = Command.ASSIGN_VARIABLES.name
+SET_STATE = Command.SET_STATE.name
+RUN_REGIONS = Command.RUN_REGIONS.name
+OLD_STATE = StateDuringTransition.OLD_STATE.name
+NEW_STATE = StateDuringTransition.NEW_STATE.name
+
 
 class ActionQueue:
     """
@@ -14,7 +23,7 @@ class ActionQueue:
         """
         Initialize the ActionQueue.
         """
-        self.action_list = []
+        self.action_list = deque()
 
     def __enqueue_action(self, action):
         """
@@ -33,7 +42,7 @@ class ActionQueue:
             The dequeued action, or None if the queue is empty.
         """
         if self.action_list:
-            action = self.action_list.pop(0)
+            action = self.action_list.popleft()
             return action
         return None
 
@@ -42,22 +51,22 @@ class ActionQueue:
         Add entry actions to the queue.
         
         Args:
-            entry_actions (list): The list of entry actions to add.
+            entry_actions (tuple): The compiled entry actions to add.
         """
         if entry_actions is not None:
             for action in entry_actions:
-                self.__enqueue_action({Command.EXECUTE_ACTION.name: action})
+                self.__enqueue_action({EXECUTE_ACTION: action})
 
     def add_exit_actions(self, exit_actions):
         """
         Add exit actions to the queue.
         
         Args:
-            exit_actions (list): The list of exit actions to add.
+            exit_actions (tuple): The compiled exit actions to add.
         """
         if exit_actions is not None:
             for action in exit_actions:
-                self.__enqueue_action({Command.EXECUTE_ACTION.name: action})
+                self.__enqueue_action({EXECUTE_ACTION: action})
 
     def assign_transition_variables(self, old_state_variables, transition_actions):
         """
@@ -67,16 +76,25 @@ class ActionQueue:
         
         Args:
             old_state_variables (dict): The variables from the old state.
-            transition_actions (list): The list of transition actions to evaluate.
+            transition_actions (tuple): The compiled transition actions to evaluate.
         """
         state_variables = {
-            StateDuringTransition.OLD_STATE.name: old_state_variables,
-            StateDuringTransition.NEW_STATE.name: {},
+            OLD_STATE: old_state_variables,
+            NEW_STATE: {},
         }
         if transition_actions is not None:
             for transition_action in transition_actions:
-                TransitionInterpreter.evaluate(transition_action, state_variables)
-        self.__enqueue_action({Command.ASSIGN_VARIABLES.name: state_variables[StateDuringTransition.NEW_STATE.name]})
+                transition_action.evaluate(state_variables)
+        self.__enqueue_action({ASSIGN_VARIABLES: state_variables[NEW_STATE]})
+
+    def run_regions(self, state_name):
+        """
+        Add the run of the regions of a parallel state to the queue.
+        
+        Args:
+            state_name (str): The name of the parallel state.
+        """
+        self.__enqueue_action({RUN_REGIONS: state_name})
 
     def update_state(self, state_name):
         """
@@ -85,4 +103,4 @@ class ActionQueue:
         Args:
             state_name (str): The name of the new state.
         """
-        self.__enqueue_action({Command.SET_STATE.name: state_name})
+        self.__enqueue_action({SET_STATE: state_name})
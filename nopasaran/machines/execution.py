@@ -0,0 +1,49 @@
+import inspect
+
+from twisted.internet import defer
+
+
+def is_pending(result):
+    """
+    Check whether the result of a primitive has yet to be waited for.
+
+    Args:
+        result: The result of the primitive.
+
+    Returns:
+        bool: True if the result is a Deferred or an awaitable, False otherwise.
+    """
+    return isinstance(result, defer.Deferred) or inspect.isawaitable(result)
+
+
+def as_deferred(result):
+    """
+    Wrap the result of a primitive in a Deferred.
+
+    Args:
+        result: The result of the primitive, a Deferred, an awaitable or a plain value.
+
+    Returns:
+        Deferred: A Deferred firing with the outcome of the result.
+    """
+    if isinstance(result, defer.Deferred):
+        return result
+    if inspect.isawaitable(result):
+        return defer.ensureDeferred(result)
+    return defer.succeed(result)
+
+
+def evaluate_in_reactor(action, state_machine):
+    """
+    Run an asynchronous action and wrap its outcome in a Deferred.
+
+    This function must be called from the reactor thread.
+
+    Args:
+        action (CompiledAction): The asynchronous action.
+        state_machine (StateMachine): The state machine running the action.
+
+    Returns:
+        Deferred: A Deferred firing once the action has completed.
+    """
+    return defer.maybeDeferred(action.evaluate, state_machine).addCallback(as_deferred)
@@ -0,0 +1,350 @@
+"""
+Streaming result files of state machines.
+
+A result file starts with a header and is followed by length-delimited records, each made of its kind, the
+length of its name, the length of its value, the name in UTF-8 and the value encoded like the content of the
+sync messages: packets are stored as their raw bytes, and nothing is pickled or base64-encoded. Values that
+cannot be encoded this way are stored as OPAQUE records holding their type and their representation.
+
+The records are appended while the machine runs. The variables of the root machine settle when it changes
+state: the variables written since the previous state, or assigned by the transition, are then appended
+along with the new state, and the file is flushed. Once the machine stops, the timings, the sizes of the
+variables and the state of the spawned machines are appended, followed by an END record listing the
+variables of the final result. A variable can therefore appear several times, its last record holding its
+final value, and the file of a test that did not stop has no END record.
+"""
+import os
+import time
+from struct import Struct
+from typing import NamedTuple
+
+from nopasaran.controllers.sync_codec import encode_sync, decode_sync
+from nopasaran.definitions.results import ResultRecordType
+from nopasaran.logging_utils import LOG_REPR
+
+# Magic and version.
+HEADER = Struct('!4sB')
+MAGIC = b'NPRS'
+VERSION = 1
+# Kind (ResultRecordType), length of the name and length of the value.
+RECORD = Struct('!BHI')
+
+METADATA = ResultRecordType.METADATA.value
+STATE = ResultRecordType.STATE.value
+VARIABLE = ResultRecordType.VARIABLE.value
+OPAQUE = ResultRecordType.OPAQUE.value
+TIMINGS = ResultRecordType.TIMINGS.value
+VARIABLE_SIZES = ResultRecordType.VARIABLE_SIZES.value
+CHILDREN = ResultRecordType.CHILDREN.value
+END = ResultRecordType.END.value
+# Keys of the result of a machine stored in their own record.
+RESULT_RECORDS = {"Timings": TIMINGS, "VariableSizes": VARIABLE_SIZES, "Children": CHILDREN}
+
+_MISSING = object()
+
+
+class OpaqueValue(NamedTuple):
+    """
+    A value of a result file that could not be encoded.
+
+    Attributes:
+        type (str): The name of the type of the value.
+        text (str): The representation of the value, truncated as in the logs.
+    """
+
+    type: str
+    text: str
+
+
+class ResultRecord(NamedTuple):
+    """
+    A record of a result file.
+
+    Attributes:
+        kind (ResultRecordType): The kind of the record.
+        name (str): The name of the variable or of the state, empty for the other kinds.
+        value: The value of the record, or the length of its encoded value if it was not decoded.
+    """
+
+    kind: ResultRecordType
+    name: str
+    value: object
+
+
+def encode_value(value):
+    """
+    Encode the value of a variable.
+
+    Args:
+        value: The value.
+
+    Returns:
+        tuple: The value of the ResultRecordType of the encoded value, VARIABLE or OPAQUE for a value that
+            cannot be encoded, and the encoded value.
+    """
+    try:
+        return VARIABLE, encode_sync(value)
+    except TypeError:
+        return OPAQUE, encode_sync((type(value).__name__, LOG_REPR.repr(value)))
+
+
+def decode_value(kind, data):
+    """
+    Decode the value of a variable encoded with encode_value.
+
+    Args:
+        kind (int): The value of the ResultRecordType of the encoded value.
+        data (bytes): The encoded value.
+
+    Returns:
+        The value, an OpaqueValue for an OPAQUE value.
+    """
+    value = decode_sync(data)
+    return OpaqueValue(*value) if kind == OPAQUE else value
+
+
+class ResultWriter:
+    """
+    Writer of the result file of a root state machine.
+
+    The machines sharing the variables of the root machine mark the variables they write, and the root
+    machine appends them when it changes state. Marking does not lock, and only the root machine appends.
+    """
+
+    def __init__(self, path, metadata):
+        """
+        Initialize the ResultWriter and write the header of the file.
+
+        Args:
+            path (str): The path of the file.
+            metadata (dict): The description of the test, written in the METADATA record.
+
+        Raises:
+            OSError: If the file cannot be created.
+        """
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.written = set()
+        self.flushed = {}
+        self.write(METADATA, '', metadata)
+        self.file.flush()
+
+    def write(self, kind, name, value):
+        """
+        Append a record to the file.
+
+        A VARIABLE whose value cannot be encoded is appended as an OPAQUE record.
+
+        Args:
+            kind (int): The value of the ResultRecordType of the record.
+            name (str): The name of the record.
+            value: The value of the record.
+        """
+        if kind == VARIABLE:
+            kind, data = encode_value(value)
+        else:
+            data = encode_sync(value)
+        name = name.encode('utf-8')
+        self.file.write(RECORD.pack(kind, len(name), len(data)))
+        self.file.write(name)
+        self.file.write(data)
+
+    def variable_written(self, name):
+        """
+        Mark a variable as written, to append it when the root machine changes state.
+
+        Args:
+            name (str): The name of the variable.
+        """
+        self.written.add(name)
+
+    def settle(self, state, variables):
+        """
+        Append the variables written or replaced since the previous state, then the new state, and flush
+        the file.
+
+        Args:
+            state (str): The new state of the root machine.
+            variables (VariableStore): The variables of the root machine.
+        """
+        self.write_variables(variables)
+        # The snapshot keeps the appended values without copying them.
+        self.flushed = variables.snapshot()
+        self.write(STATE, state, time.time_ns())
+        self.file.flush()
+
+    def write_variables(self, variables):
+        """
+        Append the variables written since the previous state, or whose value is not the one last appended.
+
+        Args:
+            variables (Mapping): The variables of the root machine.
+        """
+        written, self.written = self.written, set()
+        for name, value in variables.items():
+            if name in written or self.flushed.get(name, _MISSING) is not value:
+                self.write(VARIABLE, name, value)
+
+    def close(self, result):
+        """
+        Append the end of the result of the root machine and close the file.
+
+        Args:
+            result (dict): The result of the root machine, from StateMachine.result.
+        """
+        self.write_variables(result["Variables"])
+        for key, kind in RESULT_RECORDS.items():
+            if key in result:
+                self.write(kind, '', result[key])
+        self.write(END, result["State"], list(result["Variables"]))
+        self.file.close()
+        self.flushed = {}
+
+
+class ResultReader:
+    """
+    Reader of a result file, iterating over its records without loading the whole file.
+    """
+
+    def __init__(self, path):
+        """
+        Open a result file.
+
+        Args:
+            path (str): The path of the file.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file is not a result file.
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        header = self.file.read(HEADER.size)
+        magic, version = HEADER.unpack(header) if len(header) == HEADER.size else (None, None)
+        if magic != MAGIC or version != VERSION:
+            self.file.close()
+            raise ValueError('{} is not a result file of version {}'.format(path, VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self.file.close()
+
+    def scan(self):
+        """
+        Iterate over the records of the file without reading their values.
+
+        A record cut short at the end of the file, when the test did not stop, is ignored.
+
+        Yields:
+            tuple: The kind, the name, the offset and the length of the value of each record.
+        """
+        size = os.fstat(self.file.fileno()).st_size
+        self.file.seek(HEADER.size)
+        while True:
+            header = self.file.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            kind, name_length, length = RECORD.unpack(header)
+            name = self.file.read(name_length)
+            offset = self.file.tell()
+            if len(name) < name_length or offset + length > size:
+                return
+            self.file.seek(offset + length)
+            yield ResultRecordType(kind), name.decode('utf-8'), offset, length
+
+    def value(self, kind, offset, length):
+        """
+        Read and decode the value of a record.
+
+        Args:
+            kind (ResultRecordType): The kind of the record.
+            offset (int): The offset of the value.
+            length (int): The length of the value.
+
+        Returns:
+            The value, an OpaqueValue for an OPAQUE record.
+        """
+        position = self.file.tell()
+        self.file.seek(offset)
+        data = self.file.read(length)
+        self.file.seek(position)
+        return decode_value(kind.value, data)
+
+    def records(self, decode=True):
+        """
+        Iterate over the records of the file.
+
+        Args:
+            decode (bool, optional): Whether to decode the values, or give their length instead. Defaults to True.
+
+        Yields:
+            ResultRecord: The records, in the order they were written.
+        """
+        for kind, name, offset, length in self.scan():
+            yield ResultRecord(kind, name, self.value(kind, offset, length) if decode else length)
+
+    def result(self):
+        """
+        Read the result of the machine, decoding only the final value of each variable.
+
+        Returns:
+            dict: The result, as from StateMachine.result, along with the METADATA of the test and whether
+                the file is "Complete", that is, whether the machine stopped. The variables of an incomplete
+                result are the last values of all the variables written.
+        """
+        metadata = None
+        state = None
+        variables = {}
+        others = {}
+        final = None
+        for kind, name, offset, length in self.scan():
+            if kind in (ResultRecordType.VARIABLE, ResultRecordType.OPAQUE):
+                variables.pop(name, None)
+                variables[name] = (kind, offset, length)
+            elif kind == ResultRecordType.STATE:
+                state = name
+            elif kind == ResultRecordType.METADATA:
+                metadata = (kind, offset, length)
+            elif kind == ResultRecordType.END:
+                state = name
+                final = (kind, offset, length)
+            else:
+                others[kind] = (kind, offset, length)
+        names = self.value(*final) if final is not None else list(variables)
+        result = {
+            "State": state,
+            "Variables": {name: self.value(*variables[name]) for name in names if name in variables},
+        }
+        for key, kind in RESULT_RECORDS.items():
+            if ResultRecordType(kind) in others:
+                result[key] = self.value(*others[ResultRecordType(kind)])
+        result["Metadata"] = self.value(*metadata) if metadata is not None else {}
+        result["Complete"] = final is not None
+        return result
+
+
+def read_result(path):
+    """
+    Read the result of a machine from a result file.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        dict: The result, as from ResultReader.result.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not a valid result file.
+    """
+    with ResultReader(path) as reader:
+        return reader.result()
@@ -1,57 +1,207 @@
+import time
+import uuid
 import logging
-
-from nopasaran.utils import *
-from nopasaran.machines.action_queue import ActionQueue
-from nopasaran.interpreters.action_interpreter import ActionInterpreter
-from nopasaran.interpreters.condition_interpreter import ConditionInterpreter
-from nopasaran.sniffers.sniffer import Sniffer
-from nopasaran.parsers.state_machine_parser import StateMachineParser
+import threading
+from time import perf_counter_ns
+
+from twisted.internet import defer, reactor, threads
+
+from nopasaran.machines.action_queue import ActionQueue, EXECUTE_ACTION, ASSIGN_VARIABLES, SET_STATE, RUN_REGIONS
+from nopasaran.machines.execution import is_pending, as_deferred, evaluate_in_reactor
+from nopasaran.machines.variable_store import VariableStore
+from nopasaran.machines.result_stream import ResultWriter
+from nopasaran.machines.timings import Timings, PRIMITIVES, STATES, TRANSITIONS
+from nopasaran.machines.trace import (TraceBuffer, shallow_size, ACTION_START, ACTION_END, EVENT, TRANSITION, VARIABLE_WRITE,
+                                      SYNC_SENT, SYNC_RECEIVED, MACHINE_START, MACHINE_END)
+from nopasaran.logging_utils import MachineLogger, Lazy, truncated
+from nopasaran.parsers.state_machine_compiler import StateMachineCompiler, CompiledPlan, done_event
 from nopasaran.definitions.events import EventNames
-from nopasaran.definitions.commands import Command
 
 
 class StateMachine:
-    def __init__(self, state_json, parameters=[], root_state_machine=None):
+    def __init__(self, state_json, parameters=[], root_state_machine=None, parent_state_machine=None, track_variable_sizes=False,
+                 track_timings=False, trace_size=0, result_file=None):
         """
         Initialize the StateMachine.
 
         Args:
-            state_json (dict): The JSON representation of the state machine.
+            state_json (dict or CompiledPlan): The JSON representation of the state machine, or the plan already compiled from it.
             parameters (list, optional): The parameters for the state machine. Defaults to [].
             root_state_machine (StateMachine, optional): The root state machine. Defaults to None.
-        """
-        self.state_machine_parser = StateMachineParser(state_json)
-        self.machine_id = self.state_machine_parser.get_id()
-        self.current_state = self.state_machine_parser.get_initial_state()
-        self.sniffer = Sniffer(self, filter='')
-        self.variables = {}
+            parent_state_machine (StateMachine, optional): The machine owning the parallel state, if the
+                machine runs one of its regions. Defaults to None.
+            track_variable_sizes (bool, optional): Whether the result of the root machine includes the size
+                of each variable. Defaults to False.
+            track_timings (bool, optional): Whether the machine records the latency histograms of its primitives,
+                states and transitions, which the result of the root machine includes. Defaults to False.
+            trace_size (int, optional): The number of records of the execution trace of the root machine,
+                which the other machines share. Defaults to 0, for no trace.
+            result_file (str, optional): The path of the file the root machine streams its result to, instead
+                of logging it. Defaults to None.
+        """
+        self.plan = state_json if isinstance(state_json, CompiledPlan) else StateMachineCompiler.compile(state_json)
+        self.machine_id = self.plan.id + '-' + uuid.uuid4().hex[:6]
+        self.logger = MachineLogger(self.machine_id)
+        self.current_state = self.plan.initial_state
+        self._sniffer = None
+        self.parent_state_machine = parent_state_machine
+        self.variables = VariableStore() if parent_state_machine is None else parent_state_machine.variables
+        self.track_variable_sizes = track_variable_sizes
+        self.timings = Timings() if track_timings else None
+        self.state_entered = perf_counter_ns()
+        self.transition_started = None
         self.redirections = {}
         self.parameters = parameters
         self.root_state_machine = self if root_state_machine is None else root_state_machine
+        if root_state_machine is None:
+            self.trace = TraceBuffer(trace_size) if trace_size else None
+        else:
+            self.trace = root_state_machine.trace
+        if result_file is not None:
+            self.result_writer = ResultWriter(result_file, {"Test": self.plan.id, "Machine": self.machine_id,
+                                                            "Parameters": parameters, "Started": time.time_ns()})
+        else:
+            # The regions mark the variables they write for the writer of the machine owning them.
+            self.result_writer = parent_state_machine.result_writer if parent_state_machine is not None else None
+        self.trace_id = self.trace.intern(self.machine_id) if self.trace is not None else 0
+        # The machine whose track of the trace the machine runs on.
+        self.trace_track = self.machine_id
         self.returned = None
+        self.children = []
         self.actions = ActionQueue()
-        logging.info('[State Machine - {}] Parameters received: {}'.format(self.machine_id, parameters))
-        logging.debug('[State Machine - {}] Initialized.'.format(self.machine_id))
+        self.logger.info('Parameters received: %s', truncated(parameters))
+        self.logger.debug('Initialized.')
 
     def start(self):
         """
         Start the state machine and execute actions.
+
+        The machine runs in the calling thread, which must not be the reactor thread. Asynchronous
+        primitives are handed to the running reactor and the thread waits for their completion.
+        Without a running reactor, they run in the calling thread: 'wait' then sleeps, and the
+        primitives that need the reactor, such as those waiting on the control channel, raise a
+        RuntimeError.
         """
-        logging.debug('[State Machine - {}] Starting machine.'.format(self.machine_id))
-        self.trigger_event(EventNames.STARTED.name)
+        self.logger.debug('Starting machine.')
+        self.enter_initial_state()
         while True:
             next_action = self.actions.dequeue_next_action()
             if next_action is None:
-                logging.warning('[State Machine - {}] Dequeue returned None. Stopping.'.format(self.machine_id))
+                self.logger.warning('Dequeue returned None. Stopping.')
                 break
             self.execute_action(next_action)
-        if self.root_state_machine == self:
-            log_data = {
-                "State": self.current_state,
-                "Variables": self.variables
+        self.log_result()
+
+    def enter_initial_state(self):
+        """
+        Enter the initial state of the machine.
+
+        A machine is started by triggering the STARTED event in its initial state, while the region of a
+        parallel state directly executes the entry actions of its initial state.
+        """
+        self.state_entered = perf_counter_ns()
+        if self.trace is not None:
+            self.trace.record(MACHINE_START, self.trace_id, self.current_state, self.trace.intern(self.trace_track))
+        if self.parent_state_machine is None:
+            self.trigger_event(EventNames.STARTED.name)
+        else:
+            self.add_entry_actions(self.current_state)
+
+    def run(self):
+        """
+        Run the state machine in the reactor thread.
+
+        Asynchronous primitives run in the reactor thread and the machine resumes once they complete.
+        Synchronous primitives may block, so they run in the reactor thread pool. Many machines can
+        therefore run concurrently without holding a thread while they wait.
+
+        This method must be called from the reactor thread.
+
+        Returns:
+            Deferred: A Deferred firing once the machine has stopped.
+        """
+        return defer.ensureDeferred(self._run())
+
+    async def _run(self):
+        """
+        Execute the actions of the state machine, waiting for each one to complete.
+        """
+        self.logger.debug('Running machine in the reactor.')
+        self.enter_initial_state()
+        while True:
+            next_action = self.actions.dequeue_next_action()
+            if next_action is None:
+                self.logger.warning('Dequeue returned None. Stopping.')
+                break
+            action = next_action.get(EXECUTE_ACTION)
+            if RUN_REGIONS in next_action:
+                regions = self.get_regions(next_action[RUN_REGIONS])
+                await defer.gatherResults([region.run() for region in regions], consumeErrors=True)
+                self.regions_done(next_action[RUN_REGIONS], regions)
+            elif action is None:
+                self.execute_action(next_action)
+            else:
+                if self.trace is not None:
+                    self.trace.record(ACTION_START, self.trace_id, action.name)
+                start = perf_counter_ns()
+                if action.asynchronous:
+                    self.logger.debug('Executing action: %s', next_action)
+                    await evaluate_in_reactor(action, self)
+                else:
+                    self.logger.debug('Executing action in a thread: %s', next_action)
+                    result = await threads.deferToThread(action.evaluate, self)
+                    if is_pending(result):
+                        await as_deferred(result)
+                if self.timings is not None:
+                    self.timings.record(PRIMITIVES, action.name, perf_counter_ns() - start)
+                if self.trace is not None:
+                    self.trace.record(ACTION_END, self.trace_id, action.name)
+        self.log_result()
+
+    def log_result(self):
+        """
+        Log the final state and variables of the root state machine, along with the state of the
+        nested machines it spawned.
+
+        The timings of the other machines are merged into those of the root state machine instead.
+        The result is only serialized if it is logged, unless it is streamed to a result file.
+        """
+        if self.trace is not None:
+            self.trace.record(MACHINE_END, self.trace_id, self.current_state)
+        if self.timings is not None:
+            self.timings.record(STATES, self.current_state, perf_counter_ns() - self.state_entered)
+            if self.root_state_machine != self and self.root_state_machine.timings is not None:
+                self.root_state_machine.timings.merge(self.timings)
+        if self.root_state_machine == self and self.result_writer is not None:
+            self.result_writer.close(self.result())
+            logging.info('[Result] Written to %s', self.result_writer.path)
+        elif self.root_state_machine == self and logging.getLogger().isEnabledFor(logging.INFO):
+            from nopasaran.utils import serialize_log_data
+            base64_data = serialize_log_data(self.result())
+            logging.info('[Result] %s', base64_data)
+
+    def result(self):
+        """
+        Get the result of the state machine: its current state and variables, along with the size of the
+        variables, the timings and the state of the spawned nested machines when they are tracked.
+
+        Returns:
+            dict: The result.
+        """
+        result = {
+            "State": self.current_state,
+            "Variables": self.variables.snapshot()
+        }
+        if self.track_variable_sizes:
+            result["VariableSizes"] = self.variables.sizes()
+        if self.timings is not None:
+            result["Timings"] = self.timings.summary()
+        if self.children:
+            result["Children"] = {
+                child.machine.machine_id: {"State": child.machine.current_state, "Status": child.status.name}
+                for child in self.children
             }
-            base64_data = serialize_log_data(log_data)
-            logging.info('[Result] {}'.format(base64_data))
+        return result
 
     def execute_action(self, action):
         """
@@ -60,28 +210,105 @@ class StateMachine:
         Args:
             action (dict): The action to execute.
         """
-        logging.debug('[State Machine - {}] Executing action: {}'.format(self.machine_id, action))
-        if Command.EXECUTE_ACTION.name in action:
-            ActionInterpreter.evaluate(action[Command.EXECUTE_ACTION.name], self)
-        elif Command.ASSIGN_VARIABLES.name in action:
-            self.assign_variables(action[Command.ASSIGN_VARIABLES.name])
-            logging.info('[State Machine - {}] Variables assigned: {}'.format(self.machine_id, self.variables))
-        elif Command.SET_STATE.name in action:
-            self.update_state(action[Command.SET_STATE.name])
+        self.logger.debug('Executing action: %s', action)
+        if EXECUTE_ACTION in action:
+            compiled_action = action[EXECUTE_ACTION]
+            if self.trace is not None:
+                self.trace.record(ACTION_START, self.trace_id, compiled_action.name)
+            start = perf_counter_ns()
+            if compiled_action.asynchronous and reactor.running:
+                threads.blockingCallFromThread(reactor, evaluate_in_reactor, compiled_action, self)
+            else:
+                result = compiled_action.evaluate(self)
+                if is_pending(result):
+                    if not reactor.running:
+                        raise RuntimeError("Primitive '{}' needs a running reactor".format(compiled_action.name))
+                    threads.blockingCallFromThread(reactor, as_deferred, result)
+            if self.timings is not None:
+                self.timings.record(PRIMITIVES, compiled_action.name, perf_counter_ns() - start)
+            if self.trace is not None:
+                self.trace.record(ACTION_END, self.trace_id, compiled_action.name)
+        elif ASSIGN_VARIABLES in action:
+            self.assign_variables(action[ASSIGN_VARIABLES])
+            self.logger.info('Variables assigned: %s', Lazy(list, self.variables))
+        elif SET_STATE in action:
+            self.update_state(action[SET_STATE])
+        elif RUN_REGIONS in action:
+            self.run_regions(action[RUN_REGIONS])
+
+    def get_regions(self, state):
+        """
+        Create the machines running the regions of a parallel state.
+
+        The region machines share the variables of this machine.
+
+        Args:
+            state (str): The name of the parallel state.
+
+        Returns:
+            list: The machines running the regions.
+        """
+        return [
+            StateMachine(state_json=region, parameters=self.parameters, root_state_machine=self.root_state_machine, parent_state_machine=self,
+                         track_variable_sizes=self.track_variable_sizes, track_timings=self.timings is not None)
+            for region in self.plan.states[state].regions
+        ]
+
+    def run_regions(self, state):
+        """
+        Run the regions of a parallel state concurrently, each in its own thread, and wait for all of them.
+
+        Args:
+            state (str): The name of the parallel state.
+
+        Raises:
+            Exception: The first error raised by a region, once all the regions have stopped.
+        """
+        regions = self.get_regions(state)
+        errors = []
+
+        def run_region(region):
+            try:
+                region.start()
+            except Exception as e:
+                self.logger.error('Region %s failed: %s', region.machine_id, e)
+                errors.append(e)
+
+        threads_running = [threading.Thread(target=run_region, args=(region,), name=region.machine_id) for region in regions]
+        for thread in threads_running:
+            thread.start()
+        for thread in threads_running:
+            thread.join()
+        if errors:
+            raise errors[0]
+        self.regions_done(state, regions)
+
+    def regions_done(self, state, regions):
+        """
+        Handle the completion of all the regions of a parallel state, triggering its onDone transitions.
+
+        Args:
+            state (str): The name of the parallel state.
+            regions (list): The machines that ran the regions.
+        """
+        self.logger.info('Regions of state %s done in states: %s', state,
+                         Lazy(', '.join, ['{}={}'.format(region.plan.id, region.current_state) for region in regions]))
+        self.trigger_event(done_event(state))
 
     def get_nested_machine(self, nested_state_json, parameters):
         """
         Get a nested state machine.
 
         Args:
-            nested_state_json (dict): The JSON representation of the nested state machine.
+            nested_state_json (dict or CompiledPlan): The JSON representation of the nested state machine, or the plan already compiled from it.
             parameters (list): The parameters for the nested state machine.
 
         Returns:
             StateMachine: The nested state machine.
         """
-        logging.debug('[State Machine - {}] Getting nested finite state machine.'.format(self.machine_id))
-        nested_machine = StateMachine(state_json=nested_state_json, parameters=parameters, root_state_machine=self.root_state_machine)
+        self.logger.debug('Getting nested finite state machine.')
+        nested_machine = StateMachine(state_json=nested_state_json, parameters=parameters, root_state_machine=self.root_state_machine,
+                                      track_variable_sizes=self.track_variable_sizes, track_timings=self.timings is not None)
         return nested_machine
 
     def update_state(self, state):
@@ -91,32 +318,64 @@ class StateMachine:
         Args:
             state (str): The new state.
         """
-        logging.debug('[State Machine - {}] Setting state to: {}'.format(self.machine_id, state))
+        self.logger.debug('Setting state to: %s', state)
+        if self.timings is not None:
+            now = perf_counter_ns()
+            self.timings.record(STATES, self.current_state, now - self.state_entered)
+            if self.transition_started is not None:
+                self.timings.record(TRANSITIONS, (self.current_state, state), now - self.transition_started)
+                self.transition_started = None
+            self.state_entered = now
+        if self.trace is not None:
+            self.trace.record(TRANSITION, self.trace_id, state, self.trace.intern(self.current_state))
+        if self.result_writer is not None and self.root_state_machine == self:
+            self.result_writer.settle(state, self.variables)
         self.current_state = state
 
+    @property
+    def sniffer(self):
+        """
+        Get the sniffer of the state machine, creating it on first use.
+
+        The sniffer module depends on scapy, so it is only imported by the machines that need it.
+
+        Returns:
+            Sniffer: The sniffer of the state machine.
+        """
+        if self._sniffer is None:
+            from nopasaran.sniffers.sniffer import Sniffer
+            self._sniffer = Sniffer(self, filter='')
+        return self._sniffer
+
     def start_sniffer(self):
         """
         Start the sniffer for the state machine.
         """
-        logging.debug('Starting sniffer for machine with ID: {}'.format(self.machine_id))
+        self.logger.debug('Starting sniffer.')
         self.sniffer.start()
 
     def stop_sniffer(self):
         """
         Stop the sniffer for the state machine.
         """
-        logging.debug('Stopping sniffer for machine with ID: {}'.format(self.machine_id))
+        self.logger.debug('Stopping sniffer.')
         self.sniffer.stop()
 
     def assign_variables(self, variables):
         """
         Assign variables to the state machine.
 
+        The variables replace those of the machine, except in the region of a parallel state, where they
+        are written to the variables shared with the other regions.
+
         Args:
-            variables (dict): The variables to assign.
+            variables (dict): The variables to assign, which the machine takes ownership of.
         """
-        logging.debug('[State Machine - {}] Setting variables: {}'.format(self.machine_id, variables))
-        self.variables = variables
+        self.logger.debug('Setting variables: %s', Lazy(list, variables))
+        if self.parent_state_machine is None:
+            self.variables.replace(variables)
+        else:
+            self.variables.update(variables)
 
     def set_variable_value(self, name, new_value):
         """
@@ -126,7 +385,11 @@ class StateMachine:
             name (str): The name of the variable.
             new_value: The new value for the variable.
         """
-        logging.info('[State Machine - {}] Setting variable {} to: {}'.format(self.machine_id, name, new_value))
+        self.logger.info('Setting variable %s to: %s', name, truncated(new_value))
+        if self.trace is not None:
+            self.trace.record(VARIABLE_WRITE, self.trace_id, name, shallow_size(new_value))
+        if self.result_writer is not None:
+            self.result_writer.variable_written(name)
         self.variables[name] = new_value
 
     def get_variable_value(self, variable_name):
@@ -140,7 +403,7 @@ class StateMachine:
             The value of the variable.
         """
         if variable_name not in self.variables:
-            logging.error('[State Machine - {}] Variable {} does not exist.'.format(self.machine_id, variable_name))
+            self.logger.error('Variable %s does not exist.', variable_name)
         return self.variables[variable_name]
 
     def update_variable_value(self, variable_name, new_value):
@@ -151,7 +414,11 @@ class StateMachine:
             variable_name (str): The name of the variable.
             new_value: The new value for the variable.
         """
-        logging.info('[State Machine - {}] Updating variable {} to: {}'.format(self.machine_id, variable_name, new_value))
+        self.logger.info('Updating variable %s to: %s', variable_name, truncated(new_value))
+        if self.trace is not None:
+            self.trace.record(VARIABLE_WRITE, self.trace_id, variable_name, shallow_size(new_value))
+        if self.result_writer is not None:
+            self.result_writer.variable_written(variable_name)
         self.variables[variable_name] = new_value
 
     def update_sniffer_filter(self, filter):
@@ -172,6 +439,20 @@ class StateMachine:
         """
         self.sniffer.queue = queue
 
+    def trace_sync(self, sent, session, tag=None):
+        """
+        Record a sync message sent or received on a control channel session in the execution trace.
+
+        Args:
+            sent (bool): Whether the message is sent, rather than received.
+            session (WorkerSession): The session of the message.
+            tag (str, optional): The tag of the message. Defaults to None.
+        """
+        if self.trace is not None:
+            kind = SYNC_SENT if sent else SYNC_RECEIVED
+            name = '{}:{}'.format(session.session_id, '' if tag is None else tag)
+            self.trace.record(kind, self.trace_id, name, self.trace.sequence(kind, name))
+
     def add_redirection(self, event, state):
         """
         Add a redirection from an event to a state.
@@ -180,7 +461,7 @@ class StateMachine:
             event (str): The event to redirect.
             state (str): The state to redirect to.
         """
-        logging.debug('[State Machine - {}] Adding redirection from event {} to state {}.'.format(self.machine_id, event, state))
+        self.logger.debug('Adding redirection from event %s to state %s.', event, state)
         self.redirections[event] = state
 
     def trigger_event(self, event):
@@ -190,47 +471,56 @@ class StateMachine:
         Args:
             event (str): The event to trigger.
         """
-        logging.debug('[State Machine - {}] Event {} triggered'.format(self.machine_id, event))
-        next_states = self.state_machine_parser.get_next_states_on_event(self.current_state, event)
-        if next_states is not None:
-            self.make_transition(next_states)
+        self.logger.debug('Event %s triggered', event)
+        if self.trace is not None:
+            self.trace.record(EVENT, self.trace_id, event)
+        transitions = self.plan.states[self.current_state].transitions.get(event)
+        if transitions is not None:
+            self.make_transition(transitions)
         elif event in self.redirections:
             self.add_transition_actions(self.redirections[event])
         else:
-            logging.warning('[State Machine - {}] No matching event for {}. Skipping.'.format(self.machine_id, event))
+            self.logger.warning('No matching event for %s. Skipping.', event)
 
-    def add_transition_actions(self, next_state_name, assignable=False, state=None):
+    def add_transition_actions(self, next_state_name, assignable=False, transition=None):
         """
         Add transition actions for the next state.
 
         Args:
             next_state_name (str): The name of the next state.
             assignable (bool, optional): Whether the transition is assignable. Defaults to False.
-            state (dict, optional): The state transition. Defaults to None.
+            transition (CompiledTransition, optional): The transition taken. Defaults to None.
         """
-        self.actions.add_exit_actions(self.state_machine_parser.get_exit_actions(self.current_state))
-        if assignable and state is not None:
-            self.actions.assign_transition_variables(self.variables, self.state_machine_parser.get_transition_actions(state))
+        if self.timings is not None:
+            self.transition_started = perf_counter_ns()
+        self.actions.add_exit_actions(self.plan.states[self.current_state].exit)
+        if assignable and transition is not None:
+            self.actions.assign_transition_variables(self.variables.view(), transition.actions)
         self.actions.update_state(next_state_name)
-        self.actions.add_entry_actions(self.state_machine_parser.get_entry_actions(next_state_name))
+        self.add_entry_actions(next_state_name)
 
-    def make_transition(self, possible_states):
+    def add_entry_actions(self, state_name):
+        """
+        Add the entry actions of a state, followed by the run of its regions if it is a parallel state.
+
+        Args:
+            state_name (str): The name of the state.
+        """
+        self.actions.add_entry_actions(self.plan.states[state_name].entry)
+        if self.plan.states[state_name].regions:
+            self.actions.run_regions(state_name)
+
+    def make_transition(self, transitions):
         """
         Make a state transition.
 
+        The first transition whose guard holds, if any, is taken.
+
         Args:
-            possible_states (list): The possible states for the transition.
+            transitions (tuple): The candidate transitions for the triggered event.
         """
-        def validate_conditions(conditions):
-            if conditions is not None:
-                return ConditionInterpreter.evaluate(conditions, self.variables)
-            else:
-                return True
-
-        for state in possible_states:
-            next_state_name = self.state_machine_parser.get_next_state_name(state)
-            if next_state_name is not None and next_state_name in self.state_machine_parser.get_states():
-                conditions = self.state_machine_parser.get_conditions(state)
-                if validate_conditions(conditions):
-                    self.add_transition_actions(next_state_name, assignable=True, state=state)
-                    break
\ No newline at end of file
+        variables = self.variables.view()
+        for transition in transitions:
+            if transition.condition is None or transition.condition.evaluate(variables):
+                self.add_transition_actions(transition.target, assignable=True, transition=transition)
+                break
@@ -0,0 +1,226 @@
+import threading
+
+# Each power of two is split into 2 ** SUB_BUCKET_BITS buckets, which bounds the error of the recorded
+# values to about 3%. Values below 2 ** (SUB_BUCKET_BITS + 1) ns are recorded exactly.
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+EXACT_LIMIT = SUB_BUCKETS << 1
+# Enough buckets for any duration below 2 ** 64 ns.
+BUCKET_COUNT = (64 - SUB_BUCKET_BITS) * SUB_BUCKETS + SUB_BUCKETS
+
+# Categories of the recorded durations.
+PRIMITIVES = 'Primitives'
+STATES = 'States'
+TRANSITIONS = 'Transitions'
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations in nanoseconds, with log-linear buckets in the manner of HDR histograms.
+
+    Recording a value is a constant-time increment in a preallocated table of buckets, whatever the range
+    of the values. The percentiles are read back with a relative error of about 3%, while the count and
+    the maximum are exact.
+    """
+
+    __slots__ = ('counts', 'count', 'max')
+
+    def __init__(self):
+        """
+        Initialize the LatencyHistogram.
+        """
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.max = 0
+
+    def record(self, value):
+        """
+        Record a duration.
+
+        Args:
+            value (int): The duration, in nanoseconds.
+        """
+        self.count += 1
+        if value > self.max:
+            self.max = value
+        if value < EXACT_LIMIT:
+            self.counts[value] += 1
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            self.counts[(shift << SUB_BUCKET_BITS) + (value >> shift)] += 1
+
+    def merge(self, other):
+        """
+        Add the durations recorded by another histogram to this one.
+
+        Args:
+            other (LatencyHistogram): The histogram to merge.
+        """
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    @staticmethod
+    def bucket_value(index):
+        """
+        Get the value representing a bucket, the middle of its range.
+
+        Args:
+            index (int): The index of the bucket.
+
+        Returns:
+            int: The value, in nanoseconds.
+        """
+        if index < EXACT_LIMIT:
+            return index
+        shift = (index >> SUB_BUCKET_BITS) - 1
+        top = (index & (SUB_BUCKETS - 1)) | SUB_BUCKETS
+        return (top << shift) + (1 << (shift - 1))
+
+    def percentile(self, percent):
+        """
+        Get a percentile of the recorded durations.
+
+        Args:
+            percent (float): The percentile, between 0 and 100.
+
+        Returns:
+            int: The duration, in nanoseconds, or 0 if no duration was recorded.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Summarize the recorded durations.
+
+        Returns:
+            dict: The count of durations, and their median, 99th percentile and maximum in microseconds.
+        """
+        return {
+            "count": self.count,
+            "p50_us": self.percentile(50) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "max_us": self.max / 1000,
+        }
+
+
+class Timings:
+    """
+    Latency histograms of the primitives, states and transitions of state machines.
+
+    Every thread records to its own histograms, without locking, as recording runs on every action. The
+    histograms of the threads are merged under the lock when the Timings are summarized. The Timings of the
+    nested machines and of the regions of parallel states are merged into the Timings of the root machine
+    once they stop.
+
+    The durations are measured with the monotonic clock: a primitive call lasts until its result is
+    available, a state from the moment it is set until the next one is, and a transition from the moment
+    it is taken until its target state is set, which includes its exit actions and assignments.
+    """
+
+    def __init__(self):
+        """
+        Initialize the Timings.
+        """
+        # The histograms merged from other Timings, followed by those of each thread that recorded.
+        self.merged = {PRIMITIVES: {}, STATES: {}, TRANSITIONS: {}}
+        self.tables = [self.merged]
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def thread_histograms(self):
+        """
+        Get the histograms of the current thread, creating them on its first record.
+
+        Returns:
+            dict: The histograms of the thread, by category and by name.
+        """
+        histograms = getattr(self.local, 'histograms', None)
+        if histograms is None:
+            histograms = self.local.histograms = {PRIMITIVES: {}, STATES: {}, TRANSITIONS: {}}
+            with self.lock:
+                self.tables.append(histograms)
+        return histograms
+
+    def record(self, category, name, duration):
+        """
+        Record the duration of an operation in the histograms of the current thread.
+
+        Args:
+            category (str): The category of the operation: PRIMITIVES, STATES or TRANSITIONS.
+            name (str): The name of the primitive or state, or the source and target states of the transition.
+            duration (int): The duration of the operation, in nanoseconds, measured with perf_counter_ns.
+        """
+        try:
+            histograms = self.local.histograms[category]
+        except AttributeError:
+            histograms = self.thread_histograms()[category]
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = LatencyHistogram()
+        # LatencyHistogram.record, inlined as it runs on every action.
+        histogram.count += 1
+        if duration > histogram.max:
+            histogram.max = duration
+        if duration < EXACT_LIMIT:
+            histogram.counts[duration] += 1
+        else:
+            shift = duration.bit_length() - SUB_BUCKET_BITS - 1
+            histogram.counts[(shift << SUB_BUCKET_BITS) + (duration >> shift)] += 1
+
+    def collect(self):
+        """
+        Merge the histograms of all the threads.
+
+        A thread recording meanwhile may have its last duration left out.
+
+        Returns:
+            dict: New histograms, by category and by name.
+        """
+        collected = {PRIMITIVES: {}, STATES: {}, TRANSITIONS: {}}
+        with self.lock:
+            for table in self.tables:
+                for category, histograms in table.items():
+                    # Copied first, as the thread of the table can add a histogram meanwhile.
+                    for name, histogram in list(histograms.items()):
+                        collected[category].setdefault(name, LatencyHistogram()).merge(histogram)
+        return collected
+
+    def merge(self, other):
+        """
+        Add the durations recorded by other Timings to these.
+
+        Args:
+            other (Timings): The Timings to merge.
+        """
+        collected = other.collect()
+        with self.lock:
+            for category, histograms in collected.items():
+                for name, histogram in histograms.items():
+                    self.merged[category].setdefault(name, LatencyHistogram()).merge(histogram)
+
+    def summary(self):
+        """
+        Summarize the recorded durations.
+
+        Returns:
+            dict: The summary of each histogram, by category and by name.
+        """
+        return {
+            category: {
+                name if isinstance(name, str) else ' -> '.join(name): histogram.summary()
+                for name, histogram in sorted(histograms.items())
+            }
+            for category, histograms in self.collect().items()
+        }
@@ -0,0 +1,215 @@
+import sys
+import json
+import time
+import threading
+import itertools
+from struct import Struct
+from typing import NamedTuple
+from time import perf_counter_ns
+
+from nopasaran.definitions.trace import TraceEvent
+
+# Timestamp (perf_counter_ns), kind (TraceEvent), machine ID and name (indexes in the string table), value.
+RECORD = Struct('<QBIIq')
+# Magic, version, capacity, number of records ever recorded, perf_counter_ns and time_ns at the time of the
+# dump, and length of the string table.
+HEADER = Struct('<4sBIQQQI')
+MAGIC = b'NPTR'
+VERSION = 1
+
+# Default number of records of a trace buffer, about 1.6 MB.
+DEFAULT_TRACE_SIZE = 65536
+
+# Kinds of records, looked up once rather than on every record.
+ACTION_START = TraceEvent.ACTION_START.value
+ACTION_END = TraceEvent.ACTION_END.value
+EVENT = TraceEvent.EVENT.value
+TRANSITION = TraceEvent.TRANSITION.value
+VARIABLE_WRITE = TraceEvent.VARIABLE_WRITE.value
+SYNC_SENT = TraceEvent.SYNC_SENT.value
+SYNC_RECEIVED = TraceEvent.SYNC_RECEIVED.value
+MACHINE_START = TraceEvent.MACHINE_START.value
+MACHINE_END = TraceEvent.MACHINE_END.value
+# Kinds of records whose value is an index in the table of strings.
+STRING_VALUES = (TraceEvent.TRANSITION, TraceEvent.MACHINE_START)
+
+
+def shallow_size(value):
+    """
+    Get the size of a value without walking its content.
+
+    Args:
+        value: The value.
+
+    Returns:
+        int: The length of strings, bytes and containers, or the size in memory of other values.
+    """
+    if isinstance(value, (bytes, bytearray, str, list, tuple, dict, set, frozenset)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class TraceRecord(NamedTuple):
+    """
+    A record of an execution trace.
+
+    Attributes:
+        timestamp (int): The time of the record, from perf_counter_ns.
+        kind (TraceEvent): The kind of the record.
+        machine (str): The ID of the state machine.
+        name (str): The name of the action, event, target state, variable or sync message, or the
+            initial or final state of the machine.
+        value: The source state of a transition, the machine whose track a machine starts on, the size of a
+            variable write, the sequence number of a sync message, 0 otherwise.
+    """
+
+    timestamp: int
+    kind: TraceEvent
+    machine: str
+    name: str
+    value: object
+
+
+class Trace(NamedTuple):
+    """
+    An execution trace read from a file.
+
+    Attributes:
+        records (list): The TraceRecord entries, oldest first.
+        dropped (int): The number of older records overwritten in the ring buffer.
+        clock_offset (int): The offset to add to the timestamps to get the time since the epoch, in nanoseconds.
+    """
+
+    records: list
+    dropped: int
+    clock_offset: int
+
+
+class TraceBuffer:
+    """
+    Ring buffer of the execution trace of state machines.
+
+    The buffer is allocated once with room for a fixed number of records, and the oldest records are
+    overwritten once it is full. A record is packed in place with the monotonic time, the kind of the record,
+    the machine, a name and an integer. The machine IDs and the names are stored once in a table of strings
+    and recorded as indexes in this table.
+
+    The machines of a test share the buffer of the root machine. Recording does not lock: the slot of each
+    record is taken from an atomic counter.
+    """
+
+    def __init__(self, size=DEFAULT_TRACE_SIZE):
+        """
+        Initialize the TraceBuffer.
+
+        Args:
+            size (int, optional): The number of records the buffer holds. Defaults to DEFAULT_TRACE_SIZE.
+        """
+        self.size = size
+        self.buffer = bytearray(RECORD.size * size)
+        self.counter = itertools.count()
+        self.strings = {}
+        self.sequences = {}
+        self.lock = threading.Lock()
+
+    def intern(self, string):
+        """
+        Get the index of a string in the table of strings, adding it if needed.
+
+        Args:
+            string (str): The string.
+
+        Returns:
+            int: The index of the string.
+        """
+        index = self.strings.get(string)
+        if index is None:
+            with self.lock:
+                index = self.strings.setdefault(string, len(self.strings))
+        return index
+
+    def sequence(self, kind, name):
+        """
+        Get the next sequence number of the records of a kind and a name.
+
+        The sync messages of both workers are numbered this way, so that the n-th message sent by one
+        worker with a tag on a session matches the n-th message received with that tag by the other.
+
+        Args:
+            kind (int): The value of the TraceEvent of the record.
+            name (str): The name of the record.
+
+        Returns:
+            int: The sequence number, starting at 0.
+        """
+        counter = self.sequences.get((kind, name))
+        if counter is None:
+            with self.lock:
+                counter = self.sequences.setdefault((kind, name), itertools.count())
+        return next(counter)
+
+    def record(self, kind, machine, name, value=0):
+        """
+        Record a step of the execution.
+
+        Args:
+            kind (int): The value of the TraceEvent of the record.
+            machine (int): The index of the ID of the machine, from intern.
+            name (str): The name of the action, event, target state or variable.
+            value (int, optional): The source state of a transition or the track of a machine, from intern, the size
+                of a variable write or the sequence number of a sync message. Defaults to 0.
+        """
+        index = self.strings.get(name)
+        if index is None:
+            index = self.intern(name)
+        RECORD.pack_into(self.buffer, next(self.counter) % self.size * RECORD.size, perf_counter_ns(), kind, machine, index, value)
+
+    def dump(self, path):
+        """
+        Write the records of the buffer to a file, oldest first.
+
+        Args:
+            path (str): The path of the file.
+        """
+        # Read the counter without taking a slot.
+        recorded = next(self.counter)
+        self.counter = itertools.count(recorded)
+        start = recorded % self.size * RECORD.size if recorded > self.size else 0
+        end = min(recorded, self.size) * RECORD.size
+        records = self.buffer[start:end] + self.buffer[:start] if start else self.buffer[:end]
+        with self.lock:
+            strings = sorted(self.strings, key=self.strings.get)
+        table = json.dumps(strings).encode()
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.size, recorded, perf_counter_ns(), time.time_ns(), len(table)))
+            f.write(table)
+            f.write(records)
+
+    @staticmethod
+    def load(path):
+        """
+        Read an execution trace written by dump.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            Trace: The trace.
+
+        Raises:
+            ValueError: If the file is not a trace.
+        """
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError('Truncated trace header')
+            magic, version, size, recorded, perf_counter, wall_clock, table_length = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('Not a trace file, or unsupported version')
+            strings = json.loads(f.read(table_length))
+            data = f.read()
+        records = []
+        for timestamp, kind, machine, name, value in RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]):
+            kind = TraceEvent(kind)
+            records.append(TraceRecord(timestamp, kind, strings[machine], strings[name], strings[value] if kind in STRING_VALUES else value))
+        return Trace(records, max(0, recorded - size), wall_clock - perf_counter)
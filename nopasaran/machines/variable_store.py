@@ -0,0 +1,141 @@
+import sys
+import threading
+from types import MappingProxyType
+from collections.abc import MutableMapping
+
+
+def value_size(value, _depth=0):
+    """
+    Estimate the size of the data held by a variable.
+
+    Strings, bytes and packets count their length, containers the sizes of their items, and other values
+    their size in memory as reported by sys.getsizeof.
+
+    Args:
+        value: The value of the variable.
+
+    Returns:
+        int: The estimated size, in bytes.
+    """
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if _depth > 8:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sum(value_size(key, _depth + 1) + value_size(item, _depth + 1) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(value_size(item, _depth + 1) for item in value)
+    packet_module = sys.modules.get('scapy.packet')
+    if packet_module is not None and isinstance(value, packet_module.Packet):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class VariableStore(MutableMapping):
+    """
+    Copy-on-write store of the variables of a state machine.
+
+    The store behaves like a dictionary. Taking a snapshot is O(1): the snapshot shares the variables
+    of the store, and the store only copies its table of variables, not their values, on the first write
+    after the snapshot. A snapshot therefore never changes, and the values themselves are never copied.
+
+    The size of the variables is accounted on demand with value_size.
+    """
+
+    __slots__ = ('_variables', '_shared', '_lock')
+
+    def __init__(self, variables=None):
+        """
+        Initialize the VariableStore.
+
+        Args:
+            variables (dict, optional): The initial variables, which the store takes ownership of. Defaults to None.
+        """
+        self._variables = {} if variables is None else variables
+        self._shared = False
+        self._lock = threading.Lock()
+
+    def _own(self):
+        """
+        Copy the table of variables if it is shared with a snapshot, before writing to it.
+
+        This method must be called with the lock held, along with the write, so that a snapshot taken
+        concurrently, such as by a spawned machine, never sees the write.
+        """
+        if self._shared:
+            self._variables = dict(self._variables)
+            self._shared = False
+
+    def __getitem__(self, name):
+        return self._variables[name]
+
+    def __setitem__(self, name, value):
+        with self._lock:
+            self._own()
+            self._variables[name] = value
+
+    def __delitem__(self, name):
+        with self._lock:
+            self._own()
+            del self._variables[name]
+
+    def __contains__(self, name):
+        return name in self._variables
+
+    def __iter__(self):
+        return iter(self._variables)
+
+    def __len__(self):
+        return len(self._variables)
+
+    def __repr__(self):
+        return repr(self._variables)
+
+    def get(self, name, default=None):
+        return self._variables.get(name, default)
+
+    def view(self):
+        """
+        Get a live read-only view of the variables.
+
+        Unlike a snapshot, the view reflects the later writes to the store, until the store copies its
+        table of variables. It is meant for the guards and the transition actions, which read many
+        variables in a row.
+
+        Returns:
+            Mapping: The read-only view.
+        """
+        return MappingProxyType(self._variables)
+
+    def snapshot(self):
+        """
+        Take a read-only snapshot of the variables.
+
+        Returns:
+            Mapping: The variables at the time of the snapshot.
+        """
+        with self._lock:
+            self._shared = True
+            return MappingProxyType(self._variables)
+
+    def replace(self, variables):
+        """
+        Replace all the variables, as a transition does.
+
+        The snapshots taken before keep the previous variables.
+
+        Args:
+            variables (dict): The new variables, which the store takes ownership of.
+        """
+        with self._lock:
+            self._variables = variables
+            self._shared = False
+
+    def sizes(self):
+        """
+        Get the estimated size of each variable.
+
+        Returns:
+            dict: The size of each variable, in bytes, by name.
+        """
+        return {name: value_size(value) for name, value in list(self._variables.items())}
@@ -0,0 +1,150 @@
+import os
+import json
+import logging
+import threading
+
+from nopasaran.parsers.state_machine_compiler import StateMachineCompiler
+
+# Primitives whose first input names a nested state machine, and primitives whose first input names a JSON file.
+NESTED_MACHINE_PRIMITIVES = frozenset(('call', 'spawn'))
+JSON_FILE_PRIMITIVES = frozenset(('get_from_file',))
+FILE_PRIMITIVES = NESTED_MACHINE_PRIMITIVES | JSON_FILE_PRIMITIVES
+
+
+def definition_path(name):
+    """
+    Get the path of the JSON file of a nested state machine or of a variables file.
+
+    Args:
+        name (str): The name of the state machine or of the file, without the extension.
+
+    Returns:
+        str: The path of the JSON file.
+    """
+    return '.'.join((name, 'json'))
+
+
+class DefinitionCache:
+    """
+    Process-wide cache of the JSON files loaded by the state machines.
+
+    Files are cached by absolute path, along with their modification time and size: a file changed on disk
+    is loaded again on its next use. State machine definitions are cached as compiled plans, so a nested
+    machine called many times is read and compiled once.
+    """
+
+    _entries = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _load(cls, kind, path, build):
+        """
+        Load a JSON file through the cache.
+
+        Args:
+            kind (str): The kind of value built from the file, part of the cache key.
+            path (str): The path of the JSON file.
+            build (Callable): The function building the cached value from the loaded JSON.
+
+        Returns:
+            The cached value.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file is not valid JSON.
+        """
+        path = os.path.abspath(path)
+        status = os.stat(path)
+        stamp = (status.st_mtime_ns, status.st_size)
+        entry = cls._entries.get((kind, path))
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        with open(path) as json_file:
+            value = build(json.load(json_file))
+        with cls._lock:
+            cls._entries[(kind, path)] = (stamp, value)
+        logging.debug('[Definition Cache] Loaded {} from {}'.format(kind, path))
+        return value
+
+    @classmethod
+    def load_json(cls, path):
+        """
+        Load a JSON file.
+
+        The returned value is shared by all the users of the file and must not be modified.
+
+        Args:
+            path (str): The path of the JSON file.
+
+        Returns:
+            The loaded JSON.
+        """
+        return cls._load('json', path, lambda data: data)
+
+    @classmethod
+    def load_plan(cls, path):
+        """
+        Load and compile a state machine definition.
+
+        Args:
+            path (str): The path of the JSON file of the state machine.
+
+        Returns:
+            CompiledPlan: The compiled state machine.
+
+        Raises:
+            ParsingError: If the state machine cannot be compiled.
+        """
+        return cls._load('plan', path, StateMachineCompiler.compile)
+
+    @classmethod
+    def clear(cls):
+        """
+        Empty the cache.
+        """
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def preload(cls, plan):
+        """
+        Load every nested state machine and JSON file reachable from a compiled plan.
+
+        The nested machines named by the 'call' and 'spawn' primitives are compiled, and searched in turn,
+        as are the regions of parallel states. The files read by the 'get_from_file' primitive are loaded.
+        A plan whose primitives, regions included, read no file is not searched.
+        A missing or invalid file is thereby reported before the machine starts, and the machine does not
+        read any definition while it runs.
+
+        Args:
+            plan (CompiledPlan): The compiled root state machine.
+
+        Returns:
+            list: The paths of the loaded files.
+
+        Raises:
+            OSError: If a file cannot be read.
+            ValueError: If a file is not valid JSON.
+            ParsingError: If a nested state machine cannot be compiled.
+        """
+        loaded = set()
+        pending = [plan]
+        while pending:
+            current = pending.pop()
+            if current.primitives.isdisjoint(FILE_PRIMITIVES):
+                continue
+            for state in current.states.values():
+                pending.extend(state.regions)
+                for action in state.entry + state.exit:
+                    if not action.inputs or action.name not in FILE_PRIMITIVES:
+                        continue
+                    path = definition_path(action.inputs[0])
+                    if path in loaded:
+                        continue
+                    loaded.add(path)
+                    if action.name in NESTED_MACHINE_PRIMITIVES:
+                        pending.append(cls.load_plan(path))
+                    else:
+                        cls.load_json(path)
+        logging.info('[Definition Cache] Preloaded {} file(s)'.format(len(loaded)))
+        return sorted(loaded)
@@ -0,0 +1,195 @@
+import sys
+import logging
+from types import MappingProxyType
+from typing import NamedTuple, Optional, Tuple, Mapping, FrozenSet
+
+from nopasaran.parsers.state_machine_parser import StateMachineParser
+from nopasaran.interpreters.interpreter import CompiledAction
+from nopasaran.interpreters.action_interpreter import ActionInterpreter
+from nopasaran.interpreters.condition_interpreter import ConditionInterpreter
+from nopasaran.interpreters.transition_interpreter import TransitionInterpreter
+
+
+class CompiledTransition(NamedTuple):
+    """
+    A transition of a compiled state machine.
+
+    Attributes:
+        target (str): The interned name of the target state.
+        condition (CompiledAction or None): The compiled guard, or None if the transition is unguarded.
+        actions (tuple): The compiled transition actions.
+    """
+
+    target: str
+    condition: Optional[CompiledAction]
+    actions: Tuple[CompiledAction, ...]
+
+
+class CompiledState(NamedTuple):
+    """
+    A state of a compiled state machine.
+
+    Attributes:
+        name (str): The interned name of the state.
+        entry (tuple): The compiled entry actions.
+        exit (tuple): The compiled exit actions.
+        transitions (Mapping): The read-only table mapping each event to its candidate transitions.
+        regions (tuple): The compiled regions of a parallel state, empty for other states.
+    """
+
+    name: str
+    entry: Tuple[CompiledAction, ...]
+    exit: Tuple[CompiledAction, ...]
+    transitions: Mapping[str, Tuple[CompiledTransition, ...]]
+    regions: Tuple['CompiledPlan', ...] = ()
+
+
+class CompiledPlan(NamedTuple):
+    """
+    The immutable execution representation of a state machine JSON definition.
+
+    Attributes:
+        id (str): The ID of the state machine as written in the JSON definition.
+        initial_state (str): The interned name of the initial state.
+        states (Mapping): The read-only table mapping each state name to its CompiledState.
+        primitives (frozenset): The names of the action primitives used by the state machine.
+    """
+
+    id: str
+    initial_state: str
+    states: Mapping[str, CompiledState]
+    primitives: FrozenSet[str]
+
+
+def done_event(state_name):
+    """
+    Get the event triggered once all the regions of a parallel state are done.
+
+    Args:
+        state_name (str): The name of the parallel state.
+
+    Returns:
+        str: The name of the event, which triggers the onDone transitions of the state.
+    """
+    return sys.intern('done.state.' + state_name)
+
+
+class StateMachineCompiler:
+    """
+    Compiler turning a state machine JSON definition into a CompiledPlan.
+
+    The JSON definition is walked once: state names are interned, the transitions of each state are
+    indexed by event, and every entry, exit, guard and transition action is parsed and bound to its
+    primitive. Running the resulting plan does not require any further parsing or lookup in the JSON.
+    Binding the actions is also what loads the modules of the primitives the plan uses, and only those.
+
+    The regions of a parallel state are compiled as state machines of their own, and its onDone
+    transitions are indexed under the event returned by done_event.
+    """
+
+    @staticmethod
+    def compile(state_json):
+        """
+        Compile a state machine JSON definition.
+
+        Args:
+            state_json (dict): The JSON representation of the state machine.
+
+        Returns:
+            CompiledPlan: The compiled state machine.
+
+        Raises:
+            ParsingError: If an action, guard or transition action cannot be compiled.
+        """
+        parser = StateMachineParser(state_json)
+        state_names = {sys.intern(name) for name in parser.get_states()}
+
+        states = {}
+        for name in state_names:
+            states[name] = CompiledState(
+                name=name,
+                entry=StateMachineCompiler._compile_actions(parser.get_entry_actions(name), ActionInterpreter),
+                exit=StateMachineCompiler._compile_actions(parser.get_exit_actions(name), ActionInterpreter),
+                transitions=StateMachineCompiler._compile_transitions(parser, name, state_names),
+                regions=StateMachineCompiler._compile_regions(parser, name)
+            )
+
+        logging.debug('[Compiler] State machine {} compiled with {} state(s).'.format(state_json['id'], len(states)))
+        return CompiledPlan(
+            id=state_json['id'],
+            initial_state=sys.intern(parser.get_initial_state()),
+            states=MappingProxyType(states),
+            primitives=frozenset(action.name for state in states.values() for action in state.entry + state.exit).union(
+                *(region.primitives for state in states.values() for region in state.regions))
+        )
+
+    @staticmethod
+    def _compile_regions(parser, state_name):
+        """
+        Compile the regions of a parallel state.
+
+        Args:
+            parser (StateMachineParser): The parser of the state machine JSON definition.
+            state_name (str): The name of the state.
+
+        Returns:
+            tuple: The compiled regions, empty if the state is not a parallel state.
+        """
+        if not parser.is_parallel(state_name):
+            return ()
+        return tuple(
+            StateMachineCompiler.compile(dict(region, id=region_name))
+            for region_name, region in parser.get_regions(state_name).items()
+        )
+
+    @staticmethod
+    def _compile_actions(lines, interpreter):
+        """
+        Compile a list of command lines with the given interpreter.
+
+        Args:
+            lines (list or None): The command lines to compile.
+            interpreter: The interpreter class used to compile each line.
+
+        Returns:
+            tuple: The compiled actions.
+        """
+        if lines is None:
+            return ()
+        return tuple(interpreter.compile(line) for line in lines)
+
+    @staticmethod
+    def _compile_transitions(parser, state_name, state_names):
+        """
+        Compile the transitions of a state into an event table.
+
+        Transitions whose target is missing or not a state of the machine are dropped, as they
+        can never be taken.
+
+        Args:
+            parser (StateMachineParser): The parser of the state machine JSON definition.
+            state_name (str): The name of the state.
+            state_names (set): The names of all the states of the machine.
+
+        Returns:
+            Mapping: The read-only table mapping each event to its candidate transitions.
+        """
+        events = [(event, parser.get_next_states_on_event(state_name, event)) for event in parser.states[state_name].get('on', {})]
+        if parser.is_parallel(state_name) and parser.get_done_transitions(state_name) is not None:
+            events.append((done_event(state_name), parser.get_done_transitions(state_name)))
+        table = {}
+        for event, possible_states in events:
+            transitions = []
+            for possible_state in possible_states:
+                target = parser.get_next_state_name(possible_state)
+                if target is None or target not in state_names:
+                    logging.warning('[Compiler] Ignoring transition on {} from state {} to unknown state {}.'.format(event, state_name, target))
+                    continue
+                condition = parser.get_conditions(possible_state)
+                transitions.append(CompiledTransition(
+                    target=sys.intern(target),
+                    condition=ConditionInterpreter.compile(condition) if condition is not None else None,
+                    actions=StateMachineCompiler._compile_actions(parser.get_transition_actions(possible_state), TransitionInterpreter)
+                ))
+            table[sys.intern(event)] = tuple(transitions)
+        return MappingProxyType(table)
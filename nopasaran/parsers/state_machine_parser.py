@@ -124,6 +124,46 @@ class StateMachineParser:
             return ArrayParser.get_safe_array(self.states[state]['on'][event])
         return None
     
+    def get_done_transitions(self, state):
+        """
+        Get the transitions taken once all the regions of a parallel state are done.
+        
+        Args:
+            state (str): The parallel state for which to get the transitions.
+        
+        Returns:
+            list or None: The list of transitions, or None if no onDone transition is defined.
+        """
+        if 'onDone' in self.states[state]:
+            return ArrayParser.get_safe_array(self.states[state]['onDone'])
+        return None
+
+    def is_parallel(self, state):
+        """
+        Check whether a state is a parallel state.
+        
+        Args:
+            state (str): The state to check.
+        
+        Returns:
+            bool: True if the state is a parallel state, False otherwise.
+        """
+        return self.states[state].get('type') == 'parallel'
+
+    def get_regions(self, state):
+        """
+        Get the regions of a parallel state.
+        
+        Each region is a state machine definition with its own initial state and states.
+        
+        Args:
+            state (str): The parallel state for which to get the regions.
+        
+        Returns:
+            dict: The regions of the state, by name.
+        """
+        return self.states[state].get('states', {})
+
     def get_conditions(self, possible_state):
         """
         Get the conditions for a possible state transition.
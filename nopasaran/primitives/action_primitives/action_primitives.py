@@ -1,69 +1,44 @@
 from nopasaran.primitives.primitives import Primitives
-from nopasaran.primitives.action_primitives.data_manipulation import DataManipulationPrimitives
-from nopasaran.primitives.action_primitives.timing_primitives import TimingPrimitives
-from nopasaran.primitives.action_primitives.nested_machine_utils import NestedMachinePrimitives
-from nopasaran.primitives.action_primitives.data_channel_primitives import DataChannelPrimitives
-from nopasaran.primitives.action_primitives.control_channel_primitives import ControlChannelPrimitives
-from nopasaran.primitives.action_primitives.event_primitives import EventPrimitives
-from nopasaran.primitives.action_primitives.signaling_primitive import SignalingPrimitives
-from nopasaran.primitives.action_primitives.io_primitives import IOPrimitives
-from nopasaran.primitives.action_primitives.ip_primitives import IPPrimitives
-from nopasaran.primitives.action_primitives.tcp_primitives import TCPPrimitives
-from nopasaran.primitives.action_primitives.udp_primitives import UDPPrimitives
-from nopasaran.primitives.action_primitives.dns_primitives import DNSPrimitives
-from nopasaran.primitives.action_primitives.icmp_primitives import ICMPPrimitives
-from nopasaran.primitives.action_primitives.certificate_primitives import CertificatePrimitives
-from nopasaran.primitives.action_primitives.tls_primitives import TLSPrimitives
-from nopasaran.primitives.action_primitives.http_1_request_primitives import HTTP1RequestPrimitives
-from nopasaran.primitives.action_primitives.http_1_response_primitives import HTTP1ResponsePrimitives
-from nopasaran.primitives.action_primitives.http_2_server_primitives import HTTP2ServerPrimitives
-from nopasaran.primitives.action_primitives.http_2_client_primitives import HTTP2ClientPrimitives
-from nopasaran.primitives.action_primitives.server_echo_primitives import ServerEchoPrimitives
-from nopasaran.primitives.action_primitives.https_1_response_primitives import HTTPS1ResponsePrimitives
-from nopasaran.primitives.action_primitives.https_1_request_primitives import HTTPS1RequestPrimitives
-from nopasaran.primitives.action_primitives.client_echo_primitives import ClientEchoPrimitives
-from nopasaran.primitives.action_primitives.probing_primitives import PortProbingPrimitives
-from nopasaran.primitives.action_primitives.replay_primitives import ReplayPrimitives
-from nopasaran.primitives.action_primitives.http_simple_client_primitives import HTTPSimpleClientPrimitives
-from nopasaran.primitives.action_primitives.tcp_dns_request_primitives import TCPDNSRequestPrimitives
-from nopasaran.primitives.action_primitives.tcp_dns_response_primitives import TCPDNSResponsePrimitives
-from nopasaran.primitives.action_primitives.udp_dns_request_primitives import UDPDNSRequestPrimitives
-from nopasaran.primitives.action_primitives.udp_dns_response_primitives import UDPDNSResponsePrimitives
 
 
 class ActionPrimitives(Primitives):
     """
     Class containing action primitives for the state machine.
+
+    The primitive modules are only imported the first time one of their primitives is used, so that
+    running a test does not pay for the dependencies (scapy, h2, cryptography, DNS libraries, ...)
+    of the primitives it does not use.
     """
+    entry_point_group = 'nopasaran.action_primitives'
     classes = [
-        DataManipulationPrimitives, 
-        TimingPrimitives,
-        NestedMachinePrimitives, 
-        DataChannelPrimitives, 
-        ControlChannelPrimitives, 
-        EventPrimitives,
-        SignalingPrimitives,
-        IOPrimitives,
-        IPPrimitives, 
-        TCPPrimitives, 
-        UDPPrimitives,
-        DNSPrimitives,
-        ICMPPrimitives,
-        CertificatePrimitives,
-        TLSPrimitives,
-        HTTP1RequestPrimitives,
-        HTTP1ResponsePrimitives,
-        HTTP2ServerPrimitives,
-        HTTP2ClientPrimitives,
-        ServerEchoPrimitives,
-        HTTPS1ResponsePrimitives,
-        HTTPS1RequestPrimitives,
-        ClientEchoPrimitives,
-        PortProbingPrimitives,
-        ReplayPrimitives,
-        HTTPSimpleClientPrimitives,
-        TCPDNSRequestPrimitives,
-        TCPDNSResponsePrimitives,
-        UDPDNSRequestPrimitives,
-        UDPDNSResponsePrimitives
+        'nopasaran.primitives.action_primitives.data_manipulation:DataManipulationPrimitives',
+        'nopasaran.primitives.action_primitives.timing_primitives:TimingPrimitives',
+        'nopasaran.primitives.action_primitives.nested_machine_utils:NestedMachinePrimitives',
+        'nopasaran.primitives.action_primitives.data_channel_primitives:DataChannelPrimitives',
+        'nopasaran.primitives.action_primitives.control_channel_primitives:ControlChannelPrimitives',
+        'nopasaran.primitives.action_primitives.event_primitives:EventPrimitives',
+        'nopasaran.primitives.action_primitives.signaling_primitive:SignalingPrimitives',
+        'nopasaran.primitives.action_primitives.io_primitives:IOPrimitives',
+        'nopasaran.primitives.action_primitives.ip_primitives:IPPrimitives',
+        'nopasaran.primitives.action_primitives.tcp_primitives:TCPPrimitives',
+        'nopasaran.primitives.action_primitives.udp_primitives:UDPPrimitives',
+        'nopasaran.primitives.action_primitives.dns_primitives:DNSPrimitives',
+        'nopasaran.primitives.action_primitives.icmp_primitives:ICMPPrimitives',
+        'nopasaran.primitives.action_primitives.certificate_primitives:CertificatePrimitives',
+        'nopasaran.primitives.action_primitives.tls_primitives:TLSPrimitives',
+        'nopasaran.primitives.action_primitives.http_1_request_primitives:HTTP1RequestPrimitives',
+        'nopasaran.primitives.action_primitives.http_1_response_primitives:HTTP1ResponsePrimitives',
+        'nopasaran.primitives.action_primitives.http_2_server_primitives:HTTP2ServerPrimitives',
+        'nopasaran.primitives.action_primitives.http_2_client_primitives:HTTP2ClientPrimitives',
+        'nopasaran.primitives.action_primitives.server_echo_primitives:ServerEchoPrimitives',
+        'nopasaran.primitives.action_primitives.https_1_response_primitives:HTTPS1ResponsePrimitives',
+        'nopasaran.primitives.action_primitives.https_1_request_primitives:HTTPS1RequestPrimitives',
+        'nopasaran.primitives.action_primitives.client_echo_primitives:ClientEchoPrimitives',
+        'nopasaran.primitives.action_primitives.probing_primitives:PortProbingPrimitives',
+        'nopasaran.primitives.action_primitives.replay_primitives:ReplayPrimitives',
+        'nopasaran.primitives.action_primitives.http_simple_client_primitives:HTTPSimpleClientPrimitives',
+        'nopasaran.primitives.action_primitives.tcp_dns_request_primitives:TCPDNSRequestPrimitives',
+        'nopasaran.primitives.action_primitives.tcp_dns_response_primitives:TCPDNSResponsePrimitives',
+        'nopasaran.primitives.action_primitives.udp_dns_request_primitives:UDPDNSRequestPrimitives',
+        'nopasaran.primitives.action_primitives.udp_dns_response_primitives:UDPDNSResponsePrimitives'
         ]
@@ -1,9 +1,9 @@
 import json
-import time
 
-from twisted.internet.threads import deferToThread
+from twisted.internet import reactor, threads
 
 from nopasaran.controllers.controller import ClientController, ServerController
+from nopasaran.controllers.session import WorkerSession
 from nopasaran.definitions.control_channel import Status, Configuration
 from nopasaran.definitions.events import EventNames
 from nopasaran.decorators import parsing_decorator
@@ -38,7 +38,8 @@ class ControlChannelPrimitives:
         Returns:
             None
         """
-        controller_configuration = json.load(open(state_machine.get_variable_value(inputs[0])))
+        with open(state_machine.get_variable_value(inputs[0])) as configuration_file:
+            controller_configuration = json.load(configuration_file)
         state_machine.set_variable_value(outputs[0], controller_configuration)
 
     @staticmethod
@@ -125,7 +126,7 @@ class ControlChannelPrimitives:
         Returns:
             None
         """
-        deferToThread(state_machine.get_variable_value(inputs[0]).start)
+        reactor.callFromThread(state_machine.get_variable_value(inputs[0]).start)
 
     @staticmethod
     @parsing_decorator(input_args=1, output_args=0)
@@ -141,15 +142,17 @@ class ControlChannelPrimitives:
         Returns:
             None
         """
-        state_machine.get_variable_value(inputs[0]).stop()
+        reactor.callFromThread(state_machine.get_variable_value(inputs[0]).stop)
 
     @staticmethod
-    @parsing_decorator(input_args=2, output_args=0)
+    @parsing_decorator(input_args=2, output_args=0, asynchronous=True)
     def wait_ready_signal(inputs, outputs, state_machine):
         """
         Wait for the local and remote status of the controller protocol to be READY.
         If the status becomes READY within the specified timeout (input argument),
         triggers the event READY. Otherwise, triggers the event TIMEOUT.
+        The machine waits in the reactor until the controller protocol signals a status change.
+        The reactor must be running, as it is in the worker: otherwise a RuntimeError is raised.
 
         Number of input arguments: 2
 
@@ -167,29 +170,27 @@ class ControlChannelPrimitives:
             state_machine: The state machine object.
 
         Returns:
-            None
+            Deferred: A Deferred firing once the event is triggered.
         """
-        timeout = False
-        start_time = time.time()
-        while True:
+        def is_ready():
             controller_protocol = state_machine.get_variable_value(inputs[0])
-            if controller_protocol:
-                if controller_protocol.local_status == Status.READY.name and controller_protocol.remote_status == Status.READY.name:
-                    break
-            if time.time() - start_time > float(state_machine.get_variable_value(inputs[1])):
-                timeout = True
-                break
-        if timeout:
-            state_machine.trigger_event(EventNames.TIMEOUT.name)
-        else:
-            state_machine.trigger_event(EventNames.READY.name)
+            return bool(controller_protocol) and controller_protocol.local_status == Status.READY.name and controller_protocol.remote_status == Status.READY.name
+
+        def trigger(ready):
+            if ready:
+                state_machine.trigger_event(EventNames.READY.name)
+            else:
+                state_machine.trigger_event(EventNames.TIMEOUT.name)
+
+        timeout = float(state_machine.get_variable_value(inputs[1]))
+        return WorkerSession.wait_for(is_ready, timeout).addCallback(trigger)
 
     @staticmethod
     @parsing_decorator(input_args=1, output_args=0, optional_inputs=True)
     def sync(inputs, outputs, state_machine):
         """
         Send a synchronization message containing the provided inputs to the controller protocol.
-        Triggers the event SYNC_SENT.
+        Triggers the event SYNC_SENT, or the event ERROR if the inputs cannot be encoded.
 
         Number of input arguments: 1
 
@@ -212,17 +213,66 @@ class ControlChannelPrimitives:
         controller_protocol = state_machine.get_variable_value(inputs[0])
         if controller_protocol:
             data_to_send = [state_machine.get_variable_value(input_value) for input_value in inputs[1:]]
-            deferToThread(controller_protocol.send_sync, data_to_send)
+            try:
+                encoded = controller_protocol.encode_sync_content(data_to_send)
+            except Exception as e:
+                state_machine.logger.error("Cannot encode sync message: %s", e)
+                state_machine.trigger_event(EventNames.ERROR.name)
+                return
+            reactor.callFromThread(controller_protocol.send_sync, data_to_send, None, encoded)
+            state_machine.trace_sync(True, controller_protocol)
+            state_machine.trigger_event(EventNames.SYNC_SENT.name)
+
+    @staticmethod
+    @parsing_decorator(input_args=2, output_args=0, optional_inputs=True)
+    def tagged_sync(inputs, outputs, state_machine):
+        """
+        Send a synchronization message tagged with the given tag and containing the provided inputs to the
+        controller protocol. The remote endpoint receives it with 'wait_tagged_sync_signal' and the same tag.
+        Triggers the event SYNC_SENT, or the event ERROR if the inputs cannot be encoded.
+
+        Number of input arguments: 2
+
+        Number of output arguments: 0
+
+        Optional input arguments: Yes
+
+        Optional output arguments: No
+
+        Args:
+            inputs (List[str]): The list of input variable names. It contains two mandatory input arguments, which are the name of the variable storing the controller protocol and the name of the variable storing the tag, and optional input arguments representing the synchronization inputs.
+            
+            outputs (List[str]): The list of output variable names.
+            
+            state_machine: The state machine object.
+
+        Returns:
+            None
+        """
+        controller_protocol = state_machine.get_variable_value(inputs[0])
+        if controller_protocol:
+            tag = state_machine.get_variable_value(inputs[1])
+            data_to_send = [state_machine.get_variable_value(input_value) for input_value in inputs[2:]]
+            try:
+                encoded = controller_protocol.encode_sync_content(data_to_send)
+            except Exception as e:
+                state_machine.logger.error("Cannot encode sync message: %s", e)
+                state_machine.trigger_event(EventNames.ERROR.name)
+                return
+            reactor.callFromThread(controller_protocol.send_sync, data_to_send, tag, encoded)
+            state_machine.trace_sync(True, controller_protocol, tag)
             state_machine.trigger_event(EventNames.SYNC_SENT.name)
 
     @staticmethod
-    @parsing_decorator(input_args=2, output_args=0, optional_outputs=True)
+    @parsing_decorator(input_args=2, output_args=0, optional_outputs=True, asynchronous=True)
     def wait_sync_signal(inputs, outputs, state_machine):
         """
-        Wait for a synchronization message to be available in the controller protocol's queue.
+        Wait for an untagged synchronization message to be available in the controller protocol's mailbox.
         If a message becomes available within the specified timeout (input argument),
         store its contents in the output variables and trigger the event SYNC_AVAILABLE.
         Otherwise, triggers the event TIMEOUT.
+        The machine waits in the reactor until the controller protocol signals a new message.
+        The reactor must be running, as it is in the worker: otherwise a RuntimeError is raised.
 
         Number of input arguments: 2
 
@@ -240,24 +290,149 @@ class ControlChannelPrimitives:
             state_machine: The state machine object.
 
         Returns:
-            None
+            Deferred: A Deferred firing once the event is triggered.
+        """
+        return _wait_sync(state_machine, inputs[0], float(state_machine.get_variable_value(inputs[1])), None, outputs)
+
+    @staticmethod
+    @parsing_decorator(input_args=3, output_args=0, optional_outputs=True, asynchronous=True)
+    def wait_tagged_sync_signal(inputs, outputs, state_machine):
+        """
+        Wait for a synchronization message with the given tag to be available in the controller protocol's mailbox.
+        Messages with other tags stay in the mailbox and do not delay this one.
+        If a message becomes available within the specified timeout (input argument),
+        store its contents in the output variables and trigger the event SYNC_AVAILABLE.
+        Otherwise, triggers the event TIMEOUT.
+        The reactor must be running, as it is in the worker: otherwise a RuntimeError is raised.
+
+        Number of input arguments: 3
+
+        Number of output arguments: 0
+
+        Optional input arguments: No
+
+        Optional output arguments: Yes
+
+        Args:
+            inputs (List[str]): The list of input variable names. It contains three mandatory input arguments, which are the name of the variable storing the controller protocol, the timeout value and the name of the variable storing the tag.
+            
+            outputs (List[str]): The list of output variable names. It contains the names of the variables where the synchronization message will be stored (optional).
+            
+            state_machine: The state machine object.
+
+        Returns:
+            Deferred: A Deferred firing once the event is triggered.
         """
-        timeout = False
-        start_time = time.time()
-        sync_message = None
-        while True:
+        return _wait_sync(state_machine, inputs[0], float(state_machine.get_variable_value(inputs[1])), state_machine.get_variable_value(inputs[2]), outputs)
+
+    @staticmethod
+    @parsing_decorator(input_args=2, output_args=2, asynchronous=True)
+    def get_peer_clock_offset(inputs, outputs, state_machine):
+        """
+        Get the offset between the clock of the remote endpoint of the controller protocol and the local clock,
+        and the round-trip time of the control channel, as estimated from the pings the endpoints exchange.
+        The offset is the time to subtract from a time of the remote endpoint to get the local time. Both values
+        are in seconds. If the estimate is available within the specified timeout (input argument), stores it in
+        the output variables and triggers the event CLOCK_SYNCHRONIZED. Otherwise, for instance if the remote
+        endpoint does not support pings, triggers the event TIMEOUT.
+        The reactor must be running, as it is in the worker: otherwise a RuntimeError is raised.
+
+        Number of input arguments: 2
+
+        Number of output arguments: 2
+
+        Optional input arguments: No
+
+        Optional output arguments: No
+
+        Args:
+            inputs (List[str]): The list of input variable names. It contains two mandatory input arguments, which are the name of the variable storing the controller protocol, and the timeout value.
+
+            outputs (List[str]): The list of output variable names. It contains two mandatory output arguments, which are the names of the variables where the offset and the round-trip time will be stored.
+
+            state_machine: The state machine object.
+
+        Returns:
+            Deferred: A Deferred firing once the event is triggered.
+        """
+        def is_synchronized():
             controller_protocol = state_machine.get_variable_value(inputs[0])
-            if controller_protocol:
-                if len(controller_protocol.queue) > 0:
-                    sync_message = controller_protocol.queue[0]
-                    controller_protocol.queue.pop(0)
-                    break
-            if time.time() - start_time > float(state_machine.get_variable_value(inputs[1])):
-                timeout = True
-                break
-        if timeout:
+            return bool(controller_protocol) and controller_protocol.clock.synchronized
+
+        def trigger(synchronized):
+            if synchronized:
+                clock = state_machine.get_variable_value(inputs[0]).clock
+                state_machine.set_variable_value(outputs[0], clock.offset / 1e9)
+                state_machine.set_variable_value(outputs[1], clock.rtt / 1e9)
+                state_machine.trigger_event(EventNames.CLOCK_SYNCHRONIZED.name)
+            else:
+                state_machine.trigger_event(EventNames.TIMEOUT.name)
+
+        timeout = float(state_machine.get_variable_value(inputs[1]))
+        return WorkerSession.wait_for(is_synchronized, timeout).addCallback(trigger)
+
+    @staticmethod
+    @parsing_decorator(input_args=1, output_args=1)
+    def get_sync_delay(inputs, outputs, state_machine):
+        """
+        Get the one-way delay of the last synchronization message received from the controller protocol, from its
+        sending by the remote endpoint to its reception, in seconds. The sync messages are timestamped once the
+        offset of the clock of the remote endpoint is estimated; the delay of a message that was not is None.
+
+        Number of input arguments: 1
+
+        Number of output arguments: 1
+
+        Optional input arguments: No
+
+        Optional output arguments: No
+
+        Args:
+            inputs (List[str]): The list of input variable names. It contains one mandatory input argument, which is the name of the variable storing the controller protocol.
+
+            outputs (List[str]): The list of output variable names. It contains one mandatory output argument, which is the name of the variable where the delay will be stored.
+
+            state_machine: The state machine object.
+
+        Returns:
+            None
+        """
+        delay = state_machine.get_variable_value(inputs[0]).sync_delay
+        state_machine.set_variable_value(outputs[0], None if delay is None else delay / 1e9)
+
+
+def _wait_sync(state_machine, protocol_variable, timeout, tag, outputs):
+    """
+    Wait for a sync message with the given tag and store its contents in the output variables.
+    Triggers the event SYNC_AVAILABLE, or the event TIMEOUT if no message arrives within the timeout.
+
+    The content of the message is decoded in the reactor thread pool rather than in the reactor thread.
+
+    Args:
+        state_machine: The state machine object.
+        protocol_variable (str): The name of the variable storing the controller protocol.
+        timeout (float): The timeout in seconds.
+        tag (str or None): The tag of the sync message, None for untagged messages.
+        outputs (List[str]): The names of the variables where the synchronization message will be stored.
+
+    Returns:
+        Deferred: A Deferred firing once the event is triggered.
+    """
+    def is_sync_available():
+        controller_protocol = state_machine.get_variable_value(protocol_variable)
+        return bool(controller_protocol) and controller_protocol.has_sync(tag)
+
+    def receive(available):
+        if not available:
             state_machine.trigger_event(EventNames.TIMEOUT.name)
-        else:
-            for index in range(len(outputs)):
-                state_machine.set_variable_value(outputs[index], sync_message[index])
-            state_machine.trigger_event(EventNames.SYNC_AVAILABLE.name)
+            return None
+        controller_protocol = state_machine.get_variable_value(protocol_variable)
+        state_machine.trace_sync(False, controller_protocol, tag)
+        return threads.deferToThread(controller_protocol.pop_sync, tag).addCallback(store)
+
+    def store(sync_message):
+        for index in range(len(outputs)):
+            state_machine.set_variable_value(outputs[index], sync_message[index])
+        state_machine.trigger_event(EventNames.SYNC_AVAILABLE.name)
+
+    return WorkerSession.wait_for(is_sync_available, timeout).addCallback(receive)
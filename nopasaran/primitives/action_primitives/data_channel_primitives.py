@@ -1,5 +1,3 @@
-import time
-
 from scapy.all import send as sendpacket
 
 from nopasaran.definitions.events import EventNames
@@ -72,6 +70,7 @@ class DataChannelPrimitives:
     def packet_filter(inputs, outputs, state_machine):
         """
         Set the packet filter for the packet sniffer.
+        The filter is a BPF expression, compiled once and attached to the capture socket of the sniffer.
 
         Number of input arguments: 1
 
@@ -101,6 +100,7 @@ class DataChannelPrimitives:
         The sniffer's packet stack is created and populated in the 'listen' primitive.
         If a packet becomes available within the specified timeout (second mandatory input argument),
         triggers the event PACKET_AVAILABLE. Otherwise, triggers the event TIMEOUT.
+        The machine thread sleeps until the sniffer signals a captured packet.
 
         Number of input arguments: 2
 
@@ -120,15 +120,11 @@ class DataChannelPrimitives:
         Returns:
             None
         """
-        timeout = False
-        start_time = time.time()
-        while True:
-            stack = state_machine.get_variable_value(inputs[0])
-            if len(stack) > 0:
-                state_machine.trigger_event(EventNames.PACKET_AVAILABLE.name)
-                break
-            if time.time() - start_time > float(state_machine.get_variable_value(inputs[1])):
-                timeout = True
-                break
-        if timeout:
+        timeout = float(state_machine.get_variable_value(inputs[1]))
+        packet_available = state_machine.sniffer.packet_available
+        with packet_available:
+            available = packet_available.wait_for(lambda: len(state_machine.get_variable_value(inputs[0])) > 0, timeout)
+        if available:
+            state_machine.trigger_event(EventNames.PACKET_AVAILABLE.name)
+        else:
             state_machine.trigger_event(EventNames.TIMEOUT.name)
\ No newline at end of file
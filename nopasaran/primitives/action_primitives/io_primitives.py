@@ -1,6 +1,7 @@
-import json
+import copy
 
 from nopasaran.decorators import parsing_decorator
+from nopasaran.parsers.definition_cache import DefinitionCache, definition_path
 
 class IOPrimitives:
     """
@@ -12,6 +13,7 @@ class IOPrimitives:
     def get_from_file(inputs, outputs, state_machine):
         """
         Load variables from a file and store them in the machine's state.
+        The file is read once and then served from the DefinitionCache, as long as it does not change.
 
         Number of input arguments: 2
 
@@ -31,8 +33,8 @@ class IOPrimitives:
         Returns:
             None
         """
-        file_variables = json.load(open('.'.join((inputs[0], 'json'))))
-        state_machine.set_variable_value(outputs[0], file_variables[inputs[1]])
+        file_variables = DefinitionCache.load_json(definition_path(inputs[0]))
+        state_machine.set_variable_value(outputs[0], copy.deepcopy(file_variables[inputs[1]]))
 
 
     @staticmethod
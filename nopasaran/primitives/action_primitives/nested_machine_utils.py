@@ -1,6 +1,112 @@
-import json
+import logging
+import threading
+
+from twisted.internet import defer, reactor
 
 from nopasaran.decorators import parsing_decorator
+from nopasaran.definitions.events import EventNames
+from nopasaran.definitions.nested_machines import ChildStatus
+from nopasaran.parsers.definition_cache import DefinitionCache, definition_path
+
+# Upper bound on the number of spawned nested machines running at the same time in the process.
+MAX_SPAWNED_MACHINES = 8
+
+_slots = threading.BoundedSemaphore(MAX_SPAWNED_MACHINES)
+
+
+def _create_nested_machine(inputs, state_machine):
+    """
+    Create the nested machine named by the first input, with the values of the other inputs as parameters.
+
+    The definition of the nested machine is compiled once and then served from the DefinitionCache.
+
+    Args:
+        inputs (List[str]): The name of the nested state machine, followed by the names of the variables storing its parameters.
+        state_machine: The state machine object.
+
+    Returns:
+        StateMachine: The nested state machine.
+    """
+    nested_plan = DefinitionCache.load_plan(definition_path(inputs[0]))
+    parameters = []
+    for nested_variables in inputs[1:]:
+        parameters.append(state_machine.get_variable_value(nested_variables))
+    return state_machine.get_nested_machine(nested_plan, parameters)
+
+
+def _store_returned_values(nested_machine, outputs, state_machine):
+    """
+    Store the values returned by a nested machine in the output variables.
+
+    Args:
+        nested_machine (StateMachine): The nested state machine.
+        outputs (List[str]): The names of the variables where the returned values will be stored.
+        state_machine: The state machine object.
+    """
+    for index in range(len(nested_machine.returned or ())):
+        state_machine.set_variable_value(outputs[index], nested_machine.get_variable_value(nested_machine.returned[index]))
+
+
+class SpawnedMachine:
+    """
+    A nested machine started with the 'spawn' primitive, and the status of its execution.
+    """
+
+    def __init__(self, machine):
+        """
+        Initialize the SpawnedMachine.
+
+        Args:
+            machine (StateMachine): The nested state machine.
+        """
+        self.machine = machine
+        self.status = ChildStatus.RUNNING
+        self.error = None
+        self.finished = False
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the nested machine in a daemon thread, once fewer than MAX_SPAWNED_MACHINES spawned machines are running.
+
+        The thread does not keep the process alive: a spawned machine still running when the root machine stops,
+        such as one that a 'join' timed out on, is abandoned with the process instead of blocking its exit.
+        """
+        threading.Thread(target=self.run, name='nested-machine-' + self.machine.machine_id, daemon=True).start()
+
+    def run(self):
+        """
+        Run the nested machine until it stops, recording whether it failed, then call the done callbacks.
+        """
+        with _slots:
+            try:
+                self.machine.start()
+                if self.status == ChildStatus.RUNNING:
+                    self.status = ChildStatus.DONE
+            except Exception as e:
+                self.machine.logger.error('Spawned machine failed: %s', e)
+                self.error = e
+                self.status = ChildStatus.FAILED
+        with self.lock:
+            self.finished = True
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_done_callback(self, callback):
+        """
+        Call a function once the nested machine has stopped, or immediately if it already has.
+
+        Args:
+            callback (Callable): The function, called without arguments from the thread of the nested machine.
+        """
+        with self.lock:
+            if not self.finished:
+                self.callbacks.append(callback)
+                return
+        callback()
+
 
 class NestedMachinePrimitives:
     """
@@ -36,14 +142,99 @@ class NestedMachinePrimitives:
         Returns:
             None
         """
-        nested_state_json = json.load(open('.'.join((inputs[0], 'json'))))
-        parameters = []
-        for nested_variables in inputs[1:]:
-            parameters.append(state_machine.get_variable_value(nested_variables))
-        nested_machine = state_machine.get_nested_machine(nested_state_json, parameters)
+        nested_machine = _create_nested_machine(inputs, state_machine)
+        # The nested machine runs within the call, on the track of the calling machine in the trace.
+        nested_machine.trace_track = state_machine.trace_track
         nested_machine.start()
-        for index in range(len(nested_machine.returned)):
-            state_machine.set_variable_value(outputs[index], nested_machine.get_variable_value(nested_machine.returned[index]))
+        _store_returned_values(nested_machine, outputs, state_machine)
+
+    @staticmethod
+    @parsing_decorator(input_args=1, output_args=1, optional_inputs=True)
+    def spawn(inputs, outputs, state_machine):
+        """
+        Start a nested machine identified by the given name with the provided parameters, without waiting for it.
+        The mandatory input argument is the name of the nested state machine to start.
+        The optional input arguments are the parameters assigned to the nested state machine.
+        The mandatory output argument is the name of the variable where the handle of the spawned machine will be
+        stored, to be passed to the 'join' primitive. Several machines can be spawned before joining them, and they
+        run concurrently, up to MAX_SPAWNED_MACHINES at a time. The state of every spawned machine is included in
+        the result of the root state machine.
+
+        Number of input arguments: 1
+
+        Number of output arguments: 1
+
+        Optional input arguments: Yes
+
+        Optional output arguments: No
+
+        Args:
+            inputs (List[str]): The list of input variable names. It contains one mandatory input argument, which is the name of the nested state machine to start, and optional input arguments representing the parameters assigned to the nested state machine.
+            
+            outputs (List[str]): The list of output variable names. It contains one mandatory output argument, which is the name of the variable where the handle of the spawned machine will be stored.
+            
+            state_machine: The state machine object.
+
+        Returns:
+            None
+        """
+        child = SpawnedMachine(_create_nested_machine(inputs, state_machine))
+        state_machine.root_state_machine.children.append(child)
+        child.start()
+        state_machine.set_variable_value(outputs[0], child)
+
+    @staticmethod
+    @parsing_decorator(input_args=2, output_args=0, optional_outputs=True, asynchronous=True)
+    def join(inputs, outputs, state_machine):
+        """
+        Wait for a nested machine started with the 'spawn' primitive to stop.
+        If it stops within the specified timeout (input argument), the values it returns with the 'return_values'
+        primitive are stored in the optional output variables and the event CHILD_DONE is triggered, or the event
+        CHILD_FAILED if the nested machine raised an error. Otherwise, triggers the event TIMEOUT; the nested
+        machine keeps running and is reported with the TIMEOUT status in the result.
+
+        Number of input arguments: 2
+
+        Number of output arguments: 0
+
+        Optional input arguments: No
+
+        Optional output arguments: Yes
+
+        Args:
+            inputs (List[str]): The list of input variable names. It contains two mandatory input arguments, which are the name of the variable storing the handle of the spawned machine, and the timeout value.
+            
+            outputs (List[str]): The list of output variable names. It contains the names of the variables where the returned values will be stored (optional).
+            
+            state_machine: The state machine object.
+
+        Returns:
+            Deferred: A Deferred firing once the event is triggered.
+        """
+        child = state_machine.get_variable_value(inputs[0])
+        timeout = float(state_machine.get_variable_value(inputs[1]))
+        stopped = defer.Deferred()
+
+        def fire(result):
+            if not stopped.called:
+                stopped.callback(result)
+
+        timeout_call = reactor.callLater(timeout, fire, False)
+        child.add_done_callback(lambda: reactor.callFromThread(fire, True))
+
+        def trigger(finished):
+            if timeout_call.active():
+                timeout_call.cancel()
+            if not finished:
+                child.status = ChildStatus.TIMEOUT
+                state_machine.trigger_event(EventNames.TIMEOUT.name)
+            elif child.status == ChildStatus.FAILED:
+                state_machine.trigger_event(EventNames.CHILD_FAILED.name)
+            else:
+                _store_returned_values(child.machine, outputs, state_machine)
+                state_machine.trigger_event(EventNames.CHILD_DONE.name)
+
+        return stopped.addCallback(trigger)
 
     @staticmethod
     @parsing_decorator(input_args=0, output_args=0, optional_outputs=True)
@@ -47,18 +47,18 @@ class ReplayPrimitives:
 
         # Replay the packets in batches
         for batch_num in range(num_batches):
-            logging.debug(f"Sending batch {batch_num + 1} of {num_batches}...")
+            logging.debug("Sending batch %d of %d...", batch_num + 1, num_batches)
             
             for _ in range(batch_size):
                 try:
                     send(packet, verbose=False)  # Send each packet
                 except Exception as e:
-                    logging.debug(f"Error sending packet: {e}")
+                    logging.debug("Error sending packet: %s", e)
                     continue
             
             # Wait for the specified delay before sending the next batch
             if batch_num < num_batches - 1:  # Don't wait after the last batch
-                logging.debug(f"Waiting for {delay} seconds before next batch...")
+                logging.debug("Waiting for %s seconds before next batch...", delay)
                 time.sleep(delay)
 
 
@@ -115,7 +115,7 @@ class ReplayPrimitives:
                 received_packets = True
 
         except Exception as e:
-            logging.debug(f"Error in UDP packet capture: {str(e)}")
+            logging.debug("Error in UDP packet capture: %s", e)
             results["received"] = None
 
         # If no packets were received, set to None
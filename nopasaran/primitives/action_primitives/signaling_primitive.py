@@ -40,11 +40,11 @@ class SignalingPrimitives:
                 sock.send(json.dumps(message).encode())
                 response = sock.recv(1024).decode()
 
-                logging.info(f"[Signaling] Received: {response}")
+                logging.info("[Signaling] Received: %s", response)
                 state_machine.trigger_event(EventNames.SIGNAL_READY_CONNECTION.name)
 
         except (socket.timeout, socket.error) as e:
-            logging.warning(f"[Signaling] Timeout or error: {e}")
+            logging.warning("[Signaling] Timeout or error: %s", e)
             state_machine.trigger_event(EventNames.TIMEOUT.name)
 
     @staticmethod
@@ -77,11 +77,11 @@ class SignalingPrimitives:
                 sock.send(json.dumps(message).encode())
                 response = sock.recv(1024).decode()
 
-                logging.info(f"[Signaling] Received: {response}")
+                logging.info("[Signaling] Received: %s", response)
                 state_machine.trigger_event(EventNames.SIGNAL_READY_LISTEN.name)
 
         except (socket.timeout, socket.error) as e:
-            logging.warning(f"[Signaling] Timeout or error: {e}")
+            logging.warning("[Signaling] Timeout or error: %s", e)
             state_machine.trigger_event(EventNames.TIMEOUT.name)
 
     @staticmethod
@@ -114,11 +114,11 @@ class SignalingPrimitives:
                 sock.send(json.dumps(message).encode())
                 response = sock.recv(1024).decode()
 
-                logging.info(f"[Signaling] Received: {response}")
+                logging.info("[Signaling] Received: %s", response)
                 state_machine.trigger_event(EventNames.SIGNAL_LISTENING.name)
 
         except (socket.timeout, socket.error) as e:
-            logging.warning(f"[Signaling] Timeout or error: {e}")
+            logging.warning("[Signaling] Timeout or error: %s", e)
             state_machine.trigger_event(EventNames.TIMEOUT.name)
 
     @staticmethod
@@ -151,9 +151,9 @@ class SignalingPrimitives:
                 sock.send(json.dumps(message).encode())
                 response = sock.recv(1024).decode()
 
-                logging.info(f"[Signaling] Received: {response}")
+                logging.info("[Signaling] Received: %s", response)
                 state_machine.trigger_event(EventNames.SIGNAL_READY_STOP.name)
 
         except (socket.timeout, socket.error) as e:
-            logging.warning(f"[Signaling] Timeout or error: {e}")
+            logging.warning("[Signaling] Timeout or error: %s", e)
             state_machine.trigger_event(EventNames.TIMEOUT.name)
@@ -1,4 +1,7 @@
 import time
+
+from twisted.internet import reactor, task
+
 from nopasaran.decorators import parsing_decorator
 
 class TimingPrimitives:
@@ -7,10 +10,13 @@ class TimingPrimitives:
     """
 
     @staticmethod
-    @parsing_decorator(input_args=1, output_args=0)
+    @parsing_decorator(input_args=1, output_args=0, asynchronous=True)
     def wait(inputs, outputs, state_machine):
         """
-        Wait for a specified number of seconds.
+        Wait for a specified number of seconds, without holding a thread.
+
+        The wait is scheduled in the reactor. Without a running reactor, as when a machine is started
+        outside of the worker, the thread of the machine sleeps instead.
 
         Number of input arguments: 1
 
@@ -29,7 +35,10 @@ class TimingPrimitives:
             state_machine: The state machine object.
 
         Returns:
-            None
+            Deferred: A Deferred firing once the time has elapsed, or None if the reactor is not running.
         """
         seconds = float(state_machine.get_variable_value(inputs[0]))
-        time.sleep(seconds)
\ No newline at end of file
+        if not reactor.running:
+            time.sleep(seconds)
+            return None
+        return task.deferLater(reactor, seconds, lambda: None)
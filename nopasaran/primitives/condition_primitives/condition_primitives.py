@@ -5,4 +5,5 @@ class ConditionPrimitives(Primitives):
     """
     Class containing condition primitives for the state machine.
     """
+    entry_point_group = 'nopasaran.condition_primitives'
     classes = [VariableComparisons]
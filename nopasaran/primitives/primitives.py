@@ -1,12 +1,211 @@
+import ast
+import logging
+import threading
+import importlib
+import importlib.util
+from typing import NamedTuple
+
+from nopasaran.errors.registry_error import DuplicatePrimitiveError
+
+
+def _iter_entry_points(group):
+    """
+    Iterate over the installed entry points of a group.
+
+    Args:
+        group (str): The name of the entry point group.
+
+    Returns:
+        list: The entry points registered in the group.
+    """
+    # importlib.metadata is slow to import, only pay for it when the registry is built.
+    from importlib import metadata
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=group))
+    return list(entry_points.get(group, []))
+
+
+def _scan_static_methods(module_name, class_name):
+    """
+    List the public static methods of a class by reading the source of its module, without importing it.
+
+    Args:
+        module_name (str): The name of the module defining the class.
+        class_name (str): The name of the class.
+
+    Returns:
+        list or None: The names of the public static methods, or None if the source is not available.
+    """
+    spec = importlib.util.find_spec(module_name)
+    if spec is None or spec.origin is None or not spec.origin.endswith('.py'):
+        return None
+    with open(spec.origin, encoding='utf-8') as source_file:
+        tree = ast.parse(source_file.read(), filename=spec.origin)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            return [
+                item.name for item in node.body
+                if isinstance(item, ast.FunctionDef) and not item.name.startswith('_')
+                and any(isinstance(decorator, ast.Name) and decorator.id == 'staticmethod' for decorator in item.decorator_list)
+            ]
+    return None
+
+
+class _PrimitiveReference(NamedTuple):
+    """
+    Reference to a primitive whose module has not been imported yet.
+    """
+
+    module_name: str
+    class_name: str
+    name: str
+
+    def resolve(self):
+        """
+        Import the module of the primitive and return the primitive.
+
+        Returns:
+            Callable: The primitive.
+        """
+        logging.debug('[Primitives] Loading primitive {} from {}.'.format(self.name, self.module_name))
+        class_ = getattr(importlib.import_module(self.module_name), self.class_name)
+        return getattr(class_, self.name)
+
+
 class Primitives:
     """
     Generic class containing primitives for the state machine.
+
+    The primitives of the classes listed in ``classes``, and of the classes registered by third-party
+    packages under the ``entry_point_group`` entry point group, are collected once per process into a
+    flat name to callable registry.
+
+    A class can also be listed as a ``'package.module:ClassName'`` string. Its primitives are then indexed
+    from the source of the module, which is only imported the first time one of them is requested.
     """
 
+    classes = []
+    entry_point_group = None
+
+    _registry = None
+    _registry_lock = threading.Lock()
+
     @classmethod
-    def __getattr__(cls, name):
+    def get_registry(cls):
+        """
+        Get the registry of the primitives, building it on first use.
+
+        Returns:
+            dict: The registry mapping each primitive name to its callable.
+
+        Raises:
+            DuplicatePrimitiveError: If two classes define a primitive with the same name.
+        """
+        registry = cls.__dict__.get('_registry')
+        if registry is None:
+            with cls._registry_lock:
+                registry = cls.__dict__.get('_registry')
+                if registry is None:
+                    registry = cls._build_registry()
+                    cls._registry = registry
+        return registry
+
+    @classmethod
+    def _build_registry(cls):
+        """
+        Build the registry of the primitives.
+
+        Returns:
+            dict: The registry mapping each primitive name to its callable.
+
+        Raises:
+            DuplicatePrimitiveError: If two classes define a primitive with the same name.
+        """
+        registry = {}
+        owners = {}
         for class_ in cls.classes:
-            if hasattr(class_, name):
-                method = getattr(class_, name)
-                return method
+            if isinstance(class_, str):
+                cls._register_class_path(registry, owners, class_)
+            else:
+                cls._register_class(registry, owners, class_)
+        if cls.entry_point_group is not None:
+            for entry_point in _iter_entry_points(cls.entry_point_group):
+                try:
+                    class_ = entry_point.load()
+                except Exception as e:
+                    logging.error('[Primitives] Error loading primitives from entry point {}: {}'.format(entry_point.name, e))
+                    continue
+                cls._register_class(registry, owners, class_)
+                logging.debug('[Primitives] Primitives registered from entry point {}.'.format(entry_point.name))
+        return registry
+
+    @staticmethod
+    def _register_class(registry, owners, class_):
+        """
+        Register the public static methods of a class as primitives.
+
+        Args:
+            registry (dict): The registry to fill.
+            owners (dict): The mapping of each registered primitive name to the name of the class defining it.
+            class_ (type): The class containing the primitives.
+
+        Raises:
+            DuplicatePrimitiveError: If a primitive of the class is already registered by another class.
+        """
+        for name, attribute in vars(class_).items():
+            if name.startswith('_') or not isinstance(attribute, staticmethod):
+                continue
+            if name in registry:
+                raise DuplicatePrimitiveError(f"Primitive '{name}' is defined by both {owners[name]} and {class_.__name__}")
+            registry[name] = getattr(class_, name)
+            owners[name] = class_.__name__
+
+    @staticmethod
+    def _register_class_path(registry, owners, class_path):
+        """
+        Register the primitives of a class without importing its module.
+
+        Args:
+            registry (dict): The registry to fill.
+            owners (dict): The mapping of each registered primitive name to the name of the class defining it.
+            class_path (str): The path of the class, as ``'package.module:ClassName'``.
+
+        Raises:
+            DuplicatePrimitiveError: If a primitive of the class is already registered by another class.
+        """
+        module_name, class_name = class_path.split(':')
+        names = _scan_static_methods(module_name, class_name)
+        if names is None:
+            Primitives._register_class(registry, owners, getattr(importlib.import_module(module_name), class_name))
+            return
+        for name in names:
+            if name in registry:
+                raise DuplicatePrimitiveError(f"Primitive '{name}' is defined by both {owners[name]} and {class_name}")
+            registry[name] = _PrimitiveReference(module_name, class_name, name)
+            owners[name] = class_name
+
+    @classmethod
+    def get_primitive(cls, name):
+        """
+        Get a primitive by name, importing its module if it has not been loaded yet.
+
+        Args:
+            name (str): The name of the primitive.
+
+        Returns:
+            Callable or None: The primitive, or None if no primitive has this name.
+        """
+        registry = cls.get_registry()
+        primitive = registry.get(name)
+        if isinstance(primitive, _PrimitiveReference):
+            primitive = primitive.resolve()
+            registry[name] = primitive
+        return primitive
+
+    @classmethod
+    def __getattr__(cls, name):
+        method = cls.get_primitive(name)
+        if method is not None:
+            return method
         raise AttributeError(f"{cls.__name__} has no attribute '{name}'")
@@ -1,6 +1,10 @@
 from nopasaran.decorators import parsing_decorator
 from nopasaran.definitions.transitions import StateDuringTransition
 
+OLD_STATE = StateDuringTransition.OLD_STATE.name
+NEW_STATE = StateDuringTransition.NEW_STATE.name
+
+
 class VariableAssignmentTransitions:
     """
     Class containing methods for assigning variables during state transitions in a state machine.
@@ -30,4 +34,4 @@ class VariableAssignmentTransitions:
         Returns:
             None
         """
-        trans_tmp_dict[StateDuringTransition.NEW_STATE.name][outputs[0]] = trans_tmp_dict[StateDuringTransition.OLD_STATE.name][inputs[0]]
\ No newline at end of file
+        trans_tmp_dict[NEW_STATE][outputs[0]] = trans_tmp_dict[OLD_STATE][inputs[0]]
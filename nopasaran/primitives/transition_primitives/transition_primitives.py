@@ -5,4 +5,5 @@ class TransitionPrimitives(Primitives):
     """
     Class containing transition primitives for the state machine.
     """
+    entry_point_group = 'nopasaran.transition_primitives'
     classes = [VariableAssignmentTransitions]
@@ -0,0 +1,308 @@
+"""
+Batch runner of the tests of a manifest on a pool of worker daemons.
+
+The manifest is a JSON object listing the tests of a campaign. Each test names the JSON file of its plan with
+"test", and can give "parameter_sets", a list of parameter lists of its root machine, to run once per set.
+The other keys are the options of the jobs of the worker daemon, such as "timeout", in seconds, "timings" or
+"reactor", and "defaults" gives the options of all the tests:
+
+    {
+        "defaults": {"timeout": 30},
+        "tests": [
+            {"test": "tcp.json"},
+            {"test": "http.json", "parameter_sets": [["192.0.2.1", 80], ["192.0.2.2", 8080]], "timeout": 60}
+        ]
+    }
+
+The files of the plans, and of the nested machines they use, are relative to the directory of the manifest.
+
+The tests run on a pool of 'nopasaran serve' processes, each running one test at a time and optionally pinned
+to a CPU. A test still running after its timeout is reported with the TIMEOUT status, and its worker is
+replaced, as is a worker that died. The result of every test is written, as a JSON line, to a single output
+as soon as it completes.
+
+The runs can also be added to a result store, which only the batch writes to: the workers then stream the
+result of each test to a result file, which the batch adds to the store, including the variables of the last
+state of a test that timed out. The results are then left out of the output.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import logging
+import functools
+import threading
+import subprocess
+from collections import Counter
+
+from nopasaran.definitions.jobs import JobStatus
+from nopasaran.runners.daemon import submit
+
+# Time a worker has to start and listen on its socket, in seconds.
+WORKER_START_TIMEOUT = 60
+# Options of the jobs not recorded in the metadata of their runs in a result store.
+UNRECORDED_OPTIONS = ('parameters', 'target', 'result_file')
+
+
+def load_manifest(path):
+    """
+    Load the jobs of a manifest, one for each test and each of its parameter sets.
+
+    Args:
+        path (str): The path of the manifest.
+
+    Returns:
+        list: The jobs, numbered by their "id".
+
+    Raises:
+        OSError: If the manifest cannot be read.
+        ValueError: If the manifest is not valid.
+    """
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('tests'), list):
+        raise ValueError('The manifest must be a JSON object with a "tests" list')
+    defaults = manifest.get('defaults', {})
+    jobs = []
+    for entry in manifest['tests']:
+        if not isinstance(entry, dict) or 'test' not in entry:
+            raise ValueError('Every test of the manifest must be a JSON object with a "test" file: {}'.format(entry))
+        entry = dict(defaults, **entry)
+        parameter_sets = entry.pop('parameter_sets', None)
+        for parameters in parameter_sets if parameter_sets is not None else [entry.get('parameters', [])]:
+            jobs.append(dict(entry, id=len(jobs), parameters=parameters))
+    return jobs
+
+
+def parse_cpus(cpus):
+    """
+    Parse a list of CPUs in the format of taskset, such as "0,2-5".
+
+    Args:
+        cpus (str): The list of CPUs.
+
+    Returns:
+        list: The CPU numbers.
+
+    Raises:
+        ValueError: If the list is not valid.
+    """
+    numbers = []
+    for item in cpus.split(','):
+        first, _, last = item.partition('-')
+        numbers.extend(range(int(first), int(last or first) + 1))
+    if not numbers:
+        raise ValueError('No CPU in {!r}'.format(cpus))
+    return numbers
+
+
+class Worker:
+    """
+    A worker daemon of the pool, running one test at a time.
+    """
+
+    def __init__(self, index, directory, socket_path, cpu=None, arguments=()):
+        """
+        Initialize the Worker.
+
+        Args:
+            index (int): The number of the worker in the pool.
+            directory (str): The working directory of the worker.
+            socket_path (str): The path of the Unix socket of the worker.
+            cpu (int, optional): The CPU the worker is pinned to. Defaults to None, for no pinning.
+            arguments (tuple, optional): The logging options of the worker. Defaults to ().
+        """
+        self.index = index
+        self.directory = directory
+        self.socket_path = socket_path
+        self.cpu = cpu
+        self.arguments = list(arguments)
+        self.process = None
+        self.alive = True
+
+    def start(self):
+        """
+        Start the worker process, without waiting for it to listen.
+        """
+        pin = None
+        if self.cpu is not None:
+            if hasattr(os, 'sched_setaffinity'):
+                # Set in the child before it executes the interpreter, whose threads inherit the affinity.
+                pin = functools.partial(os.sched_setaffinity, 0, {self.cpu})
+            else:
+                logging.warning('[Batch] Worker %d cannot be pinned to CPU %d on this system', self.index, self.cpu)
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'nopasaran', 'serve', '-s', self.socket_path, '-j', '1'] + self.arguments,
+            cwd=self.directory, stdin=subprocess.DEVNULL, preexec_fn=pin)
+
+    def wait_ready(self):
+        """
+        Wait for the worker to listen on its socket.
+
+        Raises:
+            RuntimeError: If the worker exits or does not listen in time.
+        """
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+        while not os.path.exists(self.socket_path):
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError('Worker {} did not start'.format(self.index))
+            time.sleep(0.05)
+
+    def stop(self):
+        """
+        Stop the worker process.
+        """
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def restart(self):
+        """
+        Replace the worker process by a new one, for instance after a test timed out.
+        """
+        self.process.kill()
+        self.process.wait()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.start()
+        self.wait_ready()
+
+    def run(self, job):
+        """
+        Run a test on the worker.
+
+        A worker that timed out or failed is restarted. A worker that cannot be restarted is no longer alive,
+        and the test gets a FAILED record.
+
+        Args:
+            job (dict): The job of the test.
+
+        Returns:
+            dict: The reply to the job.
+        """
+        try:
+            return next(submit([job], self.socket_path, job.get('timeout')))
+        except (TimeoutError, socket.timeout):
+            # socket.timeout is only a TimeoutError from Python 3.10.
+            logging.error('[Batch] Test %s timed out on worker %d', job['id'], self.index)
+            return self.recover({"id": job['id'], "status": JobStatus.TIMEOUT.name, "error": 'No result after {} s'.format(job['timeout'])})
+        except OSError as e:
+            logging.error('[Batch] Worker %d failed running test %s: %s', self.index, job['id'], e)
+            return self.recover({"id": job['id'], "status": JobStatus.FAILED.name, "error": 'Worker failed: {}'.format(e)})
+
+    def recover(self, record):
+        """
+        Restart the worker after a test timed out or failed.
+
+        Args:
+            record (dict): The record of the test.
+
+        Returns:
+            dict: The record of the test, FAILED if the worker could not be restarted.
+        """
+        try:
+            self.restart()
+        except RuntimeError as e:
+            logging.error('[Batch] Worker %d could not be restarted: %s', self.index, e)
+            self.alive = False
+            record.update(status=JobStatus.FAILED.name, error='{}, then {}'.format(record['error'], e))
+        return record
+
+
+def store_run(store, job, record, started):
+    """
+    Add the run of a test, from the result file its worker streamed, to a result store, and remove the file.
+
+    A test whose worker did not create its result file is added without result, unless it was invalid.
+
+    Args:
+        store (ResultStore): The store.
+        job (dict): The job of the test, with its "result_file".
+        record (dict): The reply to the job.
+        started (float): The time the job was submitted, in seconds since the epoch.
+    """
+    metadata = {key: value for key, value in job.items() if key not in UNRECORDED_OPTIONS}
+    try:
+        store.add_file(job['result_file'], job.get('target'), record.get('duration'), record['status'], record.get('error'), metadata)
+    except (OSError, ValueError):
+        if record['status'] != JobStatus.INVALID.name:
+            store.add(None, job['test'], job.get('target'), started, record.get('duration'), record['status'],
+                      parameters=job['parameters'], error=record.get('error'), metadata=metadata)
+    if os.path.exists(job['result_file']):
+        os.remove(job['result_file'])
+
+
+def run_batch(jobs, output, directory, socket_directory, workers=None, cpus=None, arguments=(), store=None):
+    """
+    Run jobs on a pool of worker daemons and write their results to an output.
+
+    Args:
+        jobs (list): The jobs.
+        output (file): The output the results are written to, as JSON lines.
+        directory (str): The working directory of the workers.
+        socket_directory (str): The directory of the sockets of the workers.
+        workers (int, optional): The number of workers. Defaults to None, for the number of CPUs, or of
+            CPUs to pin the workers to.
+        cpus (list, optional): The CPUs the workers are pinned to, in turn. Defaults to None, for no pinning.
+        arguments (tuple, optional): The logging options of the workers. Defaults to ().
+        store (ResultStore, optional): The store the runs of the tests are added to, through result files in
+            the directory of the sockets. Defaults to None.
+
+    Returns:
+        Counter: The number of tests of each status.
+    """
+    workers = workers or (len(cpus) if cpus else os.cpu_count() or 1)
+    pending = queue.SimpleQueue()
+    for job in jobs:
+        if store is not None:
+            job = dict(job, result_file=os.path.join(socket_directory, 'result-{}.nprs'.format(job['id'])))
+        pending.put(job)
+    statuses = Counter()
+    output_lock = threading.Lock()
+
+    def write(job, record, started, worker=None):
+        if store is not None:
+            store_run(store, job, record, started)
+        record.update(test=job['test'], parameters=job['parameters'], worker=worker)
+        with output_lock:
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+            statuses[record['status']] += 1
+
+    def drain(worker):
+        while worker.alive:
+            try:
+                job = pending.get_nowait()
+            except queue.Empty:
+                return
+            started = time.time()
+            write(job, worker.run(job), started, worker.index)
+
+    pool = [Worker(index, directory, os.path.join(socket_directory, 'worker-{}.sock'.format(index)),
+                   cpus[index % len(cpus)] if cpus else None, arguments)
+            for index in range(min(workers, len(jobs)))]
+    try:
+        for worker in pool:
+            worker.start()
+        for worker in pool:
+            worker.wait_ready()
+        logging.info('[Batch] Running %d tests on %d workers', len(jobs), len(pool))
+        threads = [threading.Thread(target=drain, args=(worker,), name='batch-worker-{}'.format(worker.index)) for worker in pool]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The tests left once every worker died.
+        while not pending.empty():
+            job = pending.get_nowait()
+            write(job, {"id": job['id'], "status": JobStatus.FAILED.name, "error": 'No worker left'}, time.time())
+    finally:
+        for worker in pool:
+            worker.stop()
+    return statuses
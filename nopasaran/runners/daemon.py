@@ -0,0 +1,288 @@
+"""
+Worker daemon running the test plans submitted over a local socket.
+
+The daemon keeps a single process for all the tests it runs: the modules are imported, the plans compiled and
+the reactor started once, so that a test starts as soon as it is submitted. Clients connect to the Unix socket
+of the daemon and write one job per line, as a JSON object. The daemon runs the jobs of all its clients
+concurrently, each with its own tree of machines, and writes back one JSON line per job as soon as it has run.
+
+A job names the JSON file of its plan with "test", or gives the plan itself with "plan". The files of the
+plans, and of the nested machines they use, are relative to the working directory of the daemon. A job can
+also have an "id", echoed in its reply, the "parameters" of its root machine, and the "variable_sizes",
+"timings" and "reactor" options of the command line, as booleans, "trace", the path of a file to write
+its execution trace to, "result_file", the path of a file to stream its result to, and "target", the
+middlebox or server the test is run against, recorded in the result store of the daemon if it has one.
+
+The reply has the "id" of the job and its "status", a JobStatus name. A job that ran has the final "state"
+of its root machine, its "result", encoded like the [Result] lines of the log unless it was streamed to
+its "result_file", and its "duration" in seconds. A job that failed or could not be run has an "error".
+"""
+import json
+import time
+import socket
+import logging
+import itertools
+
+from twisted.internet import defer, reactor, threads
+from twisted.internet.protocol import ServerFactory
+from twisted.protocols.basic import LineReceiver
+
+from nopasaran.definitions.jobs import JobStatus
+from nopasaran.machines.state_machine import StateMachine
+from nopasaran.machines.trace import DEFAULT_TRACE_SIZE
+from nopasaran.parsers.definition_cache import DefinitionCache
+from nopasaran.utils import serialize_log_data
+
+DEFAULT_SOCKET = 'nopasaran.sock'
+# Upper bound on the number of jobs running at the same time. Further jobs wait for a running job to finish.
+DEFAULT_MAX_JOBS = 16
+# Upper bound on the length of a job, which can hold a whole plan.
+MAX_JOB_LENGTH = 16 * 1024 * 1024
+# Threads of the reactor thread pool kept for the blocking primitives, on top of those running the jobs.
+SPARE_THREADS = 10
+
+
+def create_machine(job):
+    """
+    Create the root state machine of a job and load the files it uses.
+
+    Args:
+        job (dict): The job.
+
+    Returns:
+        StateMachine: The root state machine.
+
+    Raises:
+        ValueError: If the job has no plan, or a file is not valid JSON.
+        OSError: If a file cannot be read.
+        ParsingError: If a state machine cannot be compiled.
+    """
+    if 'test' in job:
+        plan = DefinitionCache.load_plan(job['test'])
+    elif 'plan' in job:
+        plan = job['plan']
+    else:
+        raise ValueError('The job has neither a "test" nor a "plan"')
+    machine = StateMachine(plan, parameters=list(job.get('parameters', [])),
+                           track_variable_sizes=bool(job.get('variable_sizes')),
+                           track_timings=bool(job.get('timings')),
+                           trace_size=DEFAULT_TRACE_SIZE if job.get('trace') else 0,
+                           result_file=job.get('result_file'))
+    DefinitionCache.preload(machine.plan)
+    return machine
+
+
+class JobRunner:
+    """
+    Runner of the jobs submitted to the daemon, up to a number of jobs at a time.
+
+    The machines of the jobs run in the reactor thread pool, or in the reactor thread for the jobs with the
+    "reactor" option. Loading the files of a job and encoding its result also happen in the thread pool.
+    """
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS, store=None):
+        """
+        Initialize the JobRunner.
+
+        Args:
+            max_jobs (int, optional): The number of jobs running at the same time. Defaults to DEFAULT_MAX_JOBS.
+            store (ResultStore, optional): The store the runs of the jobs are added to. Defaults to None.
+        """
+        self.slots = defer.DeferredSemaphore(max_jobs)
+        self.store = store
+        self.job_ids = itertools.count(1)
+
+    def submit(self, job):
+        """
+        Run a job once fewer than max_jobs jobs are running.
+
+        Args:
+            job (dict): The job.
+
+        Returns:
+            Deferred: A Deferred firing with the reply to the job.
+        """
+        job_id = job['id'] if 'id' in job else next(self.job_ids)
+        return self.slots.run(lambda: defer.ensureDeferred(self.run(job_id, job)))
+
+    async def run(self, job_id, job):
+        """
+        Run a job.
+
+        Args:
+            job_id: The ID of the job.
+            job (dict): The job.
+
+        Returns:
+            dict: The reply to the job.
+        """
+        started = time.perf_counter()
+        started_at = time.time()
+        try:
+            machine = await threads.deferToThread(create_machine, job)
+        except Exception as e:
+            logging.error('[Daemon] Job %s is invalid: %s', job_id, e)
+            return {"id": job_id, "status": JobStatus.INVALID.name, "error": str(e)}
+
+        logging.info('[Daemon] Job %s started: %s', job_id, machine.machine_id)
+        reply = {"id": job_id, "status": JobStatus.DONE.name}
+        try:
+            if job.get('reactor'):
+                await machine.run()
+            else:
+                await threads.deferToThread(machine.start)
+        except Exception as e:
+            logging.error('[Daemon] Job %s failed: %s', job_id, e)
+            reply.update(status=JobStatus.FAILED.name, error=str(e))
+        reply["state"] = machine.current_state
+        try:
+            await self.report(job_id, job, machine, reply, started, started_at)
+        except Exception as e:
+            logging.error('[Daemon] Job %s could not be reported: %s', job_id, e)
+            reply.update(status=JobStatus.FAILED.name, error=str(e))
+            reply.setdefault("duration", time.perf_counter() - started)
+        logging.info('[Daemon] Job %s finished in state %s', job_id, machine.current_state)
+        return reply
+
+    async def report(self, job_id, job, machine, reply, started, started_at):
+        """
+        Write the trace and the result of a job that ran, and add its run to the store.
+
+        Args:
+            job_id: The ID of the job.
+            job (dict): The job.
+            machine (StateMachine): The root state machine of the job.
+            reply (dict): The reply to the job, completed with the result and the duration.
+            started (float): The time the job started, from perf_counter.
+            started_at (float): The time the job started, in seconds since the epoch.
+        """
+        if job.get('trace'):
+            await threads.deferToThread(machine.trace.dump, job['trace'])
+        result = await threads.deferToThread(machine.result)
+        if not job.get('result_file'):
+            reply["result"] = await threads.deferToThread(serialize_log_data, result)
+        reply["duration"] = time.perf_counter() - started
+        if self.store is not None:
+            metadata = {key: value for key, value in job.items() if key not in ('plan', 'parameters', 'target')}
+            await threads.deferToThread(self.store.add, result, machine.plan.id, job.get('target'), started_at,
+                                        reply["duration"], reply["status"], machine.machine_id, job.get('parameters', ()),
+                                        reply.get("error"), dict(metadata, id=job_id))
+
+
+class JobProtocol(LineReceiver):
+    """
+    Protocol of a client connection to the daemon, carrying one job per line and one reply per line.
+    """
+
+    delimiter = b'\n'
+    MAX_LENGTH = MAX_JOB_LENGTH
+
+    def lineReceived(self, line):
+        """
+        Handle a job received from the client.
+
+        Args:
+            line (bytes): The job, as a JSON object.
+        """
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError('A job must be a JSON object')
+        except ValueError as e:
+            self.send_reply({"id": None, "status": JobStatus.INVALID.name, "error": str(e)})
+            return
+        self.factory.runner.submit(job).addCallbacks(self.send_reply, self.send_failure, errbackArgs=(job,))
+
+    def send_failure(self, failure, job):
+        """
+        Send the reply to a job whose run raised an unexpected error.
+
+        Args:
+            failure (Failure): The error.
+            job (dict): The job.
+        """
+        logging.error('[Daemon] Job %s failed: %s', job.get('id'), failure.getErrorMessage())
+        self.send_reply({"id": job.get('id'), "status": JobStatus.FAILED.name, "error": failure.getErrorMessage()})
+
+    def lineLengthExceeded(self, line):
+        """
+        Reject a job longer than MAX_JOB_LENGTH and close the connection.
+
+        Args:
+            line (bytes): The beginning of the job.
+        """
+        self.send_reply({"id": None, "status": JobStatus.INVALID.name, "error": 'Job longer than {} bytes'.format(self.MAX_LENGTH)})
+        self.transport.loseConnection()
+
+    def send_reply(self, reply):
+        """
+        Send the reply to a job, unless the client has disconnected.
+
+        Args:
+            reply (dict): The reply.
+        """
+        if self.connected:
+            self.sendLine(json.dumps(reply).encode())
+
+
+class JobFactory(ServerFactory):
+    """
+    A factory for creating JobProtocol instances, which share the runner of the daemon.
+    """
+
+    protocol = JobProtocol
+
+    def __init__(self, runner):
+        """
+        Initialize the JobFactory.
+
+        Args:
+            runner (JobRunner): The runner of the jobs.
+        """
+        self.runner = runner
+
+
+def serve(path=DEFAULT_SOCKET, max_jobs=DEFAULT_MAX_JOBS, store=None):
+    """
+    Run the daemon until it is interrupted.
+
+    Args:
+        path (str, optional): The path of the Unix socket of the daemon. Defaults to DEFAULT_SOCKET.
+        max_jobs (int, optional): The number of jobs running at the same time. Defaults to DEFAULT_MAX_JOBS.
+        store (ResultStore, optional): The store the runs of the jobs are added to. Defaults to None.
+    """
+    # The jobs running in the thread pool must leave threads to the blocking primitives they wait for.
+    reactor.suggestThreadPoolSize(max_jobs + SPARE_THREADS)
+    reactor.listenUNIX(path, JobFactory(JobRunner(max_jobs, store)), wantPID=True)
+    logging.info('[Daemon] Listening on %s, running up to %d jobs at a time', path, max_jobs)
+    reactor.run()
+    logging.info('[Daemon] Stopped')
+
+
+def submit(jobs, path=DEFAULT_SOCKET, timeout=None):
+    """
+    Submit jobs to a daemon and wait for their replies.
+
+    Args:
+        jobs (list): The jobs.
+        path (str, optional): The path of the Unix socket of the daemon. Defaults to DEFAULT_SOCKET.
+        timeout (float, optional): The time to wait for each reply, in seconds. Defaults to None, for no limit.
+
+    Yields:
+        dict: The reply to each job, in the order the jobs finish.
+
+    Raises:
+        OSError: If the daemon cannot be reached.
+        ConnectionError: If the daemon closes the connection before replying to every job.
+        socket.timeout: If a reply does not arrive within the timeout, a TimeoutError from Python 3.10.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall(b''.join(json.dumps(job).encode() + b'\n' for job in jobs))
+        with client.makefile('rb') as replies:
+            for _ in range(len(jobs)):
+                line = replies.readline()
+                if not line:
+                    raise ConnectionError('The daemon closed the connection before replying to every job')
+                yield json.loads(line)
@@ -0,0 +1,359 @@
+"""
+Indexed store of the results of the tests of a campaign, in a SQLite database.
+
+Every run of a test is a row of the "runs" table, with the ID of its plan, its target, the time it started,
+its duration, its final state and its JobStatus, indexed for filtering over millions of runs. The "counts"
+and "target_counts" tables keep the number of runs of each test, final state and status, and of each of
+their targets, so that counting the runs without a time range does not scan them.
+Its variables are rows of the "variables" table, encoded like the records of the result files, and the
+summary of its timings rows of the "timings" table. The other parts of its result, such as the state of
+the machines it spawned, and its options are kept as JSON in the "metadata" column of the run.
+
+The store can be written from several threads, and by several processes in turn.
+"""
+import json
+import time
+import sqlite3
+import threading
+
+from nopasaran.definitions.jobs import JobStatus
+from nopasaran.machines.result_stream import encode_value, decode_value, read_result
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    test TEXT NOT NULL,
+    target TEXT,
+    started REAL NOT NULL,
+    duration REAL,
+    state TEXT,
+    status TEXT NOT NULL,
+    machine TEXT,
+    parameters TEXT,
+    error TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_test ON runs (test, started);
+CREATE INDEX IF NOT EXISTS runs_target ON runs (target, started);
+CREATE INDEX IF NOT EXISTS runs_state ON runs (state, started);
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status, started);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE TABLE IF NOT EXISTS variables (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    kind INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (run, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS timings (
+    run INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    p50_us REAL,
+    p99_us REAL,
+    max_us REAL,
+    PRIMARY KEY (run, category, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counts (
+    test TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    PRIMARY KEY (test, state, status)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS target_counts (
+    target TEXT NOT NULL,
+    test TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    PRIMARY KEY (target, test, state, status)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS target_counts_state ON target_counts (state, test);
+CREATE TRIGGER IF NOT EXISTS runs_counted AFTER INSERT ON runs BEGIN
+    INSERT INTO counts VALUES (NEW.test, COALESCE(NEW.state, ''), NEW.status, 1)
+    ON CONFLICT (test, state, status) DO UPDATE SET runs = runs + 1;
+    INSERT INTO target_counts VALUES (COALESCE(NEW.target, ''), NEW.test, COALESCE(NEW.state, ''), NEW.status, 1)
+    ON CONFLICT (target, test, state, status) DO UPDATE SET runs = runs + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS runs_uncounted AFTER DELETE ON runs BEGIN
+    UPDATE counts SET runs = runs - 1
+    WHERE test = OLD.test AND state = COALESCE(OLD.state, '') AND status = OLD.status;
+    UPDATE target_counts SET runs = runs - 1
+    WHERE target = COALESCE(OLD.target, '') AND test = OLD.test AND state = COALESCE(OLD.state, '') AND status = OLD.status;
+END;
+"""
+# Columns of the runs the queries filter and count on.
+FILTERS = ('test', 'target', 'state', 'status')
+# Time another process can hold the database while a run is written, in seconds.
+BUSY_TIMEOUT = 30
+
+
+class ResultStore:
+    """
+    SQLite database of the results of the runs of tests.
+    """
+
+    def __init__(self, path):
+        """
+        Open a store, creating it if needed.
+
+        Args:
+            path (str): The path of the database.
+
+        Raises:
+            sqlite3.Error: If the database cannot be opened.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self.lock:
+            self.connection.close()
+
+    def add(self, result, test, target=None, started=None, duration=None, status=JobStatus.DONE.name, machine=None,
+            parameters=(), error=None, metadata=None):
+        """
+        Add a run to the store.
+
+        Args:
+            result (dict): The result of the root machine of the run, from StateMachine.result, or None if it
+                did not run.
+            test (str): The ID of the plan of the test.
+            target (str, optional): The target of the run, such as the middlebox or the server it tested.
+                Defaults to None.
+            started (float, optional): The time the run started, in seconds since the epoch. Defaults to None,
+                for now.
+            duration (float, optional): The duration of the run, in seconds. Defaults to None.
+            status (str, optional): The name of the JobStatus of the run. Defaults to DONE.
+            machine (str, optional): The ID of the root machine. Defaults to None.
+            parameters (list, optional): The parameters of the root machine. Defaults to ().
+            error (str, optional): The error the run failed with. Defaults to None.
+            metadata (dict, optional): Other information on the run, such as the options of its job. Defaults
+                to None.
+
+        Returns:
+            int: The ID of the run.
+        """
+        result = result or {}
+        metadata = dict(metadata or {})
+        metadata.update((key, value) for key, value in result.items() if key not in ("State", "Variables", "Timings"))
+        # Encoded out of the lock, as the values can be large.
+        variables = [(name,) + encode_value(value) for name, value in result.get("Variables", {}).items()]
+        timings = [(category, name, summary["count"], summary["p50_us"], summary["p99_us"], summary["max_us"])
+                   for category, histograms in result.get("Timings", {}).items() for name, summary in histograms.items()]
+        row = (test, None if target is None else str(target), time.time() if started is None else started, duration,
+               result.get("State"), status, machine, json.dumps(list(parameters), default=repr), error,
+               json.dumps(metadata, default=repr) if metadata else None)
+        with self.lock, self.connection:
+            run = self.connection.execute(
+                'INSERT INTO runs (test, target, started, duration, state, status, machine, parameters, error, metadata) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row).lastrowid
+            self.connection.executemany('INSERT INTO variables VALUES (?, ?, ?, ?)', [(run,) + variable for variable in variables])
+            self.connection.executemany('INSERT INTO timings VALUES (?, ?, ?, ?, ?, ?, ?)', [(run,) + timing for timing in timings])
+        return run
+
+    def add_file(self, path, target=None, duration=None, status=None, error=None, metadata=None):
+        """
+        Add the run of a result file to the store.
+
+        Args:
+            path (str): The path of the result file.
+            target (str, optional): The target of the run. Defaults to None.
+            duration (float, optional): The duration of the run, in seconds. Defaults to None.
+            status (str, optional): The name of the JobStatus of the run. Defaults to None, for DONE if the
+                result is complete and FAILED otherwise.
+            error (str, optional): The error the run failed with. Defaults to None.
+            metadata (dict, optional): Other information on the run. Defaults to None.
+
+        Returns:
+            int: The ID of the run.
+
+        Raises:
+            OSError: If the file cannot be read.
+            ValueError: If the file is not a valid result file.
+        """
+        result = read_result(path)
+        header = result.pop("Metadata")
+        if status is None:
+            status = JobStatus.DONE.name if result.pop("Complete") else JobStatus.FAILED.name
+        else:
+            result.pop("Complete")
+        started = header.get("Started")
+        return self.add(result, header.get("Test", ''), target, None if started is None else started / 1e9, duration, status,
+                        header.get("Machine"), header.get("Parameters", ()), error, metadata)
+
+    def run(self, run):
+        """
+        Get a run.
+
+        Args:
+            run (int): The ID of the run.
+
+        Returns:
+            dict: The columns of the run, or None if it does not exist.
+        """
+        runs = self._select('SELECT * FROM runs WHERE id = ?', [run])
+        return runs[0] if runs else None
+
+    def runs(self, limit=None, since=None, until=None, **filters):
+        """
+        Get the runs matching filters, the most recent first.
+
+        Args:
+            limit (int, optional): The maximum number of runs. Defaults to None, for all.
+            since (float, optional): The earliest start time, in seconds since the epoch. Defaults to None.
+            until (float, optional): The latest start time, in seconds since the epoch. Defaults to None.
+            **filters: The values of the FILTERS columns to match.
+
+        Returns:
+            list: The runs, as dicts of their columns, with the parameters and the metadata decoded.
+        """
+        where, arguments = self._where(since, until, filters)
+        query = 'SELECT * FROM runs{} ORDER BY started DESC'.format(where)
+        if limit is not None:
+            query += ' LIMIT ?'
+            arguments.append(limit)
+        return self._select(query, arguments)
+
+    def count(self, by=(), since=None, until=None, **filters):
+        """
+        Count the runs matching filters, grouped by the values of columns.
+
+        Args:
+            by (tuple, optional): The FILTERS columns to group by. Defaults to (), for the total.
+            since (float, optional): The earliest start time, in seconds since the epoch. Defaults to None.
+            until (float, optional): The latest start time, in seconds since the epoch. Defaults to None.
+            **filters: The values of the FILTERS columns to match.
+
+        Returns:
+            list: The values of the columns of each group followed by its number of runs, the largest first.
+
+        Raises:
+            ValueError: If a column is not one of FILTERS.
+        """
+        for column in by:
+            if column not in FILTERS:
+                raise ValueError('Cannot count by {!r}, expected one of {}'.format(column, ', '.join(FILTERS)))
+        if since is None and until is None:
+            # The counts store a missing target or state as an empty string.
+            where, arguments = self._where(None, None, filters)
+            table = 'target_counts' if 'target' in by or filters.get('target') is not None else 'counts'
+            columns = ', '.join("NULLIF({0}, '')".format(column) for column in by)
+            query = 'SELECT {}{}COALESCE(SUM(runs), 0) FROM {}{}'.format(columns, ', ' if by else '', table, where)
+            if by:
+                query += ' GROUP BY {} HAVING SUM(runs) > 0 ORDER BY SUM(runs) DESC'.format(', '.join(by))
+        else:
+            where, arguments = self._where(since, until, filters)
+            columns = ', '.join(by)
+            query = 'SELECT {}{}COUNT(*) FROM runs{}'.format(columns, ', ' if by else '', where)
+            if by:
+                query += ' GROUP BY {0} ORDER BY COUNT(*) DESC'.format(columns)
+        with self.lock:
+            return self.connection.execute(query, arguments).fetchall()
+
+    def variables(self, run, names=None):
+        """
+        Get the variables of a run.
+
+        Args:
+            run (int): The ID of the run.
+            names (list, optional): The names of the variables. Defaults to None, for all.
+
+        Returns:
+            dict: The value of each variable, an OpaqueValue for the values that could not be encoded.
+        """
+        query = 'SELECT name, kind, value FROM variables WHERE run = ?'
+        arguments = [run]
+        if names:
+            query += ' AND name IN ({})'.format(', '.join('?' * len(names)))
+            arguments.extend(names)
+        with self.lock:
+            rows = self.connection.execute(query, arguments).fetchall()
+        return {name: decode_value(kind, value) for name, kind, value in rows}
+
+    def timings(self, run):
+        """
+        Get the summary of the timings of a run.
+
+        Args:
+            run (int): The ID of the run.
+
+        Returns:
+            dict: The summary of each histogram, by category and by name, as in the result of the run.
+        """
+        summary = {}
+        with self.lock:
+            rows = self.connection.execute('SELECT category, name, count, p50_us, p99_us, max_us FROM timings WHERE run = ?', (run,)).fetchall()
+        for category, name, count, p50_us, p99_us, max_us in rows:
+            summary.setdefault(category, {})[name] = {"count": count, "p50_us": p50_us, "p99_us": p99_us, "max_us": max_us}
+        return summary
+
+    def _select(self, query, arguments):
+        """
+        Select runs.
+
+        Args:
+            query (str): The query.
+            arguments (list): The arguments of the query.
+
+        Returns:
+            list: The runs, as dicts of their columns, with the parameters and the metadata decoded.
+        """
+        with self.lock:
+            cursor = self.connection.execute(query, arguments)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        runs = [dict(zip(columns, row)) for row in rows]
+        for run in runs:
+            for column in ('parameters', 'metadata'):
+                if run[column] is not None:
+                    run[column] = json.loads(run[column])
+        return runs
+
+    @staticmethod
+    def _where(since, until, filters):
+        """
+        Build the WHERE clause of a query on the runs.
+
+        Args:
+            since (float): The earliest start time, or None.
+            until (float): The latest start time, or None.
+            filters (dict): The values of the FILTERS columns to match, None for any.
+
+        Returns:
+            tuple: The clause and its arguments.
+
+        Raises:
+            ValueError: If a filter is not one of FILTERS.
+        """
+        conditions = []
+        arguments = []
+        for column, value in filters.items():
+            if column not in FILTERS:
+                raise ValueError('Cannot filter on {!r}, expected one of {}'.format(column, ', '.join(FILTERS)))
+            if value is not None:
+                conditions.append('{} = ?'.format(column))
+                arguments.append(value)
+        if since is not None:
+            conditions.append('started >= ?')
+            arguments.append(since)
+        if until is not None:
+            conditions.append('started < ?')
+            arguments.append(until)
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), arguments
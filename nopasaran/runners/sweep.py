@@ -0,0 +1,254 @@
+"""
+Sweep of one test plan across the points of a parameter matrix.
+
+The sweep is a JSON object naming the plan with "test" and giving the values of each parameter of its root
+machine in "parameters". The points are either the cartesian product of the values ("mode": "cartesian", the
+default), or the values taken in step ("mode": "zip"). The root machine of each point receives the values of
+the point as its parameters, in the order of "parameters", to read with 'get_parameters':
+
+    {
+        "test": "http.json",
+        "parameters": {"ip": ["192.0.2.1", "192.0.2.2"], "port": [80, 8080], "host": ["example.com"]},
+        "destination": "ip",
+        "rate": 2,
+        "per_destination": 1
+    }
+
+The parameter named by "destination" identifies the middlebox or server a point sends its traffic to. The
+points of a destination are started at most "rate" times per second, and at most "per_destination" of them
+run at the same time, whatever the number of points running in total. The other keys are options of the
+points, as for the jobs of the worker daemon, such as "timings".
+
+The plan is compiled once for all the points, which run in the same process, and the result of each point is
+written as a JSON line as soon as it completes. The runs of the points can also be added to a result store,
+with the value of their destination parameter as their target.
+"""
+import json
+import logging
+import itertools
+from collections import Counter
+
+from twisted.internet import defer, reactor, task, threads
+from twisted.python.failure import Failure
+
+from nopasaran.parsers.definition_cache import DefinitionCache
+from nopasaran.runners.daemon import JobRunner, DEFAULT_MAX_JOBS, SPARE_THREADS
+
+CARTESIAN = 'cartesian'
+ZIP = 'zip'
+# Number of points scheduled ahead of those running, waiting for their destination or for a free slot.
+BACKLOG = 1024
+
+
+def expand_points(parameters, mode=CARTESIAN):
+    """
+    Expand a parameter matrix into its points.
+
+    Args:
+        parameters (dict): The values of each parameter.
+        mode (str, optional): CARTESIAN for every combination of the values, or ZIP for the values taken in
+            step. Defaults to CARTESIAN.
+
+    Returns:
+        Iterator: The points, as dicts of the value of each parameter, lazily.
+
+    Raises:
+        ValueError: If the mode is unknown, or the parameters of a zip have different numbers of values.
+    """
+    names = list(parameters)
+    values = [parameters[name] for name in names]
+    if mode == CARTESIAN:
+        combinations = itertools.product(*values)
+    elif mode == ZIP:
+        if len(set(map(len, values))) > 1:
+            raise ValueError('The parameters of a zip sweep must have the same number of values')
+        combinations = zip(*values)
+    else:
+        raise ValueError('Unknown sweep mode {!r}, expected {!r} or {!r}'.format(mode, CARTESIAN, ZIP))
+    return (dict(zip(names, combination)) for combination in combinations)
+
+
+def count_points(parameters, mode=CARTESIAN):
+    """
+    Count the points of a parameter matrix without expanding it.
+
+    Args:
+        parameters (dict): The values of each parameter.
+        mode (str, optional): CARTESIAN or ZIP. Defaults to CARTESIAN.
+
+    Returns:
+        int: The number of points.
+    """
+    lengths = [len(values) for values in parameters.values()]
+    if mode == ZIP:
+        return min(lengths, default=0)
+    count = 1
+    for length in lengths:
+        count *= length
+    return count
+
+
+class DestinationLimiter:
+    """
+    Limiter of the points started towards each destination.
+
+    The starts of the points of a destination are spaced by at least 1 / rate seconds, and at most a number
+    of points of the destination run at the same time. The limiter is used from the reactor thread.
+    """
+
+    def __init__(self, rate=None, concurrency=1):
+        """
+        Initialize the DestinationLimiter.
+
+        Args:
+            rate (float, optional): The number of points started per second towards a destination. Defaults
+                to None, for no limit.
+            concurrency (int, optional): The number of points of a destination running at the same time.
+                Defaults to 1.
+        """
+        self.interval = 1 / rate if rate else 0
+        self.concurrency = concurrency
+        self.slots = {}
+        self.next_starts = {}
+
+    async def acquire(self, destination):
+        """
+        Wait until a point can start towards a destination.
+
+        Args:
+            destination: The destination.
+        """
+        slots = self.slots.get(destination)
+        if slots is None:
+            slots = self.slots[destination] = defer.DeferredSemaphore(self.concurrency)
+        await slots.acquire()
+        now = reactor.seconds()
+        start = max(now, self.next_starts.get(destination, now))
+        self.next_starts[destination] = start + self.interval
+        if start > now:
+            await task.deferLater(reactor, start - now, lambda: None)
+
+    def release(self, destination):
+        """
+        Signal that a point towards a destination has stopped.
+
+        Args:
+            destination: The destination.
+        """
+        self.slots[destination].release()
+
+
+class Sweep:
+    """
+    Runner of the points of a sweep, writing the result of each point to an output as soon as it completes.
+    """
+
+    def __init__(self, sweep, output, max_jobs=DEFAULT_MAX_JOBS, store=None):
+        """
+        Initialize the Sweep.
+
+        Args:
+            sweep (dict): The sweep.
+            output (file): The output the results are written to, as JSON lines.
+            max_jobs (int, optional): The number of points running at the same time. Defaults to DEFAULT_MAX_JOBS.
+            store (ResultStore, optional): The store the runs of the points are added to. Defaults to None.
+
+        Raises:
+            ValueError: If the sweep is not valid.
+        """
+        if 'test' not in sweep or not isinstance(sweep.get('parameters'), dict):
+            raise ValueError('A sweep must have a "test" and a "parameters" object')
+        self.mode = sweep.get('mode', CARTESIAN)
+        self.parameters = sweep['parameters']
+        self.destination = sweep.get('destination')
+        if self.destination is not None and self.destination not in self.parameters:
+            raise ValueError('The destination {!r} is not a parameter of the sweep'.format(self.destination))
+        self.points = expand_points(self.parameters, self.mode)
+        self.options = {key: value for key, value in sweep.items()
+                        if key not in ('mode', 'parameters', 'destination', 'rate', 'per_destination')}
+        self.limiter = DestinationLimiter(sweep.get('rate'), sweep.get('per_destination', 1))
+        self.runner = JobRunner(max_jobs, store)
+        self.output = output
+        self.statuses = Counter()
+
+    async def run_point(self, index, point):
+        """
+        Run a point once its destination, if the sweep has one, allows it, and write its result.
+
+        Args:
+            index (int): The number of the point.
+            point (dict): The value of each parameter.
+        """
+        job = dict(self.options, id=index, parameters=list(point.values()))
+        if self.destination is None:
+            reply = await self.runner.submit(job)
+        else:
+            destination = point[self.destination]
+            job.setdefault('target', destination)
+            await self.limiter.acquire(destination)
+            try:
+                reply = await self.runner.submit(job)
+            finally:
+                self.limiter.release(destination)
+        reply["point"] = point
+        self.output.write(json.dumps(reply) + '\n')
+        self.output.flush()
+        self.statuses[reply["status"]] += 1
+
+    async def run(self):
+        """
+        Run all the points of the sweep.
+
+        Returns:
+            Counter: The number of points of each status.
+        """
+        # Compile the plan before the points, which would otherwise all compile it at once.
+        plan = await threads.deferToThread(DefinitionCache.load_plan, self.options['test'])
+        await threads.deferToThread(DefinitionCache.preload, plan)
+        logging.info('[Sweep] Running %d points', count_points(self.parameters, self.mode))
+        backlog = defer.DeferredSemaphore(BACKLOG)
+        # Only the points not completed yet are kept, and the first error raised by a point.
+        running = set()
+        failures = []
+
+        def finished(result, point_deferred):
+            running.discard(point_deferred)
+            backlog.release()
+            if isinstance(result, Failure):
+                failures.append(result)
+
+        for index, point in enumerate(self.points):
+            await backlog.acquire()
+            point_deferred = defer.ensureDeferred(self.run_point(index, point))
+            running.add(point_deferred)
+            point_deferred.addBoth(finished, point_deferred)
+        await defer.gatherResults(list(running))
+        if failures:
+            failures[0].raiseException()
+        return self.statuses
+
+
+def run_sweep(sweep, output, max_jobs=DEFAULT_MAX_JOBS, store=None):
+    """
+    Run a sweep in the reactor, until all its points have completed.
+
+    Args:
+        sweep (dict): The sweep.
+        output (file): The output the results are written to, as JSON lines.
+        max_jobs (int, optional): The number of points running at the same time. Defaults to DEFAULT_MAX_JOBS.
+        store (ResultStore, optional): The store the runs of the points are added to. Defaults to None.
+
+    Returns:
+        Counter: The number of points of each status.
+
+    Raises:
+        ValueError: If the sweep is not valid.
+    """
+    runner = Sweep(sweep, output, max_jobs, store)
+    outcome = []
+    reactor.suggestThreadPoolSize(max_jobs + SPARE_THREADS)
+    reactor.callWhenRunning(lambda: defer.ensureDeferred(runner.run()).addBoth(outcome.append).addBoth(lambda _: reactor.stop()))
+    reactor.run()
+    if outcome and isinstance(outcome[0], Failure):
+        outcome[0].raiseException()
+    return runner.statuses
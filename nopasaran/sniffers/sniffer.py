@@ -1,78 +1,134 @@
 import logging
+import threading
 from nopasaran.utils import *
-from scapy.all import AsyncSniffer, Ether, sniff
+from nopasaran.logging_utils import truncated
+from scapy.all import AsyncSniffer, Ether, conf, ETH_P_ALL
+from scapy.arch import attach_filter
+from scapy.error import Scapy_Exception
 
 
 class Sniffer(AsyncSniffer):
     """
     Custom Sniffer class inheriting from the AsyncSniffer of Scapy.
+
+    The sniffer only captures the IP packets not sent by the local machine that match its filter. The filter
+    is compiled to BPF once, when the capture starts or when the filter is changed, and attached to the
+    capture socket, so that the kernel drops the other packets before they are copied to the sniffer.
     """
 
     def __init__(self, machine, filter=''):
         """
         Initialize the Sniffer.
-        
+
         Args:
             machine (str): A string defining the machine to sniff.
             filter (str): A string defining the filter for packets.
         """
-        super().__init__(prn=self.__handle_sniffer(), lfilter=lambda pkt: self.__filter_packet(pkt))
+        super().__init__(prn=self.__handle_sniffer())
         self.machine = machine
         self.__filter = filter
         self.queue = None
+        self.packet_available = threading.Condition()
         self.src = Ether().src
-        logging.debug('[Sniffer] Machine ID: {}: Sniffer initialized'.format(machine.machine_id))
+        self.sockets = []
+        logging.debug('[Sniffer] Machine ID: %s: Sniffer initialized', machine.machine_id)
 
     def __handle_sniffer(self):
         """
         Handle the sniffer callback.
-        
+
         Returns:
             function: The callback function to execute when a packet is sniffed.
         """
         def pkt_callback(packet):
             """
             Callback function for sniffed packets.
-            
+
             Args:
                 packet: The sniffed packet.
             """
+            logging.info("[Sniffer] Packet passed the filter: %s", truncated(packet))
             if self.queue is not None:
-                self.queue.append(packet)
+                with self.packet_available:
+                    self.queue.append(packet)
+                    self.packet_available.notify_all()
         return pkt_callback
 
     def __filter_packet(self, packet):
         """
-        Filter the packets.
-        
+        Filter the packets when no BPF filter can be compiled, which is only allowed without a filter.
+
         Args:
             packet: The packet to filter.
-        
+
+        Returns:
+            bool: True if the packet is an IP packet not sent by the local machine, False otherwise.
+        """
+        return 'IP' in packet and packet[Ether].src != self.src
+
+    def expression(self):
+        """
+        Get the BPF expression of the packets captured by the sniffer.
+
+        Returns:
+            str: The expression, combining the filter with the IP packets not sent by the local machine.
+        """
+        expression = 'ip and not ether src {}'.format(self.src)
+        if self.__filter:
+            expression = '{} and ({})'.format(expression, self.__filter)
+        if conf.except_filter:
+            expression = '({}) and not ({})'.format(expression, conf.except_filter)
+        return expression
+
+    def start(self):
+        """
+        Open a capture socket with the BPF filter attached, and start sniffing on it.
+
+        Raises:
+            Scapy_Exception: If the filter cannot be compiled.
+        """
+        try:
+            capture = conf.L2listen(type=ETH_P_ALL, filter=self.expression(), nofilter=1 if conf.except_filter else 0)
+            self.kwargs['lfilter'] = None
+        except Scapy_Exception as e:
+            if self.__filter:
+                raise
+            # Without libpcap, only the IP packets not sent by the local machine are kept, in Python.
+            logging.warning('[Sniffer] Cannot compile the BPF filter, filtering in Python: %s', e)
+            capture = conf.L2listen(type=ETH_P_ALL, nofilter=1)
+            self.kwargs['lfilter'] = self.__filter_packet
+        self.sockets.append(capture)
+        self.kwargs['opened_socket'] = capture
+        super().start()
+
+    def stop(self, join=True):
+        """
+        Stop sniffing and close the capture sockets.
+
+        Args:
+            join (bool, optional): Whether to wait for the sniffing thread to stop. Defaults to True.
+
         Returns:
-            bool: True if the packet is accepted, False otherwise.
+            PacketList: The sniffed packets, if the sniffer was joined.
         """
-        # Check if the packet is an IP packet
-        if 'IP' not in packet:
-            return False  # Reject if it's not an IP packet
-
-        # Check if the source MAC address of the packet is different from the local machine's MAC
-        if packet[Ether].src == self.src:
-            return False  # Reject packets with the local machine's MAC address
-        
-        # Apply further filtering (e.g., using sniff)
-        filtered_packets = sniff(offline=packet, filter=self.__filter)
-        if packet in filtered_packets:
-            logging.info("[Sniffer] Packet passed the filter: %s", packet)
-            return True
-        
-        return False
+        try:
+            return super().stop(join)
+        finally:
+            for capture in self.sockets:
+                capture.close()
+            self.sockets = []
 
     def set_filter(self, filter):
         """
-        Set a new filter.
-        
+        Set a new filter, compiled and attached to the capture sockets if the sniffer is running.
+
         Args:
             filter (str): The new filter string.
+
+        Raises:
+            Scapy_Exception: If the filter cannot be compiled.
         """
         self.__filter = filter
-        logging.debug("[Sniffer] Filter set to: %s", filter)
\ No newline at end of file
+        for capture in self.sockets:
+            attach_filter(capture.ins, self.expression(), capture.iface)
+        logging.debug("[Sniffer] Filter set to: %s", filter)
@@ -0,0 +1,230 @@
+"""
+Export of execution traces to the Chrome trace event format, viewable in Perfetto or chrome://tracing.
+
+Each worker is a process of the exported trace. Each machine runs on its own track, except the machines
+started with 'call', which run within the call on the track of the calling machine. Machines, states and
+actions are nested slices of their track, transitions, events and variable writes are instant events, and
+the sync messages exchanged by the workers are flow arrows from the sender to the receiver.
+"""
+from nopasaran.definitions.trace import TraceEvent
+
+
+def wall_clock_times(trace, kind):
+    """
+    Get the times of the sync messages of a trace, by name and sequence number.
+
+    Args:
+        trace (Trace): The trace.
+        kind (TraceEvent): SYNC_SENT or SYNC_RECEIVED.
+
+    Returns:
+        dict: The time since the epoch of each message, in nanoseconds, by name and sequence number.
+    """
+    return {(record.name, record.value): record.timestamp + trace.clock_offset for record in trace.records if record.kind == kind}
+
+
+def estimate_offset(reference, other):
+    """
+    Estimate the offset between the clocks of two workers from the sync messages they exchanged.
+
+    The delay of a message, as measured with the clocks of the sender and the receiver, is its transit
+    time plus the offset between the clocks. With the messages of least delay in both directions, which
+    best approach the transit time, the offset is estimated as in NTP, assuming symmetric transit times.
+    With messages in one direction only, the transit time is assumed to be zero.
+
+    Args:
+        reference (Trace): The trace of the reference worker.
+        other (Trace): The trace of the other worker.
+
+    Returns:
+        int or None: The offset to add to the times of the other worker to get those of the reference
+        worker, in nanoseconds, or None if the workers did not exchange any sync message.
+    """
+    def delays(sender, receiver):
+        sent = wall_clock_times(sender, TraceEvent.SYNC_SENT)
+        received = wall_clock_times(receiver, TraceEvent.SYNC_RECEIVED)
+        return [received[key] - sent[key] for key in sent.keys() & received.keys()]
+
+    outgoing = delays(reference, other)
+    incoming = delays(other, reference)
+    if outgoing and incoming:
+        return (min(incoming) - min(outgoing)) // 2
+    if outgoing:
+        return -min(outgoing)
+    if incoming:
+        return min(incoming)
+    return None
+
+
+class ChromeTraceBuilder:
+    """
+    Builder of the events of a Chrome trace from the execution traces of the workers.
+    """
+
+    def __init__(self, origin, senders):
+        """
+        Initialize the ChromeTraceBuilder.
+
+        Args:
+            origin (int): The time since the epoch of the start of the Chrome trace, in nanoseconds.
+            senders (dict): The processes sending each sync message, by name and sequence number.
+        """
+        self.events = []
+        self.flows = {}
+        self.senders = senders
+        self.processes = 0
+        self.origin = origin
+
+    def flow_id(self, pid, record):
+        """
+        Get the ID of the flow of a sync message, shared by its sending and its reception.
+
+        A message is identified by its sender, its name and its sequence number, as the workers number the
+        messages they send in each direction independently. A received message was sent by another process.
+
+        Args:
+            pid (int): The process of the record.
+            record (TraceRecord): The SYNC_SENT or SYNC_RECEIVED record.
+
+        Returns:
+            int: The ID of the flow.
+        """
+        key = (record.name, record.value)
+        if record.kind == TraceEvent.SYNC_SENT:
+            sender = pid
+        else:
+            sender = next((process for process in self.senders.get(key, ()) if process != pid), None)
+        return self.flows.setdefault((sender,) + key, len(self.flows) + 1)
+
+    def add_trace(self, trace, label, offset=0):
+        """
+        Add the events of the trace of a worker, as a process of the Chrome trace.
+
+        Args:
+            trace (Trace): The trace of the worker.
+            label (str): The name of the process.
+            offset (int, optional): The offset to add to the times of the trace, in nanoseconds. Defaults to 0.
+        """
+        if not trace.records:
+            return
+        self.processes += 1
+        pid = self.processes
+        shift = trace.clock_offset + offset
+        events = self.events
+        tracks = {}
+        actions = {}
+        states = {}
+        machines = {}
+
+        def time(timestamp):
+            return (timestamp + shift - self.origin) / 1000
+
+        def new_track(machine):
+            tracks[machine] = len(set(tracks.values())) + 1
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tracks[machine], "args": {"name": machine}})
+
+        def tid(machine):
+            if machine not in tracks:
+                new_track(machine)
+            return tracks[machine]
+
+        def complete(name, category, machine, start, end, args=None):
+            event = {"name": name, "cat": category, "ph": "X", "pid": pid, "tid": tid(machine), "ts": time(start), "dur": (end - start) / 1000}
+            if args:
+                event["args"] = args
+            events.append(event)
+
+        def instant(name, category, machine, timestamp, args=None):
+            event = {"name": name, "cat": category, "ph": "i", "s": "t", "pid": pid, "tid": tid(machine), "ts": time(timestamp)}
+            if args:
+                event["args"] = args
+            events.append(event)
+
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": label}})
+        for record in trace.records:
+            kind = record.kind
+            machine = record.machine
+            if kind == TraceEvent.MACHINE_START:
+                if record.value != machine and record.value in tracks:
+                    tracks[machine] = tracks[record.value]
+                elif machine not in tracks:
+                    new_track(machine)
+                machines[machine] = record.timestamp
+                states[machine] = (record.name, record.timestamp)
+            elif kind == TraceEvent.ACTION_START:
+                actions.setdefault(machine, []).append(record.timestamp)
+            elif kind == TraceEvent.ACTION_END:
+                if actions.get(machine):
+                    complete(record.name, "action", machine, actions[machine].pop(), record.timestamp)
+            elif kind == TraceEvent.TRANSITION:
+                if machine in states:
+                    name, start = states[machine]
+                    complete(name, "state", machine, start, record.timestamp)
+                states[machine] = (record.name, record.timestamp)
+                instant('{} -> {}'.format(record.value, record.name), "transition", machine, record.timestamp)
+            elif kind == TraceEvent.MACHINE_END:
+                if machine in states:
+                    name, start = states.pop(machine)
+                    complete(name, "state", machine, start, record.timestamp)
+                if machine in machines:
+                    complete(machine, "machine", machine, machines.pop(machine), record.timestamp)
+            elif kind == TraceEvent.EVENT:
+                instant(record.name, "event", machine, record.timestamp)
+            elif kind == TraceEvent.VARIABLE_WRITE:
+                instant(record.name, "variable", machine, record.timestamp, {"size": record.value})
+            elif kind in (TraceEvent.SYNC_SENT, TraceEvent.SYNC_RECEIVED):
+                sent = kind == TraceEvent.SYNC_SENT
+                instant('sync ' + record.name, "sync", machine, record.timestamp, {"sequence": record.value})
+                flow = {"name": "sync " + record.name, "cat": "sync", "ph": "s" if sent else "f", "id": self.flow_id(pid, record),
+                        "pid": pid, "tid": tid(machine), "ts": time(record.timestamp)}
+                if not sent:
+                    flow["bp"] = "e"
+                events.append(flow)
+
+        # Close the slices still open when the trace was written, such as those of a failed machine.
+        end = trace.records[-1].timestamp
+        for machine, running in actions.items():
+            for start in running:
+                complete("(running)", "action", machine, start, end)
+        for machine, (name, start) in states.items():
+            complete(name, "state", machine, start, end)
+        for machine, start in machines.items():
+            complete(machine, "machine", machine, start, end)
+
+    def build(self):
+        """
+        Get the Chrome trace.
+
+        Returns:
+            dict: The Chrome trace, to write as JSON.
+        """
+        return {"traceEvents": self.events, "displayTimeUnit": "ms"}
+
+
+def export(traces, offsets=None):
+    """
+    Export the traces of one or more workers to a Chrome trace.
+
+    Unless given, the offsets between the clocks of the workers are estimated from the sync messages they
+    exchanged, relative to the first worker.
+
+    Args:
+        traces (list): The traces of the workers, as (label, Trace) pairs.
+        offsets (list, optional): The offset to add to the times of each trace, in nanoseconds. Defaults to None.
+
+    Returns:
+        tuple: The Chrome trace, and the offsets applied to the traces, None for the traces with no
+        estimated offset.
+    """
+    if offsets is None:
+        offsets = [0] + [estimate_offset(traces[0][1], trace) for _, trace in traces[1:]]
+    origin = min((trace.records[0].timestamp + trace.clock_offset + (offset or 0)
+                  for (_, trace), offset in zip(traces, offsets) if trace.records), default=0)
+    senders = {}
+    for pid, (_, trace) in enumerate((item for item in traces if item[1].records), 1):
+        for key in wall_clock_times(trace, TraceEvent.SYNC_SENT):
+            senders.setdefault(key, []).append(pid)
+    builder = ChromeTraceBuilder(origin, senders)
+    for (label, trace), offset in zip(traces, offsets):
+        builder.add_trace(trace, label, offset or 0)
+    return builder.build(), offsets
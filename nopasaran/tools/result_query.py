@@ -0,0 +1,190 @@
+"""
+Query tool of the result stores written by the workers with the --store option.
+
+Usage:
+    nopasaran-store STORE runs [--test TEST] [--target TARGET] [--state STATE] [--status STATUS] [--since TIME] [--until TIME] [-n LIMIT] [--json]
+    nopasaran-store STORE count [--by COLUMN ...] [FILTERS]
+    nopasaran-store STORE show RUN [-v VARIABLE ...]
+    nopasaran-store STORE import [--target TARGET] RESULT [RESULT ...]
+"""
+import sys
+import json
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+
+from nopasaran.logging_utils import truncated
+from nopasaran.runners.result_store import ResultStore, FILTERS
+
+
+def parse_time(value):
+    """
+    Parse a time of the command line, in seconds since the epoch or in ISO 8601, UTC unless a zone is given.
+
+    Args:
+        value (str): The time.
+
+    Returns:
+        float: The time in seconds since the epoch.
+
+    Raises:
+        argparse.ArgumentTypeError: If the time is not valid.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid time {!r}, expected seconds since the epoch or ISO 8601'.format(value))
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def format_time(timestamp):
+    """
+    Format a time in ISO 8601, in UTC.
+
+    Args:
+        timestamp (float): The time in seconds since the epoch.
+
+    Returns:
+        str: The formatted time.
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='seconds')
+
+
+def filters(args):
+    """
+    Get the filters of the command line.
+
+    Args:
+        args (argparse.Namespace): The options of the command line.
+
+    Returns:
+        dict: The filters, as the keyword arguments of ResultStore.runs and ResultStore.count.
+    """
+    return dict({column: getattr(args, column) for column in FILTERS}, since=args.since, until=args.until)
+
+
+def print_runs(store, args):
+    """
+    Print the runs matching the filters, the most recent first.
+
+    Args:
+        store (ResultStore): The store.
+        args (argparse.Namespace): The options of the command line.
+    """
+    for run in store.runs(limit=args.limit, **filters(args)):
+        if args.json:
+            print(json.dumps(run))
+        else:
+            print('{:>8}  {}  {:<16} {:<20} {:<16} {:<8} {}'.format(
+                run["id"], format_time(run["started"]), run["test"], run["target"] or '-', run["state"] or '-', run["status"],
+                '' if run["duration"] is None else '{:.3f} s'.format(run["duration"])))
+
+
+def print_counts(store, args):
+    """
+    Print the number of runs matching the filters, grouped by columns.
+
+    Args:
+        store (ResultStore): The store.
+        args (argparse.Namespace): The options of the command line.
+    """
+    by = args.by or []
+    for row in store.count(by, **filters(args)):
+        print('\t'.join(['-' if value is None else str(value) for value in row[:-1]] + [str(row[-1])]))
+
+
+def print_run(store, args):
+    """
+    Print a run, with its variables and timings.
+
+    Args:
+        store (ResultStore): The store.
+        args (argparse.Namespace): The options of the command line.
+
+    Returns:
+        int: The exit status, 1 if the run does not exist.
+    """
+    run = store.run(args.run)
+    if run is None:
+        print('No run {}'.format(args.run), file=sys.stderr)
+        return 1
+    for column, value in run.items():
+        if column == "started":
+            value = format_time(value)
+        print('{}: {}'.format(column, value))
+    print('variables:')
+    for name, value in store.variables(args.run, args.variable).items():
+        print('  {} = {}'.format(name, truncated(value)))
+    timings = store.timings(args.run)
+    if timings:
+        print('timings: {}'.format(timings))
+    return 0
+
+
+def import_results(store, args):
+    """
+    Add the runs of result files to the store.
+
+    Args:
+        store (ResultStore): The store.
+        args (argparse.Namespace): The options of the command line.
+
+    Returns:
+        int: The exit status, 1 if a file could not be added.
+    """
+    status = 0
+    for path in args.results:
+        try:
+            print('{}: run {}'.format(path, store.add_file(path, args.target)))
+        except (OSError, ValueError) as e:
+            print('Error reading result: {}'.format(e), file=sys.stderr)
+            status = 1
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='nopasaran-store', description='Query a result store written by NoPASARAN workers')
+    parser.add_argument("store", metavar="STORE", help="Result store written with the --store option")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    filter_parser = argparse.ArgumentParser(add_help=False)
+    for column in FILTERS:
+        filter_parser.add_argument("--" + column, help="Only the runs with this {}".format(column))
+    filter_parser.add_argument("--since", type=parse_time, help="Only the runs started at or after this time, in seconds since the epoch or ISO 8601")
+    filter_parser.add_argument("--until", type=parse_time, help="Only the runs started before this time")
+
+    runs_parser = commands.add_parser("runs", parents=[filter_parser], help="List the runs, the most recent first")
+    runs_parser.add_argument("-n", "--limit", type=int, default=100, help="Maximum number of runs (default: %(default)s)")
+    runs_parser.add_argument("--json", action="store_true", help="Write one JSON object per run")
+    count_parser = commands.add_parser("count", parents=[filter_parser], help="Count the runs, grouped by columns")
+    count_parser.add_argument("--by", action="append", choices=FILTERS, help="Group by this column, can be repeated")
+    show_parser = commands.add_parser("show", help="Show a run, with its variables and timings")
+    show_parser.add_argument("run", type=int, help="ID of the run")
+    show_parser.add_argument("-v", "--variable", action="append", help="Only show this variable, can be repeated")
+    import_parser = commands.add_parser("import", help="Add the runs of result files written with the --result-file option")
+    import_parser.add_argument("results", nargs="+", metavar="RESULT", help="Result file")
+    import_parser.add_argument("--target", help="Target of the runs")
+    args = parser.parse_args(argv)
+
+    try:
+        with ResultStore(args.store) as store:
+            if args.command == "runs":
+                print_runs(store, args)
+            elif args.command == "count":
+                print_counts(store, args)
+            elif args.command == "show":
+                return print_run(store, args)
+            else:
+                return import_results(store, args)
+    except sqlite3.Error as e:
+        print('Error reading store: {}'.format(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Reader of the result files written by the workers with the --result-file option.
+
+Usage:
+    nopasaran-result [-v VARIABLE ...] RESULT [RESULT ...]
+    nopasaran-result --records RESULT [RESULT ...]
+"""
+import sys
+import argparse
+from datetime import datetime, timezone
+
+from nopasaran.logging_utils import truncated
+from nopasaran.machines.result_stream import ResultReader
+
+
+def print_result(reader, args):
+    """
+    Print the final state and variables of a result file.
+
+    Args:
+        reader (ResultReader): The reader of the file.
+        args (argparse.Namespace): The options of the command line.
+    """
+    result = reader.result()
+    metadata = result["Metadata"]
+    if "Started" in metadata:
+        print('# {} ({}), started at {}'.format(metadata.get("Test"), metadata.get("Machine"),
+                                               datetime.fromtimestamp(metadata["Started"] / 1e9, timezone.utc).isoformat()))
+    print('State: {}{}'.format(result["State"], '' if result["Complete"] else ' (incomplete)'))
+    for name, value in result["Variables"].items():
+        if not args.variable or name in args.variable:
+            print('  {} = {}'.format(name, truncated(value)))
+    for key in ("VariableSizes", "Timings", "Children"):
+        if key in result:
+            print('{}: {}'.format(key, result[key]))
+
+
+def print_records(reader):
+    """
+    Print the kind, name and size of the records of a result file, without decoding their values.
+
+    Args:
+        reader (ResultReader): The reader of the file.
+    """
+    for kind, name, _, length in reader.scan():
+        print('{:<15} {:<32} {} bytes'.format(kind.name, name, length))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='nopasaran-result', description='Read a result file written by a NoPASARAN worker')
+    parser.add_argument("results", nargs="+", metavar="RESULT", help="Result file written with the --result-file option")
+    parser.add_argument("-v", "--variable", action="append", help="Only show this variable, can be repeated")
+    parser.add_argument("--records", action="store_true", help="List the records of the file instead of the final result")
+    args = parser.parse_args(argv)
+
+    for path in args.results:
+        if len(args.results) > 1:
+            print('# {}'.format(path))
+        try:
+            with ResultReader(path) as reader:
+                if args.records:
+                    print_records(reader)
+                else:
+                    print_result(reader, args)
+        except (OSError, ValueError) as e:
+            print('Error reading result: {}'.format(e), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
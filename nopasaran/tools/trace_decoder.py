@@ -0,0 +1,113 @@
+"""
+Decoder of the execution traces written by the workers with the --trace option.
+
+The traces can also be exported to the Chrome trace event format, merging the traces of the workers of
+a test on a common timeline.
+
+Usage:
+    nopasaran-trace [-m MACHINE] [--json] TRACE [TRACE ...]
+    nopasaran-trace --chrome OUTPUT [--offset MS] TRACE [TRACE ...]
+"""
+import sys
+import json
+import argparse
+from datetime import datetime, timezone
+
+from nopasaran.definitions.trace import TraceEvent
+from nopasaran.machines.trace import TraceBuffer
+from nopasaran.tools.chrome_trace import export
+
+
+def describe(record, started):
+    """
+    Describe a trace record.
+
+    Args:
+        record (TraceRecord): The record.
+        started (dict): The start times of the running actions, by machine, updated with the record.
+
+    Returns:
+        str: The description of the record.
+    """
+    if record.kind == TraceEvent.ACTION_START:
+        started.setdefault(record.machine, []).append(record.timestamp)
+        return record.name
+    if record.kind == TraceEvent.ACTION_END:
+        running = started.get(record.machine)
+        if running:
+            return '{} ({:.1f} us)'.format(record.name, (record.timestamp - running.pop()) / 1000)
+        return record.name
+    if record.kind == TraceEvent.TRANSITION:
+        return '{} -> {}'.format(record.value, record.name)
+    if record.kind == TraceEvent.VARIABLE_WRITE:
+        return '{} ({} bytes or items)'.format(record.name, record.value)
+    return record.name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='nopasaran-trace', description='Decode an execution trace written by a NoPASARAN worker')
+    parser.add_argument("traces", nargs="+", metavar="TRACE", help="Trace file written with the --trace option")
+    parser.add_argument("-m", "--machine", help="Only show the records of the machines whose ID starts with this prefix")
+    parser.add_argument("--json", action="store_true", help="Write one JSON object per record, with the time since the epoch in nanoseconds")
+    parser.add_argument("--chrome", metavar="OUTPUT", help="Export the traces, the first worker's first, to this Chrome trace event JSON file")
+    parser.add_argument("--offset", type=float, help="Offset in milliseconds to add to the clocks of the other workers, instead of estimating it from their sync messages")
+    args = parser.parse_args(argv)
+
+    try:
+        traces = [(path, TraceBuffer.load(path)) for path in args.traces]
+    except (OSError, ValueError) as e:
+        print('Error reading trace: {}'.format(e), file=sys.stderr)
+        return 1
+
+    if args.chrome:
+        offsets = None if args.offset is None else [0] + [int(args.offset * 1e6)] * (len(traces) - 1)
+        chrome_trace, offsets = export(traces, offsets)
+        with open(args.chrome, 'w') as f:
+            json.dump(chrome_trace, f)
+        for (path, _), offset in list(zip(traces, offsets))[1:]:
+            if offset is None:
+                print('# {}: no sync message exchanged with {}, clocks not aligned'.format(path, traces[0][0]))
+            else:
+                print('# {}: clock offset {:+.3f} ms'.format(path, offset / 1e6))
+        return 0
+
+    for path, trace in traces:
+        if len(traces) > 1:
+            print('# {}'.format(path))
+        print_trace(trace, args)
+    return 0
+
+
+def print_trace(trace, args):
+    """
+    Print the records of a trace.
+
+    Args:
+        trace (Trace): The trace.
+        args (argparse.Namespace): The options of the command line.
+    """
+    records = [record for record in trace.records if args.machine is None or record.machine.startswith(args.machine)]
+    if args.json:
+        for record in records:
+            print(json.dumps({
+                "time_ns": record.timestamp + trace.clock_offset,
+                "kind": record.kind.name,
+                "machine": record.machine,
+                "name": record.name,
+                "value": record.value,
+            }))
+        return
+
+    print('# {} record(s), {} older record(s) dropped'.format(len(records), trace.dropped))
+    if not records:
+        return
+    first = records[0].timestamp
+    print('# Started at {}'.format(datetime.fromtimestamp((first + trace.clock_offset) / 1e9, timezone.utc).isoformat()))
+    started = {}
+    for record in records:
+        print('{:>14.6f}  {:<24} {:<15} {}'.format(
+            (record.timestamp - first) / 1e9, record.machine, record.kind.name, describe(record, started)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,11 +6,13 @@ import select
 import ssl
 import struct
 import logging
+from collections.abc import Mapping
 from dnslib import DNSRecord, QTYPE
 
 
 
-from scapy.all import IP, TCP, UDP, ICMP, Raw
+from scapy.layers.inet import IP, TCP, UDP, ICMP
+from scapy.packet import Raw
 
 
 
@@ -28,7 +30,7 @@ def serialize_log_data(log_data):
     def serialize_value(value):
         if value is None:
             return None
-        if isinstance(value, dict):
+        if isinstance(value, Mapping):
             return {k: serialize_value(v) for k, v in value.items()}
         return serialize_object(value)
     
@@ -30,7 +30,10 @@ setup(
     install_requires=requirements,
     entry_points={
         'console_scripts': [
-            'nopasaran = nopasaran.__main__:main'
+            'nopasaran = nopasaran.__main__:main',
+            'nopasaran-trace = nopasaran.tools.trace_decoder:main',
+            'nopasaran-result = nopasaran.tools.result_reader:main',
+            'nopasaran-store = nopasaran.tools.result_query:main'
         ]
     }
 )
\ No newline at end of file
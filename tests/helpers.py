@@ -0,0 +1,106 @@
+"""
+Helpers of the tests that need a running reactor, such as those of the control channel over loopback.
+
+The reactor cannot be restarted, so it is started once per process, in a daemon thread, and never stopped.
+The tests run in the main thread and hand their calls to the reactor thread.
+"""
+import time
+import threading
+
+from twisted.internet import reactor, threads
+
+from nopasaran.controllers.factory import WorkerClientFactory, WorkerServerFactory
+from nopasaran.controllers.protocol import WorkerClientProtocol
+from nopasaran.controllers.session import SessionDispatcher
+from nopasaran.definitions.control_channel import Status
+
+_reactor_thread = None
+
+
+def start_reactor():
+    """
+    Start the reactor in a daemon thread, unless it is already running.
+    """
+    global _reactor_thread
+    if _reactor_thread is None:
+        started = threading.Event()
+        reactor.callWhenRunning(started.set)
+        _reactor_thread = threading.Thread(target=reactor.run, kwargs={'installSignalHandlers': False}, daemon=True)
+        _reactor_thread.start()
+        started.wait(10)
+
+
+def in_reactor(function, *args, **kwargs):
+    """
+    Call a function in the reactor thread and wait for its result, or for the result of its Deferred.
+    """
+    return threads.blockingCallFromThread(reactor, function, *args, **kwargs)
+
+
+def wait_until(predicate, timeout=10):
+    """
+    Wait in the calling thread for a predicate to hold.
+
+    Returns:
+        bool: Whether the predicate holds, False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+class Endpoint:
+    """
+    Minimal stand-in for the state machine holding a control channel session.
+    """
+
+    def __init__(self, machine_id='TEST'):
+        self.machine_id = machine_id
+        self.variables = {}
+
+    def set_variable_value(self, name, value):
+        self.variables[name] = value
+
+    def ready(self, variable='ctrl'):
+        session = self.variables.get(variable)
+        return session is not None and session.local_status == Status.READY.name
+
+
+class Loopback:
+    """
+    A control channel connection between a client and a server over plain TCP on the loopback interface.
+    """
+
+    def __init__(self):
+        self.server = Endpoint('SERVER')
+        self.client = Endpoint('CLIENT')
+        self.listener = in_reactor(reactor.listenTCP, 0, WorkerServerFactory(self.server, 'ctrl'), interface='127.0.0.1')
+        self.port = self.listener.getHost().port
+        self.destination = ('127.0.0.1', self.port)
+        in_reactor(SessionDispatcher.register, self.port, self.server, 'ctrl')
+        self.factory = WorkerClientFactory(self.client, 'ctrl')
+        self.factory.destination = self.destination
+        in_reactor(reactor.connectTCP, '127.0.0.1', self.port, self.factory)
+        if not wait_until(lambda: self.server.ready() and self.client.ready()):
+            raise AssertionError('Control channel not ready')
+
+    @property
+    def protocol(self):
+        """
+        WorkerClientProtocol: The protocol of the client side of the connection.
+        """
+        return WorkerClientProtocol.connections[self.destination]
+
+    def close(self):
+        """
+        Close the connection and stop listening.
+        """
+        self.factory.stopTrying()
+        protocol = WorkerClientProtocol.connections.get(self.destination)
+        if protocol is not None:
+            in_reactor(protocol.transport.loseConnection)
+        in_reactor(self.listener.stopListening)
+        wait_until(lambda: self.destination not in WorkerClientProtocol.connections)
@@ -0,0 +1,76 @@
+import time
+import unittest
+
+from nopasaran.controllers.clock import PING, PONG, PeerClock
+
+try:
+    from tests.helpers import Loopback, in_reactor, start_reactor, wait_until
+    from nopasaran.controllers.protocol import WorkerProtocol
+except ImportError:
+    Loopback = None
+
+
+class PeerClockTest(unittest.TestCase):
+
+    def test_sample(self):
+        clock = PeerClock()
+        ping_id, sent = PING.unpack(clock.ping())
+        # The peer clock is 1000 ns ahead, and the transit takes 100 ns both ways.
+        pong = PONG.pack(ping_id, sent, sent + 1100, sent + 1300)
+        self.assertEqual(clock.pong_received(pong, sent + 400), (200, 1000))
+        self.assertEqual((clock.rtt, clock.offset), (200, 1000))
+        self.assertTrue(clock.synchronized)
+        self.assertEqual(clock.delay(sent + 1300, sent + 400), 100)
+        self.assertIsNone(clock.pong_received(pong, sent + 400))
+
+    def test_least_round_trip_time(self):
+        clock = PeerClock()
+        for rtt, offset in ((500, 10), (100, 20), (300, 30)):
+            ping_id, sent = PING.unpack(clock.ping())
+            clock.pong_received(PONG.pack(ping_id, sent, sent + offset, sent + offset), sent + rtt)
+        self.assertEqual((clock.rtt, clock.offset), (100, -30))
+
+    def test_unanswered(self):
+        clock = PeerClock(window=2)
+        self.assertIsNone(clock.delay(0, 0))
+        clock.ping()
+        self.assertFalse(clock.unanswered)
+        clock.ping()
+        self.assertTrue(clock.unanswered)
+
+
+@unittest.skipIf(Loopback is None, 'twisted is not installed')
+class LoopbackClockTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        self.ping_interval = WorkerProtocol.ping_interval
+        WorkerProtocol.ping_interval = 0.01
+        self.loopback = Loopback()
+
+    def tearDown(self):
+        WorkerProtocol.ping_interval = self.ping_interval
+        self.loopback.close()
+
+    def test_offset_within_half_round_trip(self):
+        server, client = self.loopback.server.variables['ctrl'], self.loopback.client.variables['ctrl']
+        self.assertTrue(wait_until(lambda: len(client.clock.samples) >= 4 and len(server.clock.samples) >= 4))
+        for clock in (client.clock, server.clock):
+            self.assertTrue(clock.synchronized)
+            self.assertGreaterEqual(clock.rtt, 0)
+            # Both endpoints share the same clock.
+            self.assertLessEqual(abs(clock.offset), clock.rtt / 2 + 1)
+
+    def test_timed_sync_sets_delay(self):
+        server, client = self.loopback.server.variables['ctrl'], self.loopback.client.variables['ctrl']
+        self.assertTrue(wait_until(lambda: client.clock.synchronized and server.clock.synchronized))
+        sent = time.time_ns()
+        in_reactor(client.send_sync, ['timed'])
+        self.assertTrue(wait_until(server.has_sync))
+        self.assertEqual(server.pop_sync(), ['timed'])
+        self.assertIsNotNone(server.sync_delay)
+        self.assertLess(abs(server.sync_delay), time.time_ns() - sent + server.clock.rtt + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
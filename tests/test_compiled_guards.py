@@ -0,0 +1,55 @@
+import unittest
+
+from nopasaran.definitions.transitions import StateDuringTransition
+from nopasaran.errors.parsing_error import ParsingError
+from nopasaran.interpreters.condition_interpreter import ConditionInterpreter
+from nopasaran.interpreters.transition_interpreter import TransitionInterpreter
+from nopasaran.primitives.condition_primitives.variable_comparisons import VariableComparisons
+from nopasaran.primitives.transition_primitives.assignment_transitions import VariableAssignmentTransitions
+
+OLD_STATE = StateDuringTransition.OLD_STATE.name
+NEW_STATE = StateDuringTransition.NEW_STATE.name
+
+
+class CompiledGuardTest(unittest.TestCase):
+
+    def test_comparisons(self):
+        cases = {
+            "equal": (False, True, False),
+            "gt": (False, False, True),
+            "gte": (False, True, True),
+            "lt": (True, False, False),
+            "lte": (True, True, False),
+        }
+        for name, expected in cases.items():
+            guard = ConditionInterpreter.compile("{} (a b)".format(name))
+            line = "{} (a b)".format(name)
+            for (a, b), result in zip(((1, 2), (2, 2), (3, 2)), expected):
+                variables = {"a": a, "b": b}
+                self.assertIs(guard.evaluate(variables), result, (name, a, b))
+                self.assertIs(ConditionInterpreter.evaluate(line, variables), result, (name, a, b))
+                self.assertIs(getattr(VariableComparisons, name)("(a b)", variables), result, (name, a, b))
+
+    def test_no_value(self):
+        guard = ConditionInterpreter.compile("no_value (a)")
+        self.assertTrue(guard.evaluate({"a": None}))
+        self.assertFalse(guard.evaluate({"a": 0}))
+        self.assertTrue(VariableComparisons.no_value("(a)", {"a": None}))
+
+    def test_missing_variable(self):
+        guard = ConditionInterpreter.compile("equal (a missing)")
+        with self.assertLogs(level='ERROR'), self.assertRaises(ParsingError):
+            guard.evaluate({"a": 1})
+
+    def test_assign(self):
+        assignment = TransitionInterpreter.compile("assign (source) (target)")
+        trans_tmp_dict = {OLD_STATE: {"source": 1}, NEW_STATE: {}}
+        assignment.evaluate(trans_tmp_dict)
+        self.assertEqual(trans_tmp_dict[NEW_STATE], {"target": 1})
+        trans_tmp_dict = {OLD_STATE: {"source": 2}, NEW_STATE: {}}
+        VariableAssignmentTransitions.assign("(source) (target)", trans_tmp_dict)
+        self.assertEqual(trans_tmp_dict[NEW_STATE], {"target": 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
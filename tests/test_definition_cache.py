@@ -0,0 +1,79 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from nopasaran.parsers.definition_cache import DefinitionCache
+from nopasaran.parsers.state_machine_compiler import StateMachineCompiler
+
+
+def plan(machine_id, *actions):
+    return {"id": machine_id, "initial": "Init", "states": {"Init": {"entry": [{"type": action} for action in actions]}}}
+
+
+class DefinitionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        DefinitionCache.clear()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content, mtime_ns=None):
+        path = os.path.join(self.directory, name + '.json')
+        with open(path, 'w') as json_file:
+            json.dump(content, json_file)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def test_plan_cached(self):
+        path = self.write('child', plan('CHILD', 'done'))
+        compiled = DefinitionCache.load_plan(path)
+        self.assertEqual(compiled.id, 'CHILD')
+        self.assertIs(DefinitionCache.load_plan(path), compiled)
+        self.assertIs(DefinitionCache.load_plan(os.path.relpath(path)), compiled)
+        self.assertIsNot(DefinitionCache.load_json(path), compiled)
+
+    def test_size_changed(self):
+        path = self.write('child', plan('CHILD', 'done'), mtime_ns=10 ** 18)
+        compiled = DefinitionCache.load_plan(path)
+        self.write('child', plan('CHANGED-CHILD', 'done'), mtime_ns=10 ** 18)
+        self.assertEqual(DefinitionCache.load_plan(path).id, 'CHANGED-CHILD')
+        self.assertIsNot(DefinitionCache.load_plan(path), compiled)
+
+    def test_mtime_changed(self):
+        path = self.write('child', plan('CHILD-1', 'done'), mtime_ns=10 ** 18)
+        self.assertEqual(DefinitionCache.load_plan(path).id, 'CHILD-1')
+        self.write('child', plan('CHILD-2', 'done'), mtime_ns=10 ** 18)
+        # Same size and modification time: the cached plan is still served.
+        self.assertEqual(DefinitionCache.load_plan(path).id, 'CHILD-1')
+        os.utime(path, ns=(10 ** 18 + 1, 10 ** 18 + 1))
+        self.assertEqual(DefinitionCache.load_plan(path).id, 'CHILD-2')
+
+    def test_preload(self):
+        leaf = self.write('leaf', plan('LEAF', 'done'))
+        variables = self.write('variables', {"a": 1})
+        middle = self.write('middle', plan('MIDDLE', 'get_from_file ({} a) (a)'.format(variables[:-5]),
+                                           'spawn ({}) (handle)'.format(leaf[:-5])))
+        root = StateMachineCompiler.compile(plan('ROOT', 'call ({}) ()'.format(middle[:-5]), 'call ({}) ()'.format(middle[:-5])))
+        with self.assertLogs(level='INFO'):
+            loaded = DefinitionCache.preload(root)
+        self.assertEqual(loaded, sorted([leaf, middle, variables]))
+        self.assertEqual(DefinitionCache.load_plan(leaf).id, 'LEAF')
+
+    def test_preload_missing_file(self):
+        root = StateMachineCompiler.compile(plan('ROOT', 'call ({}) ()'.format(os.path.join(self.directory, 'missing'))))
+        with self.assertRaises(OSError):
+            DefinitionCache.preload(root)
+
+    def test_preload_without_files(self):
+        root = StateMachineCompiler.compile(plan('ROOT', 'set (a) (b)', 'done'))
+        with self.assertLogs(level='INFO'):
+            self.assertEqual(DefinitionCache.preload(root), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import base64
+import unittest
+
+from nopasaran.controllers.framing import FRAME_HEADER, FrameDecoder, encode_frame
+from nopasaran.definitions.control_channel import JSONMessage
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        frames = [(JSONMessage.SYNC.value, 0, b'content'), (JSONMessage.STATUS.value, 7, b''),
+                  (JSONMessage.TAG.value, 2 ** 32 - 1, bytes(range(256)) * 10)]
+        data = b''.join(encode_frame(frame_type, body, session_id) for frame_type, session_id, body in frames)
+        self.assertEqual(FrameDecoder().feed(data), frames)
+
+    def test_split_reads(self):
+        frames = [(JSONMessage.SYNC.value, 1, b'first'), (JSONMessage.PING.value, 2, b'second' * 100)]
+        data = b''.join(encode_frame(frame_type, body, session_id) for frame_type, session_id, body in frames)
+        for size in (1, 2, FRAME_HEADER.size - 1, FRAME_HEADER.size, FRAME_HEADER.size + 1, 100):
+            decoder = FrameDecoder()
+            messages = []
+            for index in range(0, len(data), size):
+                messages += decoder.feed(data[index:index + size])
+            self.assertEqual(messages, frames, 'reads of {} bytes'.format(size))
+            self.assertEqual(decoder.buffer, b'')
+
+    def test_partial_frame_is_kept(self):
+        frame = encode_frame(JSONMessage.SYNC.value, b'body', 3)
+        decoder = FrameDecoder()
+        self.assertEqual(decoder.feed(frame[:-1]), [])
+        self.assertEqual(decoder.feed(frame[-1:]), [(JSONMessage.SYNC.value, 3, b'body')])
+
+    def test_legacy_messages(self):
+        legacy = base64.b64encode(b'{"type": 1}')
+        frame = encode_frame(JSONMessage.SYNC.value, b'body', 4)
+        self.assertEqual(FrameDecoder().feed(legacy + frame),
+                         [(None, 0, legacy), (JSONMessage.SYNC.value, 4, b'body')])
+        self.assertEqual(FrameDecoder().feed(legacy), [(None, 0, legacy)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import logging
+import threading
+import unittest
+
+from nopasaran.logging_utils import start_log_queue
+
+
+class ThreadFormatter(logging.Formatter):
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def format(self, record):
+        self.threads.append(threading.current_thread())
+        return super().format(record)
+
+
+class LogQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger('tests.log_queue')
+        self.logger.propagate = False
+        self.formatter = ThreadFormatter()
+        self.records = []
+        handler = logging.Handler()
+        handler.setFormatter(self.formatter)
+        handler.emit = lambda record: self.records.append((record.msg, record.args, handler.format(record)))
+        self.logger.addHandler(handler)
+
+    def tearDown(self):
+        self.logger.handlers.clear()
+
+    def test_formatted_in_background_thread(self):
+        listener = start_log_queue(self.logger)
+        self.logger.warning('%s and %d', 'one', 2)
+        listener.stop()
+        self.assertEqual(self.records, [('%s and %d', ('one', 2), 'one and 2')])
+        self.assertNotIn(threading.current_thread(), self.formatter.threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
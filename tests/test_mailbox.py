@@ -0,0 +1,71 @@
+import unittest
+
+from nopasaran.controllers.mailbox import Mailbox
+from nopasaran.controllers.sync_codec import encode_sync
+from nopasaran.definitions.control_channel import WireFormat
+
+try:
+    from nopasaran.controllers.protocol import WorkerProtocol
+    from nopasaran.controllers.session import WorkerSession
+except ImportError:
+    WorkerProtocol = None
+
+
+class MailboxTest(unittest.TestCase):
+
+    def test_selective_receive(self):
+        mailbox = Mailbox()
+        mailbox.put('a', 1)
+        mailbox.put(None, 2)
+        mailbox.put('b', 3)
+        mailbox.put('a', 4)
+        self.assertEqual(len(mailbox), 4)
+        self.assertTrue(mailbox.contains('b'))
+        self.assertFalse(mailbox.contains('c'))
+        self.assertEqual(mailbox.take('b'), 3)
+        self.assertEqual(mailbox.take('a'), 1)
+        self.assertEqual(mailbox.take(None), 2)
+        self.assertEqual(mailbox.take('a'), 4)
+        self.assertEqual(len(mailbox), 0)
+
+    def test_take_missing_tag(self):
+        mailbox = Mailbox()
+        mailbox.put('a', 1)
+        with self.assertRaises(KeyError):
+            mailbox.take('b')
+        with self.assertRaises(KeyError):
+            mailbox.take(None)
+        self.assertEqual(len(mailbox), 1)
+
+
+@unittest.skipIf(WorkerProtocol is None, 'twisted is not installed')
+class SessionMailboxTest(unittest.TestCase):
+
+    def receive(self, session, tag, content):
+        session.sync_received(WireFormat.LENGTH_PREFIXED, encode_sync(content), tag)
+
+    def test_sessions_have_their_own_mailbox(self):
+        first, second = WorkerProtocol(), WorkerProtocol()
+        first_session, second_session = WorkerSession(first, 0), WorkerSession(second, 0)
+        self.receive(first_session, None, 'first')
+        self.assertTrue(first_session.has_sync())
+        self.assertFalse(second_session.has_sync())
+        self.assertEqual(first_session.pop_sync(), 'first')
+
+    def test_tagged_sync_messages(self):
+        session = WorkerSession(WorkerProtocol(), 0)
+        self.receive(session, 'probe', ['probe', 1])
+        self.receive(session, None, 'untagged')
+        self.receive(session, 'result', {'result': 2})
+        self.receive(session, 'probe', ['probe', 2])
+        self.assertFalse(session.has_sync('other'))
+        self.assertEqual(session.pop_sync('result'), {'result': 2})
+        self.assertEqual(session.pop_sync('probe'), ['probe', 1])
+        self.assertEqual(session.pop_sync(), 'untagged')
+        self.assertEqual(session.pop_sync('probe'), ['probe', 2])
+        with self.assertRaises(KeyError):
+            session.pop_sync('probe')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+try:
+    from tests.helpers import start_reactor
+    from nopasaran.machines.state_machine import StateMachine
+except ImportError:
+    StateMachine = None
+
+CHILD = {
+    "id": "CHILD",
+    "initial": "Init",
+    "states": {
+        "Init": {"on": {"STARTED": {"target": "Work"}}},
+        "Work": {"entry": [{"type": "get_parameters (parameter delay)"}, {"type": "wait (delay)"}, {"type": "return_values (parameter)"}]}
+    }
+}
+
+
+def root_plan(child, timeout):
+    def keep(*names):
+        return [{"type": "assign ({0}) ({0})".format(name)} for name in names]
+
+    return {
+        "id": "ROOT",
+        "initial": "Init",
+        "states": {
+            "Init": {"on": {"STARTED": {"target": "Spawn"}}},
+            "Spawn": {
+                "entry": [
+                    {"type": "set (one) (first-parameter)"},
+                    {"type": "set (two) (second-parameter)"},
+                    {"type": "set (0) (delay)"},
+                    {"type": "set ({}) (timeout)".format(timeout)},
+                    {"type": "spawn ({} first-parameter delay) (first)".format(child)},
+                    {"type": "spawn ({} second-parameter delay) (second)".format(child)},
+                    {"type": "join (first timeout) (first-result)"}
+                ],
+                "on": {
+                    "CHILD_DONE": {"target": "JoinSecond", "actions": keep("second", "timeout", "first-result")},
+                    "CHILD_FAILED": {"target": "Failed"},
+                    "TIMEOUT": {"target": "TimedOut"}
+                }
+            },
+            "JoinSecond": {
+                "entry": [{"type": "join (second timeout) (second-result)"}],
+                "on": {
+                    "CHILD_DONE": {"target": "End", "actions": keep("first-result", "second-result")},
+                    "CHILD_FAILED": {"target": "Failed"},
+                    "TIMEOUT": {"target": "TimedOut"}
+                }
+            },
+            "End": {},
+            "Failed": {},
+            "TimedOut": {}
+        }
+    }
+
+
+@unittest.skipIf(StateMachine is None, 'twisted is not installed')
+class SpawnJoinTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        self.directory = tempfile.mkdtemp()
+        self.child = os.path.join(self.directory, 'child')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_root(self, child, timeout=5):
+        with open(self.child + '.json', 'w') as child_file:
+            json.dump(child, child_file)
+        machine = StateMachine(root_plan(self.child, timeout))
+        machine.start()
+        return machine
+
+    def test_join_children(self):
+        machine = self.run_root(CHILD)
+        self.assertEqual(machine.current_state, "End")
+        self.assertEqual(dict(machine.variables), {"first-result": "one", "second-result": "two"})
+        self.assertEqual([child.status.name for child in machine.children], ["DONE", "DONE"])
+        self.assertEqual([child.machine.current_state for child in machine.children], ["Work", "Work"])
+
+    def test_failed_child(self):
+        child = dict(CHILD, states=dict(CHILD["states"], Work={"entry": [{"type": "wait (missing)"}]}))
+        with self.assertLogs(level='ERROR'):
+            machine = self.run_root(child)
+        self.assertEqual(machine.current_state, "Failed")
+        self.assertIn("FAILED", [child.status.name for child in machine.children])
+
+    def test_child_timeout(self):
+        child = dict(CHILD, states=dict(CHILD["states"], Work={"entry": [{"type": "set (2) (delay)"}, {"type": "wait (delay)"}]}))
+        machine = self.run_root(child, timeout=0.05)
+        self.assertEqual(machine.current_state, "TimedOut")
+        self.assertEqual([child.status.name for child in machine.children], ["TIMEOUT", "RUNNING"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+from nopasaran.parsers.state_machine_compiler import StateMachineCompiler, done_event
+
+try:
+    from tests.helpers import in_reactor, start_reactor
+    from nopasaran.machines.state_machine import StateMachine
+except ImportError:
+    StateMachine = None
+
+
+def region(value, variable):
+    return {
+        "initial": "Waiting",
+        "states": {
+            "Waiting": {
+                "entry": [{"type": "wait (delay)"}, {"type": "set ({}) ({})".format(value, variable)}, {"type": "done"}],
+                "on": {"DONE": {"target": "Finished", "actions": [{"type": "assign ({0}) ({0})".format(variable)}]}}
+            },
+            "Finished": {"type": "final"}
+        }
+    }
+
+
+PLAN = {
+    "id": "PARALLEL-FSM",
+    "initial": "Init",
+    "states": {
+        "Init": {
+            "on": {"STARTED": {"target": "Working"}}
+        },
+        "Working": {
+            "type": "parallel",
+            "entry": [{"type": "set_integer (0) (delay)"}],
+            "states": {
+                "First": region("first", "first-result"),
+                "Second": region("second", "second-result")
+            },
+            "onDone": [
+                {"target": "Failed", "cond": "no_value (second-result)"},
+                {
+                    "target": "End",
+                    "actions": [
+                        {"type": "assign (first-result) (first-result)"},
+                        {"type": "assign (second-result) (second-result)"}
+                    ]
+                }
+            ]
+        },
+        "Failed": {},
+        "End": {}
+    }
+}
+
+
+class ParallelStateCompilerTest(unittest.TestCase):
+
+    def test_compile_regions(self):
+        plan = StateMachineCompiler.compile(PLAN)
+        working = plan.states["Working"]
+        self.assertEqual([region.id for region in working.regions], ["First", "Second"])
+        self.assertEqual(working.regions[0].initial_state, "Waiting")
+        self.assertEqual(set(working.transitions), {done_event("Working")})
+        self.assertEqual(done_event("Working"), "done.state.Working")
+        self.assertEqual([transition.target for transition in working.transitions[done_event("Working")]], ["Failed", "End"])
+        self.assertEqual(plan.states["Init"].regions, ())
+        self.assertIn("wait", plan.primitives)
+
+
+@unittest.skipIf(StateMachine is None, 'twisted is not installed')
+class ParallelStateMachineTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+
+    def check_result(self, machine):
+        self.assertEqual(machine.current_state, "End")
+        self.assertEqual(dict(machine.variables), {"first-result": "first", "second-result": "second"})
+
+    def test_thread_mode(self):
+        machine = StateMachine(PLAN)
+        machine.start()
+        self.check_result(machine)
+
+    def test_reactor_mode(self):
+        machine = StateMachine(PLAN)
+        in_reactor(machine.run)
+        self.check_result(machine)
+
+    def test_region_failure(self):
+        plan = dict(PLAN, states=dict(PLAN["states"], Working=dict(PLAN["states"]["Working"], entry=[])))
+        machine = StateMachine(plan)
+        with self.assertLogs(level='ERROR'), self.assertRaises(Exception):
+            machine.start()
+
+
+if __name__ == '__main__':
+    unittest.main()
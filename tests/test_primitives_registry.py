@@ -0,0 +1,111 @@
+import unittest
+from unittest import mock
+
+from nopasaran.decorators import parsing_decorator
+from nopasaran.errors.registry_error import DuplicatePrimitiveError
+from nopasaran.interpreters.condition_interpreter import ConditionInterpreter
+from nopasaran.interpreters.interpreter import Interpreter
+from nopasaran.primitives.condition_primitives.condition_primitives import ConditionPrimitives
+from nopasaran.primitives.condition_primitives.variable_comparisons import VariableComparisons
+from nopasaran.primitives.primitives import Primitives
+
+
+class FirstPrimitives:
+
+    @staticmethod
+    @parsing_decorator(input_args=1, output_args=0)
+    def first(inputs, outputs, variables):
+        return variables[inputs[0]]
+
+    @staticmethod
+    def _helper():
+        return None
+
+
+class SecondPrimitives:
+
+    @staticmethod
+    @parsing_decorator(input_args=0, output_args=0)
+    def second(inputs, outputs, variables):
+        return 'second'
+
+
+class ClashingPrimitives:
+
+    @staticmethod
+    def first(inputs, outputs, variables):
+        return None
+
+
+class EntryPoint:
+
+    def __init__(self, name, class_):
+        self.name = name
+        self.class_ = class_
+
+    def load(self):
+        if isinstance(self.class_, Exception):
+            raise self.class_
+        return self.class_
+
+
+class PrimitivesRegistryTest(unittest.TestCase):
+
+    def test_registry(self):
+        class TestPrimitives(Primitives):
+            classes = [FirstPrimitives, SecondPrimitives]
+
+        registry = TestPrimitives.get_registry()
+        self.assertEqual(set(registry), {'first', 'second'})
+        self.assertIs(TestPrimitives.get_registry(), registry)
+        self.assertIs(TestPrimitives.get_primitive('first'), FirstPrimitives.first)
+        self.assertIsNone(TestPrimitives.get_primitive('_helper'))
+        self.assertIsNone(TestPrimitives.get_primitive('third'))
+        self.assertEqual(Interpreter.evaluate('second', {}, TestPrimitives), 'second')
+        self.assertEqual(Interpreter.evaluate('first (a)', {'a': 1}, TestPrimitives), 1)
+
+    def test_registry_per_class(self):
+        class TestPrimitives(Primitives):
+            classes = [FirstPrimitives]
+
+        class OtherPrimitives(Primitives):
+            classes = [SecondPrimitives]
+
+        self.assertEqual(set(TestPrimitives.get_registry()), {'first'})
+        self.assertEqual(set(OtherPrimitives.get_registry()), {'second'})
+
+    def test_duplicate_primitive(self):
+        class TestPrimitives(Primitives):
+            classes = [FirstPrimitives, ClashingPrimitives]
+
+        with self.assertRaises(DuplicatePrimitiveError) as context:
+            TestPrimitives.get_registry()
+        self.assertIn("'first'", str(context.exception))
+
+    def test_entry_points(self):
+        class TestPrimitives(Primitives):
+            classes = [FirstPrimitives]
+            entry_point_group = 'tests.primitives'
+
+        entry_points = [EntryPoint('second', SecondPrimitives), EntryPoint('broken', ImportError('missing'))]
+        with mock.patch('nopasaran.primitives.primitives._iter_entry_points', return_value=entry_points) as iter_entry_points, \
+                self.assertLogs(level='ERROR'):
+            self.assertEqual(set(TestPrimitives.get_registry()), {'first', 'second'})
+        iter_entry_points.assert_called_once_with('tests.primitives')
+
+    def test_duplicate_entry_point(self):
+        class TestPrimitives(Primitives):
+            classes = [FirstPrimitives]
+            entry_point_group = 'tests.primitives'
+
+        with mock.patch('nopasaran.primitives.primitives._iter_entry_points', return_value=[EntryPoint('clash', ClashingPrimitives)]):
+            with self.assertRaises(DuplicatePrimitiveError):
+                TestPrimitives.get_registry()
+
+    def test_condition_primitives(self):
+        self.assertIs(ConditionPrimitives.get_primitive('equal'), VariableComparisons.equal)
+        self.assertTrue(ConditionInterpreter.evaluate('equal (a b)', {'a': 1, 'b': 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from nopasaran.definitions.jobs import JobStatus
+from nopasaran.machines.result_stream import ResultWriter
+from nopasaran.machines.variable_store import VariableStore
+from nopasaran.runners.result_store import ResultStore
+
+TIMINGS = {"Primitives": {"wait": {"count": 2, "p50_us": 1.5, "p99_us": 3.0, "max_us": 3.0}}}
+
+
+class ResultStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = ResultStore(os.path.join(self.directory, 'results.db'))
+        # Test, target, start time, final state and status of each run.
+        self.rows = [
+            ('http', '192.0.2.1', 100, 'End', JobStatus.DONE.name),
+            ('http', '192.0.2.1', 200, 'RESET', JobStatus.DONE.name),
+            ('http', '192.0.2.2', 300, 'End', JobStatus.DONE.name),
+            ('tcp', '192.0.2.1', 400, 'End', JobStatus.DONE.name),
+            ('tcp', None, 500, None, JobStatus.TIMEOUT.name),
+        ]
+        for test, target, started, state, status in self.rows:
+            result = None if state is None else {"State": state, "Variables": {}}
+            self.store.add(result, test, target, started, status=status)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_count(self):
+        self.assertEqual(self.store.count(), [(5,)])
+        self.assertEqual(self.store.count(by=('test',)), [('http', 3), ('tcp', 2)])
+        self.assertCountEqual(self.store.count(by=('target',)), [('192.0.2.1', 3), ('192.0.2.2', 1), (None, 1)])
+        self.assertEqual(self.store.count(by=('state',), test='http'), [('End', 2), ('RESET', 1)])
+        self.assertEqual(self.store.count(target='192.0.2.1', state='End'), [(2,)])
+        self.assertEqual(self.store.count(test='udp'), [(0,)])
+        self.assertEqual(self.store.count(by=('status',)), [('DONE', 4), ('TIMEOUT', 1)])
+
+    def test_count_matches_runs(self):
+        for by in ((), ('test',), ('target',), ('test', 'state'), ('target', 'status')):
+            for filters in ({}, {'test': 'http'}, {'target': '192.0.2.1'}, {'state': 'End'}):
+                self.assertEqual(sorted(self.store.count(by, **filters), key=repr),
+                                 sorted(self.store.count(by, since=0, **filters), key=repr), (by, filters))
+
+    def test_count_time_range(self):
+        self.assertEqual(self.store.count(since=200, until=400), [(2,)])
+        self.assertEqual(self.store.count(by=('test',), since=300), [('tcp', 2), ('http', 1)])
+
+    def test_count_invalid_column(self):
+        with self.assertRaises(ValueError):
+            self.store.count(by=('duration',))
+        with self.assertRaises(ValueError):
+            self.store.count(duration=1)
+
+    def test_runs(self):
+        runs = self.store.runs()
+        self.assertEqual([run['started'] for run in runs], [500, 400, 300, 200, 100])
+        self.assertEqual([run['started'] for run in self.store.runs(limit=2, test='http')], [300, 200])
+        self.assertEqual([run['started'] for run in self.store.runs(target='192.0.2.1', since=150, until=400)], [200])
+        self.assertEqual(self.store.runs(state='RESET')[0]['parameters'], [])
+
+    def test_add_variables_and_timings(self):
+        run = self.store.add({"State": "End", "Variables": {"data": b'\x00', "lock": object()}, "Timings": TIMINGS,
+                              "Children": {}}, 'udp', parameters=[1, 'a'], metadata={"timeout": 5})
+        variables = self.store.variables(run)
+        self.assertEqual(variables["data"], b'\x00')
+        self.assertEqual(variables["lock"].type, 'object')
+        self.assertEqual(self.store.variables(run, ['data']), {"data": b'\x00'})
+        self.assertEqual(self.store.timings(run), TIMINGS)
+        stored = self.store.run(run)
+        self.assertEqual(stored['parameters'], [1, 'a'])
+        self.assertEqual(stored['metadata'], {"timeout": 5, "Children": {}})
+        self.assertIsNone(self.store.run(run + 1))
+
+    def test_add_file(self):
+        path = os.path.join(self.directory, 'test.nprs')
+        writer = ResultWriter(path, {"Test": "dns", "Machine": "MAIN", "Parameters": ["192.0.2.3"], "Started": 600 * 10 ** 9})
+        variables = VariableStore({"answer": "192.0.2.4"})
+        writer.settle('Query', variables)
+        writer.file.close()
+        run = self.store.add_file(path, target='192.0.2.3')
+        stored = self.store.run(run)
+        self.assertEqual((stored['test'], stored['target'], stored['started'], stored['state'], stored['status']),
+                         ('dns', '192.0.2.3', 600, 'Query', JobStatus.FAILED.name))
+        self.assertEqual(stored['parameters'], ["192.0.2.3"])
+        self.assertEqual(self.store.variables(run), {"answer": "192.0.2.4"})
+        self.assertEqual(self.store.count(test='dns', status=JobStatus.FAILED.name), [(1,)])
+
+    def test_reopen(self):
+        self.store.close()
+        self.store = ResultStore(os.path.join(self.directory, 'results.db'))
+        self.assertEqual(self.store.count(), [(5,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from nopasaran.definitions.results import ResultRecordType
+from nopasaran.machines.result_stream import OpaqueValue, ResultReader, ResultWriter, read_result
+from nopasaran.machines.variable_store import VariableStore
+
+METADATA = {"test": "test.json", "parameters": [1, "a"]}
+
+
+class ResultStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.nprs')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_machine(self, stop=True):
+        writer = ResultWriter(self.path, METADATA)
+        variables = VariableStore({"count": 0, "data": b'\x00\x01'})
+        writer.settle('Start', variables)
+        variables["count"] = 1
+        writer.variable_written("count")
+        variables["lock"] = object()
+        writer.settle('Middle', variables)
+        packets = []
+        variables["packets"] = packets
+        writer.settle('Receive', variables)
+        # Written in place, without replacing the value.
+        packets.append(b'packet')
+        writer.variable_written("packets")
+        if stop:
+            del variables["lock"]
+            writer.close({"State": "End", "Variables": variables, "Timings": {"States": {}}})
+        else:
+            writer.file.close()
+        return variables
+
+    def test_round_trip(self):
+        self.run_machine()
+        result = read_result(self.path)
+        self.assertEqual(result["State"], "End")
+        self.assertEqual(result["Variables"], {"count": 1, "data": b'\x00\x01', "packets": [b'packet']})
+        self.assertEqual(result["Timings"], {"States": {}})
+        self.assertEqual(result["Metadata"], METADATA)
+        self.assertTrue(result["Complete"])
+
+    def test_incomplete(self):
+        self.run_machine(stop=False)
+        result = read_result(self.path)
+        self.assertEqual(result["State"], "Receive")
+        self.assertEqual(result["Variables"]["count"], 1)
+        self.assertEqual(result["Variables"]["packets"], [])
+        self.assertIsInstance(result["Variables"]["lock"], OpaqueValue)
+        self.assertEqual(result["Variables"]["lock"].type, 'object')
+        self.assertFalse(result["Complete"])
+
+    def test_truncated_record(self):
+        self.run_machine()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-3])
+        result = read_result(self.path)
+        self.assertFalse(result["Complete"])
+        self.assertEqual(result["Variables"]["packets"], [b'packet'])
+
+    def test_records(self):
+        self.run_machine()
+        with ResultReader(self.path) as reader:
+            records = list(reader.records())
+            lengths = list(reader.records(decode=False))
+        self.assertEqual(records[0], (ResultRecordType.METADATA, '', METADATA))
+        self.assertEqual([record.name for record in records if record.kind == ResultRecordType.STATE],
+                         ['Start', 'Middle', 'Receive'])
+        self.assertEqual([record.name for record in records if record.kind == ResultRecordType.VARIABLE],
+                         ['count', 'data', 'count', 'packets', 'packets'])
+        self.assertEqual(records[-1], (ResultRecordType.END, 'End', ['count', 'data', 'packets']))
+        self.assertEqual([record[:2] for record in lengths], [record[:2] for record in records])
+        self.assertTrue(all(isinstance(record.value, int) for record in lengths))
+
+    def test_not_a_result_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'NPTR')
+        with self.assertRaises(ValueError):
+            read_result(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+try:
+    from tests.helpers import Endpoint, Loopback, in_reactor, start_reactor, wait_until
+    from nopasaran.controllers.factory import WorkerClientFactory
+    from nopasaran.controllers.session import SessionDispatcher
+    from nopasaran.definitions.control_channel import Status
+except ImportError:
+    Loopback = None
+
+
+@unittest.skipIf(Loopback is None, 'twisted is not installed')
+class SessionMultiplexingTest(unittest.TestCase):
+
+    def setUp(self):
+        start_reactor()
+        self.loopback = Loopback()
+
+    def tearDown(self):
+        self.loopback.close()
+
+    def open_session(self):
+        server, client = Endpoint('SERVER'), Endpoint('CLIENT')
+        in_reactor(SessionDispatcher.register, self.loopback.port, server, 'ctrl')
+        factory = WorkerClientFactory(client, 'ctrl')
+        factory.destination = self.loopback.destination
+        in_reactor(self.loopback.protocol.new_session, factory)
+        self.assertTrue(wait_until(lambda: server.ready() and client.ready()))
+        return server.variables['ctrl'], client.variables['ctrl']
+
+    def test_sessions_share_the_connection(self):
+        first_server, first_client = self.loopback.server.variables['ctrl'], self.loopback.client.variables['ctrl']
+        second_server, second_client = self.open_session()
+        self.assertTrue(self.loopback.protocol.framed)
+        self.assertIs(second_client.protocol, first_client.protocol)
+        self.assertIs(second_server.protocol, first_server.protocol)
+        self.assertEqual(second_client.session_id, second_server.session_id)
+        self.assertNotEqual(second_client.session_id, first_client.session_id)
+
+    def test_sync_messages_stay_in_their_session(self):
+        first_server, first_client = self.loopback.server.variables['ctrl'], self.loopback.client.variables['ctrl']
+        second_server, second_client = self.open_session()
+        in_reactor(second_client.send_sync, 'second')
+        in_reactor(first_client.send_sync, 'first')
+        in_reactor(first_server.send_sync, 'back')
+        self.assertTrue(wait_until(lambda: first_server.has_sync() and second_server.has_sync() and first_client.has_sync()))
+        self.assertEqual(second_server.pop_sync(), 'second')
+        self.assertEqual(first_server.pop_sync(), 'first')
+        self.assertEqual(first_client.pop_sync(), 'back')
+        self.assertFalse(second_client.has_sync())
+
+    def test_session_status(self):
+        first_server, first_client = self.loopback.server.variables['ctrl'], self.loopback.client.variables['ctrl']
+        second_server, second_client = self.open_session()
+        in_reactor(second_client.disconnecting)
+        self.assertTrue(wait_until(lambda: second_server.remote_status == Status.DISCONNECTING.name))
+        in_reactor(second_server.disconnecting)
+        self.assertTrue(wait_until(lambda: not second_client.is_active))
+        self.assertFalse(second_server.is_active)
+        self.assertTrue(first_client.is_active and first_server.is_active)
+        self.assertEqual((first_client.local_status, first_server.local_status), (Status.READY.name, Status.READY.name))
+        self.assertTrue(self.loopback.protocol.transport.connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import sys
+import unittest
+
+from nopasaran.errors.parsing_error import ParsingError
+from nopasaran.interpreters.interpreter import CompiledAction
+from nopasaran.parsers.state_machine_compiler import StateMachineCompiler
+
+try:
+    from nopasaran.machines.state_machine import StateMachine
+except ImportError:
+    StateMachine = None
+
+PLAN = {
+    "id": "COMPILER-FSM",
+    "initial": "Init",
+    "states": {
+        "Init": {
+            "on": {
+                "STARTED": {"target": "Guards"}
+            }
+        },
+        "Guards": {
+            "entry": [{"type": "set_integer (1) (low)"}, {"type": "set_integer (2) (high)"}, {"type": "done"}],
+            "exit": [{"type": "set (leaving) (exit)"}],
+            "on": {
+                "DONE": [
+                    {"target": "Equal", "cond": "equal (low high)"},
+                    {"target": "Less", "cond": "lt (low high)", "actions": [{"type": "assign (high) (kept)"}]},
+                    {"target": "Equal"}
+                ]
+            }
+        },
+        "Equal": {},
+        "Less": {}
+    }
+}
+
+
+class StateMachineCompilerTest(unittest.TestCase):
+
+    def test_compile(self):
+        plan = StateMachineCompiler.compile(PLAN)
+        self.assertEqual(plan.id, "COMPILER-FSM")
+        self.assertIs(plan.initial_state, sys.intern("Init"))
+        self.assertEqual(set(plan.states), {"Init", "Guards", "Equal", "Less"})
+        guards = plan.states["Guards"]
+        self.assertEqual([(action.name, action.inputs, action.outputs) for action in guards.entry],
+                         [("set_integer", ("1",), ("low",)), ("set_integer", ("2",), ("high",)), ("done", (), ())])
+        self.assertEqual([action.line for action in guards.exit], ["set (leaving) (exit)"])
+        self.assertTrue(all(isinstance(action, CompiledAction) for action in guards.entry + guards.exit))
+        self.assertEqual(set(guards.transitions), {"DONE"})
+        transitions = guards.transitions["DONE"]
+        self.assertEqual([transition.target for transition in transitions], ["Equal", "Less", "Equal"])
+        self.assertIs(transitions[0].target, plan.states["Equal"].name)
+        self.assertIsNone(transitions[2].condition)
+        self.assertEqual([action.line for action in transitions[1].actions], ["assign (high) (kept)"])
+        self.assertEqual(plan.primitives, {"set_integer", "set", "done"})
+
+    def test_compiled_guards(self):
+        transitions = StateMachineCompiler.compile(PLAN).states["Guards"].transitions["DONE"]
+        self.assertFalse(transitions[0].condition.evaluate({"low": 1, "high": 2}))
+        self.assertTrue(transitions[1].condition.evaluate({"low": 1, "high": 2}))
+
+    def test_plan_is_immutable(self):
+        plan = StateMachineCompiler.compile(PLAN)
+        with self.assertRaises(TypeError):
+            plan.states["Other"] = plan.states["Equal"]
+        with self.assertRaises(TypeError):
+            plan.states["Guards"].transitions["OTHER"] = ()
+        with self.assertRaises(AttributeError):
+            plan.initial_state = "Equal"
+
+    def test_unknown_primitive(self):
+        plan = {"id": "UNKNOWN", "initial": "Init", "states": {"Init": {"entry": [{"type": "not_a_primitive (a)"}]}}}
+        with self.assertLogs(level='ERROR'), self.assertRaises(ParsingError):
+            StateMachineCompiler.compile(plan)
+
+    @unittest.skipIf(StateMachine is None, 'twisted is not installed')
+    def test_run_compiled_plan(self):
+        plan = StateMachineCompiler.compile(PLAN)
+        for state_json in (PLAN, plan):
+            machine = StateMachine(state_json)
+            machine.start()
+            self.assertEqual(machine.current_state, "Less")
+            self.assertEqual(dict(machine.variables), {"kept": 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import base64
+import copy
+import json
+import pickle
+import unittest
+
+from nopasaran.controllers.sync_codec import LazyPacket, encode_sync, decode_sync
+from nopasaran.definitions.control_channel import JSONMessage, WireFormat
+
+try:
+    from scapy.all import Ether, IP, TCP, UDP, Raw, PacketList
+except ImportError:
+    Ether = None
+
+try:
+    from nopasaran.controllers.protocol import WorkerProtocol
+    from nopasaran.controllers.session import WorkerSession
+except ImportError:
+    WorkerProtocol = None
+
+
+class SyncCodecTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = [None, True, False, 0, 1, -1, 255, -256, 2 ** 100, -2 ** 100, 0.5, -1e300, '', 'héllo',
+                  b'', b'\x00\xff', [], [1, 'a', None], (1, (2, 3)), {1, 'a'}, {},
+                  {'a': [1, 2], 3: {'b': b'c'}, (1, 2): None}]
+        for value in values:
+            decoded = decode_sync(encode_sync(value))
+            self.assertEqual(decoded, value)
+            self.assertIs(type(decoded), type(value))
+
+    def test_bool_is_not_integer(self):
+        self.assertIs(decode_sync(encode_sync([True, 1]))[0], True)
+        self.assertIs(type(decode_sync(encode_sync([True, 1]))[1]), int)
+
+    def test_unsupported_value(self):
+        with self.assertRaises(TypeError):
+            encode_sync({'a': object()})
+
+    def test_invalid_data(self):
+        with self.assertRaises(ValueError):
+            decode_sync(encode_sync('a') + b'N')
+        with self.assertRaises(ValueError):
+            decode_sync(b'?')
+
+    @unittest.skipIf(Ether is None, 'scapy is not installed')
+    def test_packets(self):
+        packet = IP(dst='192.0.2.1') / TCP(dport=80, flags='S') / Raw(b'payload')
+        packet.time = 1234.5
+        frame = Ether() / IP() / UDP(dport=53)
+        decoded = decode_sync(encode_sync({'packet': packet, 'packets': PacketList([frame, packet])}))
+        self.assertIsInstance(decoded['packet'], IP)
+        self.assertEqual(bytes(decoded['packet']), bytes(packet))
+        self.assertEqual(decoded['packet'].time, 1234.5)
+        self.assertEqual(decoded['packet'][TCP].dport, 80)
+        self.assertEqual([bytes(item) for item in decoded['packets']], [bytes(frame), bytes(packet)])
+        self.assertIsInstance(decoded['packets'][0], Ether)
+
+    @unittest.skipIf(Ether is None, 'scapy is not installed')
+    def test_packet_class_outside_scapy(self):
+        data = bytearray(encode_sync(IP()))
+        module = b'scapy.layers.inet'
+        start = data.index(module)
+        data[start:start + len(module)] = b'xcapy.layers.inet'
+        with self.assertRaises(ValueError):
+            decode_sync(bytes(data))
+
+    @unittest.skipIf(Ether is None, 'scapy is not installed')
+    def test_packets_are_dissected_on_first_use(self):
+        packet = IP(dst='192.0.2.1') / UDP(dport=53)
+        packet.time = 12.5
+        decoded = decode_sync(encode_sync([packet]))[0]
+        self.assertIs(type(decoded), LazyPacket)
+        self.assertEqual((bytes(decoded), len(decoded), decoded.time), (bytes(packet), len(packet), 12.5))
+        self.assertEqual(decode_sync(encode_sync(decoded)).time, 12.5)
+        self.assertIsNone(decoded._packet)
+        self.assertEqual(decoded.dst, '192.0.2.1')
+        self.assertIsNotNone(decoded._packet)
+
+    @unittest.skipIf(Ether is None, 'scapy is not installed')
+    def test_lazy_packets_behave_as_packets(self):
+        packet = IP(dst='192.0.2.1') / UDP(dport=53)
+        decoded = decode_sync(encode_sync(packet))
+        self.assertIn(UDP, decoded)
+        self.assertEqual(decoded, IP(bytes(packet)))
+        self.assertEqual(bytes(Ether() / decoded)[14:], bytes(packet))
+        decoded[UDP].dport = 80
+        decoded.time = 3.0
+        self.assertEqual(IP(bytes(decoded))[UDP].dport, 80)
+        self.assertEqual(decoded.packet.time, 3.0)
+        for rebuilt in (pickle.loads(pickle.dumps(decoded)), copy.copy(decoded), copy.deepcopy(decoded)):
+            self.assertIs(type(rebuilt), IP)
+            self.assertEqual(rebuilt[UDP].dport, 80)
+
+
+@unittest.skipIf(WorkerProtocol is None, 'twisted is not installed')
+class LegacySyncTest(unittest.TestCase):
+
+    def session(self, allow_pickle):
+        protocol = WorkerProtocol()
+        protocol.allow_pickle = allow_pickle
+        session = protocol.sessions[0] = WorkerSession(protocol, 0)
+        return session
+
+    def receive(self, session, content):
+        message = {JSONMessage.SYNC.name: base64.b64encode(pickle.dumps(content)).decode()}
+        session.protocol.legacy_message_received(base64.b64encode(json.dumps(message).encode()))
+
+    def test_pickled_sync_rejected_by_default(self):
+        self.assertFalse(WorkerProtocol.allow_pickle)
+        session = self.session(False)
+        with self.assertLogs(level='ERROR'):
+            self.receive(session, 'content')
+        self.assertFalse(session.has_sync())
+        session.sync_received(WireFormat.BASE64_JSON, pickle.dumps('content'))
+        with self.assertRaises(ValueError):
+            session.pop_sync()
+
+    def test_pickled_sync_allowed(self):
+        session = self.session(True)
+        self.receive(session, ['content', 1])
+        self.assertEqual(session.pop_sync(), ['content', 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
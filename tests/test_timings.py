@@ -0,0 +1,96 @@
+import random
+import threading
+import unittest
+
+from nopasaran.machines.timings import EXACT_LIMIT, PRIMITIVES, STATES, LatencyHistogram, Timings
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(50), 0)
+        self.assertEqual(histogram.summary(), {"count": 0, "p50_us": 0, "p99_us": 0, "max_us": 0})
+
+    def test_exact_values(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 11):
+            histogram.record(value)
+        self.assertEqual(histogram.percentile(0), 1)
+        self.assertEqual(histogram.percentile(50), 5)
+        self.assertEqual(histogram.percentile(90), 9)
+        self.assertEqual(histogram.percentile(100), 10)
+        self.assertEqual(histogram.count, 10)
+        self.assertEqual(histogram.max, 10)
+
+    def test_percentiles_within_error(self):
+        generator = random.Random(0)
+        values = sorted(int(generator.lognormvariate(12, 2)) for _ in range(10000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+        for percent in (1, 25, 50, 90, 99, 99.9):
+            expected = values[int(-(-len(values) * percent // 100)) - 1]
+            self.assertAlmostEqual(histogram.percentile(percent), expected, delta=max(1, expected * 0.035))
+        self.assertEqual(histogram.percentile(100), values[-1])
+        self.assertEqual(histogram.max, values[-1])
+
+    def test_percentile_never_exceeds_max(self):
+        histogram = LatencyHistogram()
+        # The lowest value of its bucket, below the middle of the bucket.
+        histogram.record(62 << 10)
+        self.assertEqual(histogram.percentile(50), 62 << 10)
+
+    def test_merge(self):
+        first, second, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for value in range(0, 100000, 7):
+            (first if value % 2 else second).record(value)
+            both.record(value)
+        first.merge(second)
+        self.assertEqual(first.counts, both.counts)
+        self.assertEqual(first.count, both.count)
+        self.assertEqual(first.max, both.max)
+
+
+class TimingsTest(unittest.TestCase):
+
+    def test_record_matches_histogram(self):
+        timings = Timings()
+        histogram = LatencyHistogram()
+        for value in (0, 1, EXACT_LIMIT - 1, EXACT_LIMIT, 12345, 10 ** 9, 2 ** 63):
+            timings.record(PRIMITIVES, 'wait', value)
+            histogram.record(value)
+        self.assertEqual(timings.collect()[PRIMITIVES]['wait'].counts, histogram.counts)
+        self.assertEqual(timings.collect()[PRIMITIVES]['wait'].max, histogram.max)
+
+    def test_summary(self):
+        timings = Timings()
+        timings.record(STATES, 'Start', 2000)
+        other = Timings()
+        other.record(STATES, 'Start', 4000)
+        other.record(PRIMITIVES, 'done', 1000)
+        timings.merge(other)
+        summary = timings.summary()
+        self.assertEqual(summary[STATES]['Start']['count'], 2)
+        self.assertEqual(summary[STATES]['Start']['max_us'], 4)
+        self.assertEqual(summary[PRIMITIVES]['done']['count'], 1)
+
+    def test_concurrent_records(self):
+        timings = Timings()
+
+        def record():
+            for value in range(10000):
+                timings.record(PRIMITIVES, 'wait', value)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        histogram = timings.collect()[PRIMITIVES]['wait']
+        self.assertEqual(histogram.count, 40000)
+        self.assertEqual(sum(histogram.counts), 40000)
+
+
+if __name__ == '__main__':
+    unittest.main()
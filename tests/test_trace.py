@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from nopasaran.definitions.trace import TraceEvent
+from nopasaran.machines.trace import ACTION_START, TRANSITION, VARIABLE_WRITE, TraceBuffer
+
+
+class TraceBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, buffer, count):
+        machine = buffer.intern('MAIN')
+        for index in range(count):
+            buffer.record(VARIABLE_WRITE, machine, 'v{}'.format(index), index)
+
+    def test_dump_not_full(self):
+        buffer = TraceBuffer(8)
+        self.record(buffer, 5)
+        buffer.dump(self.path)
+        trace = TraceBuffer.load(self.path)
+        self.assertEqual([record.value for record in trace.records], list(range(5)))
+        self.assertEqual([record.name for record in trace.records], ['v{}'.format(index) for index in range(5)])
+        self.assertEqual(trace.dropped, 0)
+
+    def test_dump_oldest_first_after_wrapping(self):
+        for count in (8, 11, 16, 21):
+            buffer = TraceBuffer(8)
+            self.record(buffer, count)
+            buffer.dump(self.path)
+            trace = TraceBuffer.load(self.path)
+            self.assertEqual([record.value for record in trace.records], list(range(count - 8, count)), count)
+            self.assertEqual(trace.dropped, count - 8)
+            timestamps = [record.timestamp for record in trace.records]
+            self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_dump_twice(self):
+        buffer = TraceBuffer(8)
+        self.record(buffer, 3)
+        buffer.dump(self.path)
+        self.record(buffer, 2)
+        buffer.dump(self.path)
+        self.assertEqual([record.value for record in TraceBuffer.load(self.path).records], [0, 1, 2, 0, 1])
+
+    def test_string_values(self):
+        buffer = TraceBuffer(8)
+        machine = buffer.intern('MAIN')
+        buffer.record(ACTION_START, machine, 'wait')
+        buffer.record(TRANSITION, machine, 'End', buffer.intern('Start'))
+        buffer.dump(self.path)
+        trace = TraceBuffer.load(self.path)
+        self.assertEqual([(record.kind, record.machine, record.name, record.value) for record in trace.records],
+                         [(TraceEvent.ACTION_START, 'MAIN', 'wait', 0), (TraceEvent.TRANSITION, 'MAIN', 'End', 'Start')])
+
+    def test_load_not_a_trace(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a trace file at all, but long enough for a header')
+        with self.assertRaises(ValueError):
+            TraceBuffer.load(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import threading
+import unittest
+
+from nopasaran.machines.variable_store import VariableStore, value_size
+
+
+class VariableStoreTest(unittest.TestCase):
+
+    def test_mapping(self):
+        store = VariableStore({"a": 1})
+        store["b"] = 2
+        self.assertEqual(dict(store), {"a": 1, "b": 2})
+        self.assertEqual(len(store), 2)
+        self.assertIn("a", store)
+        self.assertEqual(store.get("c", 3), 3)
+        del store["a"]
+        self.assertEqual(list(store), ["b"])
+        with self.assertRaises(KeyError):
+            store["a"]
+
+    def test_snapshot_isolation(self):
+        store = VariableStore({"a": 1, "packets": []})
+        snapshot = store.snapshot()
+        store["a"] = 2
+        store["b"] = 3
+        del store["packets"]
+        self.assertEqual(dict(snapshot), {"a": 1, "packets": []})
+        self.assertEqual(dict(store), {"a": 2, "b": 3})
+        with self.assertRaises(TypeError):
+            snapshot["a"] = 4
+
+    def test_snapshot_shares_values(self):
+        packets = [b'packet']
+        store = VariableStore({"packets": packets})
+        snapshot = store.snapshot()
+        self.assertIs(snapshot["packets"], packets)
+        self.assertIs(store.snapshot()["packets"], packets)
+        second = store.snapshot()
+        store["other"] = 1
+        self.assertNotIn("other", second)
+        self.assertIs(store["packets"], packets)
+
+    def test_view_is_live(self):
+        store = VariableStore({"a": 1})
+        view = store.view()
+        store["a"] = 2
+        self.assertEqual(view["a"], 2)
+        with self.assertRaises(TypeError):
+            view["a"] = 3
+
+    def test_replace(self):
+        store = VariableStore({"a": 1})
+        snapshot = store.snapshot()
+        variables = {"b": 2}
+        store.replace(variables)
+        self.assertEqual(dict(store), {"b": 2})
+        self.assertEqual(dict(snapshot), {"a": 1})
+        # The store owns the replacing variables and writes to them until the next snapshot.
+        store["c"] = 3
+        self.assertEqual(variables, {"b": 2, "c": 3})
+        after = store.snapshot()
+        store["d"] = 4
+        self.assertEqual(dict(after), {"b": 2, "c": 3})
+
+    def test_concurrent_snapshots(self):
+        store = VariableStore()
+        snapshots = []
+
+        def write():
+            for index in range(2000):
+                store[index % 10] = index
+
+        def take():
+            for _ in range(2000):
+                snapshot = store.snapshot()
+                snapshots.append((snapshot, dict(snapshot)))
+
+        threads = [threading.Thread(target=write), threading.Thread(target=take)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for snapshot, taken in snapshots:
+            self.assertEqual(dict(snapshot), taken)
+
+    def test_sizes(self):
+        store = VariableStore({"data": b'\x00' * 10, "text": "abc", "list": [b'ab', "c"], "map": {"k": b'vv'}})
+        self.assertEqual(store.sizes(), {"data": 10, "text": 3, "list": 3, "map": 3})
+        self.assertEqual(value_size(b''), 0)
+        self.assertGreater(value_size(object()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()